@@ -0,0 +1,101 @@
+"""
+Registry of the check types a rule can use.
+
+Each check type is implemented by a module that declares its probe functions and
+default validation rule in a `CHECK_TYPES` dict. The module is only imported the
+first time a rule of that type is run, so e.g. `netcheck tcp` never imports
+psycopg or requests.
+"""
+
+import importlib
+import logging
+import time
+from enum import Enum
+from typing import Callable, Dict, NamedTuple, Optional
+
+logger = logging.getLogger("netcheck.checks")
+
+CHECK_MODULES: Dict[str, str] = {
+    "dns": "netcheck.checks.dns",
+    "http": "netcheck.checks.http",
+    "tcp": "netcheck.checks.tcp",
+    "internal": "netcheck.checks.internal",
+    "postgres": "netcheck.checks.postgres",
+    "postgres-grants": "netcheck.checks.postgres",
+}
+
+
+class CheckType(NamedTuple):
+    """
+    How to run a check type.
+
+    Args:
+        probe: Called as `probe(test_config, err_console, verbose=..., resources=..., fields=...)`
+            and returns the probe's `spec` and `data`. `fields` is the set of `data` fields
+            the rule's validation reads, or None if it may read any of them, so a probe
+            can skip capturing data nothing looks at.
+        default_validation_rule: CEL rule used when a rule doesn't set one.
+        probe_async: Coroutine version of `probe`. Without one, the asyncio engine runs
+            `probe` in a worker thread.
+        shareable: Called with a rule's config, returns whether rules sending the same
+            probe may share one result. Probes with side effects, such as an http POST,
+            are sent once for every rule. Without one, every probe is shareable.
+        default_timeout: Seconds a rule without a `timeout` is allowed, which its
+            wall-clock limit in a run is based on. None for checks that can't hang.
+    """
+
+    probe: Callable[..., Dict]
+    default_validation_rule: str
+    probe_async: Optional[Callable[..., Dict]] = None
+    shareable: Optional[Callable[[Dict], bool]] = None
+    default_timeout: Optional[float] = None
+
+
+class NetcheckHttpMethod(str, Enum):
+    get = "get"
+    post = "post"
+    patch = "patch"
+    put = "put"
+    delete = "delete"
+
+
+class NetcheckHttpBodyCapture(str, Enum):
+    """What an http check keeps of the response body.
+
+    `full` keeps up to `max-body-bytes` of it in `data.body`, `hash` streams as much of
+    it into `data.body-sha256`, and `none` only counts its bytes.
+    """
+
+    full = "full"
+    hash = "hash"
+    none = "none"
+
+
+def elapsed(started: int, finished: Optional[int] = None) -> float:
+    """
+    Duration between two `time.perf_counter_ns()` readings, for a result's `data.timings`.
+
+    Args:
+        started: Reading at the start of the phase.
+        finished: Reading at the end of the phase, defaults to now.
+
+    Returns:
+        The duration in seconds, rounded to the microsecond. Rules see it as a CEL
+        `duration` (see `netcheck.validation.cel_durations`).
+    """
+    if finished is None:
+        finished = time.perf_counter_ns()
+    return round((finished - started) / 1e9, 6)
+
+
+def get_check_type(test_type: str) -> CheckType:
+    """Look up a check type, importing its module on first use.
+
+    Raises:
+        NotImplementedError: If `test_type` isn't a known check type.
+    """
+    module_name = CHECK_MODULES.get(test_type)
+    if module_name is None:
+        logger.warning("Unhandled test type")
+        raise NotImplementedError("Unknown test type")
+    return importlib.import_module(module_name).CHECK_TYPES[test_type]
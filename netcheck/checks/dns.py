@@ -1,52 +1,124 @@
+import copy
 import datetime
 import logging
+import threading
+import time
 from typing import Optional
 
+import dns.asyncresolver
 import dns.resolver
 from dns.exception import Timeout
 
+from netcheck.checks import CheckType, elapsed
+
 logger = logging.getLogger("netcheck.dns")
 
 
 DEFAULT_DNS_VALIDATION_RULE = """
 data['response-code'] == 'NOERROR' &&
 size(data['A']) >= 1 && 
-(timestamp(data['endTimestamp']) - timestamp(data['startTimestamp']) < duration('10s'))
+data.timings.resolve < duration('10s')
 """
 
 
+class DnsResolverRegistry:
+    """
+    Resolvers shared by every dns check in a run.
+
+    The system resolver configuration (`/etc/resolv.conf`) is read once, and one
+    resolver is kept per (nameserver, source-ip, search) combination. Resolvers are
+    never reconfigured after creation, so they are safe to use from many threads
+    (or tasks, for the async resolvers) at once.
+
+    Args:
+        port: Port used to reach nameservers given by address.
+    """
+
+    def __init__(self, port: int = 53):
+        self.port = port
+        self._lock = threading.Lock()
+        self._base = {}
+        self._resolvers = {}
+
+    def resolver(self, nameserver: Optional[str] = None, source_ip: Optional[str] = None, search: bool = True):
+        return self._get(dns.resolver.Resolver, nameserver, source_ip, search)
+
+    def async_resolver(
+        self, nameserver: Optional[str] = None, source_ip: Optional[str] = None, search: bool = True
+    ):
+        return self._get(dns.asyncresolver.Resolver, nameserver, source_ip, search)
+
+    def _get(self, resolver_cls, nameserver, source_ip, search):
+        key = (resolver_cls, nameserver, source_ip, search)
+        with self._lock:
+            resolver = self._resolvers.get(key)
+            if resolver is None:
+                if resolver_cls not in self._base:
+                    self._base[resolver_cls] = resolver_cls()
+                resolver = copy.copy(self._base[resolver_cls])
+                resolver.port = self.port
+                if nameserver is not None:
+                    resolver.nameservers = [nameserver]
+                self._resolvers[key] = resolver
+            return resolver
+
+
 def get_A_records_by_dns_lookup(
-    target, nameserver=None, timeout=60, source_ip: Optional[str] = None
+    target,
+    nameserver=None,
+    timeout=60,
+    source_ip: Optional[str] = None,
+    search: bool = True,
+    resolvers: Optional[DnsResolverRegistry] = None,
+    capture_response: bool = True,
 ):
-    # We always reset the default dns resolver
-    dns.resolver.reset_default_resolver()
-    resolver = dns.resolver.get_default_resolver()
+    if resolvers is None:
+        resolvers = DnsResolverRegistry()
+    resolver = resolvers.resolver(nameserver, source_ip, search)
 
     result = {}
 
-    if nameserver is not None:
-        resolver.nameservers = [nameserver]
-
     # this resolver can also be used with the default nameserver
     # search=True is required to use the OS search path!
     # E.g. `kubernetes` -> `kubernetes.default.svc.cluster.local`
     try:
         answer = resolver.resolve(
-            target, "A", lifetime=timeout, search=True, source=source_ip
+            target, "A", lifetime=timeout, search=search, source=source_ip
         )
+        result.update(_answer_to_result(answer, capture_response))
+    except Timeout:
+        result["response-code"] = "TIMEOUT"
+    except dns.resolver.NXDOMAIN:
+        result["response-code"] = "NXDOMAIN"
+    except dns.exception.DNSException as e:
+        result["response-code"] = "DNSERROR"
+        result["exception-type"] = e.__class__.__name__
+        result["exception"] = str(e)
+
+    return result
 
-        # canonical name of the target
-        result["canonical_name"] = answer.canonical_name.to_text()
-        # answer.expiration is the TTL as a float timestamp
-        result["expiration"] = answer.expiration
 
-        # str(answer.response) is the raw DNS response
-        result["response"] = str(answer.response)
+async def get_A_records_by_dns_lookup_async(
+    target,
+    nameserver=None,
+    timeout=60,
+    source_ip: Optional[str] = None,
+    search: bool = True,
+    resolvers: Optional[DnsResolverRegistry] = None,
+    capture_response: bool = True,
+):
+    """Coroutine version of `get_A_records_by_dns_lookup` using `dns.asyncresolver`."""
+    if resolvers is None:
+        resolvers = DnsResolverRegistry()
+    resolver = resolvers.async_resolver(nameserver, source_ip, search)
+
+    result = {}
 
-        result["A"] = []
-        for IPval in answer:
-            result["A"].append(IPval.to_text())
-        result["response-code"] = "NOERROR"
+    try:
+        answer = await resolver.resolve(
+            target, "A", lifetime=timeout, search=search, source=source_ip
+        )
+        result.update(_answer_to_result(answer, capture_response))
     except Timeout:
         result["response-code"] = "TIMEOUT"
     except dns.resolver.NXDOMAIN:
@@ -59,7 +131,33 @@ def get_A_records_by_dns_lookup(
     return result
 
 
-def dns_lookup_check(host, server, timeout=10, source_ip: Optional[str] = None):
+def _answer_to_result(answer, capture_response: bool = True) -> dict:
+    result = {}
+    # canonical name of the target
+    result["canonical_name"] = answer.canonical_name.to_text()
+    # answer.expiration is the TTL as a float timestamp
+    result["expiration"] = answer.expiration
+
+    # str(answer.response) is the raw DNS response, which is costly to format for large answers
+    if capture_response:
+        result["response"] = str(answer.response)
+
+    result["A"] = []
+    for IPval in answer:
+        result["A"].append(IPval.to_text())
+    result["response-code"] = "NOERROR"
+    return result
+
+
+def dns_lookup_check(
+    host,
+    server,
+    timeout=10,
+    source_ip: Optional[str] = None,
+    search: bool = True,
+    resolvers: Optional[DnsResolverRegistry] = None,
+    capture_response: bool = True,
+):
     test_spec = {
         "type": "dns",
         "nameserver": server,
@@ -68,19 +166,113 @@ def dns_lookup_check(host, server, timeout=10, source_ip: Optional[str] = None):
     }
     if source_ip is not None:
         test_spec["source-ip"] = source_ip
+    if not search:
+        test_spec["search"] = False
     startTimestamp = datetime.datetime.now(datetime.UTC).isoformat()
 
+    started = time.perf_counter_ns()
     try:
         result_data = get_A_records_by_dns_lookup(
-            host, nameserver=server, timeout=timeout, source_ip=source_ip
+            host,
+            nameserver=server,
+            timeout=timeout,
+            source_ip=source_ip,
+            search=search,
+            resolvers=resolvers,
+            capture_response=capture_response,
+        )
+
+    except Exception as e:
+        logger.info(f"Unexpected exception:\n\n{e}")
+        raise
+
+    result_data["timings"] = {"resolve": elapsed(started)}
+    result_data["startTimestamp"] = startTimestamp
+    result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
+
+    output = {"spec": test_spec, "data": result_data}
+    return output
+
+
+async def dns_lookup_check_async(
+    host,
+    server,
+    timeout=10,
+    source_ip: Optional[str] = None,
+    search: bool = True,
+    resolvers: Optional[DnsResolverRegistry] = None,
+    capture_response: bool = True,
+):
+    test_spec = {
+        "type": "dns",
+        "nameserver": server,
+        "host": host,
+        "timeout": timeout,
+    }
+    if source_ip is not None:
+        test_spec["source-ip"] = source_ip
+    if not search:
+        test_spec["search"] = False
+    startTimestamp = datetime.datetime.now(datetime.UTC).isoformat()
+
+    started = time.perf_counter_ns()
+    try:
+        result_data = await get_A_records_by_dns_lookup_async(
+            host,
+            nameserver=server,
+            timeout=timeout,
+            source_ip=source_ip,
+            search=search,
+            resolvers=resolvers,
+            capture_response=capture_response,
         )
 
     except Exception as e:
         logger.info(f"Unexpected exception:\n\n{e}")
         raise
 
+    result_data["timings"] = {"resolve": elapsed(started)}
     result_data["startTimestamp"] = startTimestamp
     result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
 
     output = {"spec": test_spec, "data": result_data}
     return output
+
+
+def run_dns_rule(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print(f"DNS check looking up host '{test_config['host']}'")
+    return dns_lookup_check(
+        host=test_config["host"],
+        server=test_config.get("server"),
+        timeout=test_config.get("timeout"),
+        source_ip=test_config.get("source-ip"),
+        search=test_config.get("search", True),
+        resolvers=resources.dns_resolvers if resources is not None else None,
+        capture_response=fields is None or "response" in fields,
+    )
+
+
+async def run_dns_rule_async(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print(f"DNS check looking up host '{test_config['host']}'")
+    return await dns_lookup_check_async(
+        host=test_config["host"],
+        server=test_config.get("server"),
+        timeout=test_config.get("timeout"),
+        source_ip=test_config.get("source-ip"),
+        search=test_config.get("search", True),
+        resolvers=resources.dns_resolvers if resources is not None else None,
+        capture_response=fields is None or "response" in fields,
+    )
+
+
+CHECK_TYPES = {
+    # Without a timeout a lookup uses dnspython's default lifetime
+    "dns": CheckType(
+        run_dns_rule,
+        DEFAULT_DNS_VALIDATION_RULE,
+        run_dns_rule_async,
+        default_timeout=dns.resolver.Resolver(configure=False).lifetime,
+    ),
+}
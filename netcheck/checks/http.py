@@ -1,58 +1,311 @@
 import datetime
+import hashlib
 import logging
+import socket
+import threading
+import time
 from enum import Enum
 from typing import Dict, Optional
 from pydantic import BaseModel
 import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
 from urllib3.poolmanager import PoolManager
+from urllib3.util.connection import allowed_gai_family
+
+from netcheck.checks import CheckType, NetcheckHttpBodyCapture, NetcheckHttpMethod, elapsed
 
 # We disable urllib warning because we expect to be carrying out tests against hosts using self-signed
 # certs etc.
 urllib3.disable_warnings()
 
-
 import requests  # noqa: E402
 from requests.adapters import HTTPAdapter  # noqa: E402
 
+ZERO_DURATION = 0.0
+# The timings of the connection serving this thread's current request, see `_traced_phases`
+_trace = threading.local()
+
+
+class _TracingMixin:
+    """
+    Marks each response with whether it was received on an already used connection, and
+    with `netcheck_timings`: how long resolving the host, connecting, the TLS handshake
+    and waiting for the response headers took. The first three are zero on a reused
+    connection. `netcheck_peer` holds the connected address and TLS parameters, see
+    `_peer_data`.
+
+    Each phase is recorded as soon as it ends, including one that fails, so a request
+    without a response still reports the phases it reached through `_trace`.
+    """
+
+    _netcheck_phases = None
+    _netcheck_connected = None
+
+    def _new_conn(self):
+        # Resolve the host here, so name resolution and connecting are timed apart, then
+        # have urllib3 connect to each resolved address in turn
+        self._netcheck_phases = phases = _traced_phases()
+        started = time.perf_counter_ns()
+        try:
+            addresses = socket.getaddrinfo(
+                self._dns_host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM
+            )
+        except socket.gaierror as e:
+            phases["dns"] = elapsed(started)
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.perf_counter_ns()
+        phases["dns"] = elapsed(started, resolved)
+        dns_host = self._dns_host
+        try:
+            for index, (*_, sockaddr) in enumerate(addresses):
+                # A numeric host, which keeps e.g. the scope id of an IPv6 link-local
+                # address, is connected to without resolving the name again
+                self._dns_host = socket.getnameinfo(sockaddr, socket.NI_NUMERICHOST | socket.NI_NUMERICSERV)[0]
+                try:
+                    sock = super()._new_conn()
+                    break
+                except (ConnectTimeoutError, NewConnectionError):
+                    if index == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = dns_host
+            phases["connect"] = elapsed(resolved)
+        self._netcheck_connected = time.perf_counter_ns()
+        return sock
+
+    def connect(self):
+        self._netcheck_responses = 0
+        self._netcheck_connected = None
+        try:
+            super().connect()
+        finally:
+            # Everything after the TCP connection, e.g. a proxy tunnel, is timed as the TLS handshake
+            if self._netcheck_connected is not None:
+                self._netcheck_phases["tls"] = elapsed(self._netcheck_connected) if self.is_tls else ZERO_DURATION
+        self._netcheck_request_started = time.perf_counter_ns()
+
+    def request(self, *args, **kwargs):
+        if self._netcheck_phases is None:
+            # Set up for an earlier response, or opened below while sending a plain http request
+            self._netcheck_phases = _traced_phases(dns=ZERO_DURATION, connect=ZERO_DURATION, tls=ZERO_DURATION)
+        # Plain http connections are opened while sending the request, which resets this
+        self._netcheck_request_started = time.perf_counter_ns()
+        super().request(*args, **kwargs)
+
+    def getresponse(self):
+        phases, self._netcheck_phases = self._netcheck_phases, None
+        try:
+            response = super().getresponse()
+        finally:
+            phases["ttfb"] = elapsed(self._netcheck_request_started)
+        response.netcheck_timings = phases
+        try:
+            peer = self.sock.getpeername()
+        except (AttributeError, OSError):
+            peer = None
+        response.netcheck_peer = _peer_data(peer, self.sock if self.is_tls else None)
+        responses = getattr(self, "_netcheck_responses", 0)
+        response.netcheck_connection_reused = responses > 0
+        self._netcheck_responses = responses + 1
+        return response
+
+
+def _traced_phases(**phases: float) -> Dict[str, float]:
+    """
+    New timings for a connection's next response, which are also this thread's `_trace`,
+    so `http_request_check` can report them when the request fails.
+    """
+    _trace.timings = phases
+    return phases
+
+
+def _peer_data(peer: Optional[tuple], tls) -> Dict:
+    """
+    Result `data` describing the other end of a connection.
+
+    Args:
+        peer: The socket's peer address, e.g. `("93.184.215.14", 443)`.
+        tls: The connection's `ssl.SSLSocket` or `ssl.SSLObject`, or None for plain http.
+
+    Returns:
+        `peer-address` and `peer-port`, plus the negotiated `tls-version` and `tls-cipher`
+        on a TLS connection.
+    """
+    data = {}
+    if peer:
+        data["peer-address"], data["peer-port"] = peer[0], peer[1]
+    if tls is not None:
+        data["tls-version"] = tls.version()
+        cipher = tls.cipher()
+        if cipher is not None:
+            data["tls-cipher"] = cipher[0]
+    return data
 
-class _SourceAddressAdapter(HTTPAdapter):
-    """HTTPAdapter that binds outgoing connections to a specific source IP."""
 
-    def __init__(self, source_address: str, **kwargs):
-        self._source_address = (source_address, 0)
+class _HTTPConnection(_TracingMixin, HTTPConnection):
+    is_tls = False
+
+
+class _HTTPSConnection(_TracingMixin, HTTPSConnection):
+    is_tls = True
+
+
+class _HTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class _HTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+class _NetcheckAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that tracks connection reuse and can bind outgoing connections to a source IP.
+
+    Requests sent through an http(s) proxy, e.g. from `HTTP_PROXY`, are traced too, but the
+    connection is the proxy's: `dns` and `connect` time reaching the proxy, `tls` includes
+    setting up the tunnel of an https request, and the peer is the proxy's address. SOCKS
+    proxies are left to urllib3, so their requests have no timings or peer.
+    """
+
+    def __init__(self, source_address: Optional[str] = None, **kwargs):
+        self._source_address = (source_address, 0) if source_address is not None else None
         super().__init__(**kwargs)
 
     def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
-        pool_kwargs["source_address"] = self._source_address
+        if self._source_address is not None:
+            pool_kwargs["source_address"] = self._source_address
         self.poolmanager = PoolManager(
             num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs
         )
+        self.poolmanager.pool_classes_by_scheme = {"http": _HTTPConnectionPool, "https": _HTTPSConnectionPool}
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if proxy.lower().startswith("socks"):
+            return super().proxy_manager_for(proxy, **proxy_kwargs)
+        if self._source_address is not None:
+            proxy_kwargs["source_address"] = self._source_address
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = {"http": _HTTPConnectionPool, "https": _HTTPSConnectionPool}
+        return manager
+
+
+class HttpSessionRegistry:
+    """
+    Connection pools shared by every http check in a run.
+
+    Pools are keyed by (source-ip, verify-tls-cert), so rules with the same settings
+    reuse open connections to a host. Each check still uses its own `requests.Session`,
+    so cookies are never shared between rules.
+    """
+
+    def __init__(self, pool_maxsize: int = 10):
+        self.pool_maxsize = pool_maxsize
+        self._adapters: Dict[tuple, HTTPAdapter] = {}
+        self._lock = threading.Lock()
+
+    def adapter(self, source_ip: Optional[str] = None, verify: bool = True) -> HTTPAdapter:
+        key = (source_ip, verify)
+        with self._lock:
+            adapter = self._adapters.get(key)
+            if adapter is None:
+                adapter = self._adapters[key] = _NetcheckAdapter(source_ip, pool_maxsize=self.pool_maxsize)
+            return adapter
+
+    def close(self):
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters.clear()
+
+
+class AsyncHttpClientRegistry:
+    """`HttpSessionRegistry` for `http_request_check_async`, holding one httpx client per key."""
+
+    def __init__(self, pool_maxsize: int = 10):
+        self.pool_maxsize = pool_maxsize
+        self._clients = {}
+
+    def client(self, source_ip: Optional[str] = None, verify: bool = True):
+        key = (source_ip, verify)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = _new_async_client(source_ip, verify, self.pool_maxsize)
+        return client
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+def _new_async_client(source_ip: Optional[str], verify: bool, pool_maxsize: int = 1):
+    import httpx
+
+    transport = httpx.AsyncHTTPTransport(
+        verify=verify,
+        local_address=source_ip,
+        limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_maxsize),
+    )
+    return httpx.AsyncClient(transport=transport, follow_redirects=True)
 
 
 logger = logging.getLogger("netcheck.http")
 DEFAULT_HTTP_VALIDATION_RULE = """
 data['status-code'] in [200, 201]
 """
+DEFAULT_MAX_BODY_BYTES = 1024 * 1024
+# A rule without a timeout sends requests with none, so its wall-clock limit in a run is
+# based on this instead, the default of `netcheck http`
+DEFAULT_HTTP_TIMEOUT = 30.0
+BODY_CHUNK_SIZE = 64 * 1024
 
 
 class NetcheckHttpHeaderType(str, Enum):
     bearer = "bearer"
 
 
+class _BodyCapture:
+    """Collects a response body fed to it chunk by chunk, see `NetcheckHttpBodyCapture`."""
+
+    def __init__(self, mode: NetcheckHttpBodyCapture, max_bytes: int):
+        self.mode = NetcheckHttpBodyCapture(mode)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.truncated = False
+        self._chunks = []
+        self._digest = hashlib.sha256() if self.mode == NetcheckHttpBodyCapture.hash else None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add the next chunk of the body. Returns False once no more of it should be read."""
+        if self.size + len(chunk) > self.max_bytes:
+            chunk = chunk[: self.max_bytes - self.size]
+            self.truncated = True
+        self.size += len(chunk)
+        if self.mode == NetcheckHttpBodyCapture.full:
+            self._chunks.append(chunk)
+        elif self._digest is not None:
+            self._digest.update(chunk)
+        return not self.truncated
+
+    def store(self, result_data: dict, encoding: Optional[str]):
+        """Write the captured body to a result's data."""
+        if self.mode == NetcheckHttpBodyCapture.full:
+            result_data["body"] = b"".join(self._chunks).decode(encoding or "utf-8", errors="replace")
+        elif self.mode == NetcheckHttpBodyCapture.hash:
+            result_data["body-sha256"] = self._digest.hexdigest()
+        result_data["body-bytes"] = self.size
+        result_data["body-truncated"] = self.truncated
+
+
 class NetcheckHttpHeaders(BaseModel):
     name: str
     value: str
     type: Optional[NetcheckHttpHeaderType] = None
 
 
-class NetcheckHttpMethod(str, Enum):
-    get = "get"
-    post = "post"
-    patch = "patch"
-    put = "put"
-    delete = "delete"
-
-
 def http_request_check(
     url,
     method: NetcheckHttpMethod = "get",
@@ -60,23 +313,23 @@ def http_request_check(
     timeout=5,
     verify: bool = True,
     source_ip: Optional[str] = None,
+    reuse_connection: bool = True,
+    sessions: Optional[HttpSessionRegistry] = None,
+    max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+    body_capture: NetcheckHttpBodyCapture = NetcheckHttpBodyCapture.full,
+    capture_headers: bool = True,
 ):
-    if headers is None:
-        headers = {}
-    if "User-Agent" not in headers:
-        headers["User-Agent"] = "netcheck"
+    """
+    Request a URL and report the response.
 
-    # This structure gets stored along with the test results
-    test_spec = {
-        "type": "http",
-        "timeout": timeout,
-        "verify-tls-cert": verify,
-        "method": method,
-        "headers": headers,
-        "url": url,
-    }
-    if source_ip is not None:
-        test_spec["source-ip"] = source_ip
+    The body is streamed rather than loaded at once. At most `max_body_bytes` of it are
+    read (and hashed, when `body_capture` is `hash`), and `data.body-truncated` records
+    whether there was more. A truncated response's connection is closed instead of reused.
+    `data.headers` is left out unless `capture_headers` is set.
+    """
+    test_spec = _http_test_spec(
+        url, method, headers, timeout, verify, source_ip, reuse_connection, max_body_bytes, body_capture
+    )
 
     result_data = {
         "startTimestamp": datetime.datetime.now(datetime.UTC).isoformat(),
@@ -89,25 +342,268 @@ def http_request_check(
         "timeout": test_spec["timeout"],
         "verify": test_spec["verify-tls-cert"],
         "headers": test_spec["headers"],
+        # Read the body below, so it can be timed apart from waiting for the headers
+        "stream": True,
     }
 
+    # A cold connection uses its own adapter, which is closed after the request
+    shared = sessions is not None and reuse_connection
+    adapter = sessions.adapter(source_ip, verify) if shared else _NetcheckAdapter(source_ip)
     session = requests.Session()
-    if source_ip is not None:
-        adapter = _SourceAddressAdapter(source_ip)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
 
+    _trace.timings = None
     try:
-        response = session.request(method, url, **requests_kwargs)
+        # Closing the response hands its connection back to the pool, or closes it if
+        # the body wasn't read to the end
+        with session.request(method, url, **requests_kwargs) as response:
+            result_data["status-code"] = response.status_code
+            result_data["connection-reused"] = getattr(response.raw, "netcheck_connection_reused", False)
+            result_data.update(getattr(response.raw, "netcheck_peer", {}))
+            if capture_headers:
+                result_data["headers"] = dict(response.headers)
+            timings = result_data["timings"] = dict(getattr(response.raw, "netcheck_timings", {}))
+            body_started = time.perf_counter_ns()
+            body = _BodyCapture(body_capture, max_body_bytes)
+            try:
+                for chunk in response.iter_content(BODY_CHUNK_SIZE):
+                    if not body.feed(chunk):
+                        # The rest of the body is left unread
+                        break
+            finally:
+                timings["body"] = elapsed(body_started)
+            body.store(result_data, response.encoding)
+            response.raise_for_status()
+    except Exception as e:
+        logger.debug(f"Caught exception:\n\n{e}")
+        result_data["exception-type"] = e.__class__.__name__
+        result_data["exception"] = str(e)
+        if "timings" not in result_data and _trace.timings:
+            # The phases reached before the request failed
+            result_data["timings"] = dict(_trace.timings)
+    finally:
+        _trace.timings = None
+        if not shared:
+            adapter.close()
+
+    result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
+
+    return output
+
+
+async def http_request_check_async(
+    url,
+    method: NetcheckHttpMethod = "get",
+    headers: Dict[str, str] = None,
+    timeout=5,
+    verify: bool = True,
+    source_ip: Optional[str] = None,
+    reuse_connection: bool = True,
+    clients: Optional[AsyncHttpClientRegistry] = None,
+    max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+    body_capture: NetcheckHttpBodyCapture = NetcheckHttpBodyCapture.full,
+    capture_headers: bool = True,
+):
+    """Coroutine version of `http_request_check` built on httpx.
+
+    The output document matches `http_request_check`, including reporting
+    4xx/5xx responses as an `HTTPError` exception.
+    """
+    test_spec = _http_test_spec(
+        url, method, headers, timeout, verify, source_ip, reuse_connection, max_body_bytes, body_capture
+    )
+
+    result_data = {
+        "startTimestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+    }
+
+    output = {"spec": test_spec, "data": result_data}
+
+    shared = clients is not None and reuse_connection
+    client = clients.client(source_ip, verify) if shared else _new_async_client(source_ip, verify)
+    # perf_counter_ns readings of httpcore's trace events, e.g. "connect_tcp.started"
+    marks = {}
+
+    async def trace(event_name, info):
+        event = event_name.split(".", 1)[1]
+        if event in ("connect_tcp.started", "send_request_headers.started"):
+            if "receive_response_headers.complete" in marks:
+                # Following a redirect, only the final request is timed
+                marks.clear()
+        marks[event] = time.perf_counter_ns()
+
+    try:
+        request = client.build_request(
+            str(method).upper(),
+            url,
+            headers=test_spec["headers"],
+            timeout=timeout,
+            extensions={"trace": trace},
+        )
+        response = await client.send(request, stream=True)
         result_data["status-code"] = response.status_code
-        result_data["headers"] = dict(response.headers)
-        result_data["body"] = response.text
-        response.raise_for_status()
+        result_data["connection-reused"] = "connect_tcp.started" not in marks
+        stream = response.extensions.get("network_stream")
+        if stream is not None:
+            result_data.update(_peer_data(stream.get_extra_info("server_addr"), stream.get_extra_info("ssl_object")))
+        if capture_headers:
+            result_data["headers"] = _httpx_headers_to_dict(response.headers)
+        timings = result_data["timings"] = _traced_timings(marks)
+        body_started = time.perf_counter_ns()
+        body = _BodyCapture(body_capture, max_body_bytes)
+        try:
+            async for chunk in response.aiter_bytes(BODY_CHUNK_SIZE):
+                if not body.feed(chunk):
+                    break
+        finally:
+            timings["body"] = elapsed(body_started)
+            await response.aclose()
+        body.store(result_data, response.charset_encoding)
+        if response.is_error:
+            result_data["exception-type"] = "HTTPError"
+            kind = "Client" if response.status_code < 500 else "Server"
+            result_data["exception"] = (
+                f"{response.status_code} {kind} Error: {response.reason_phrase} for url: {response.url}"
+            )
     except Exception as e:
         logger.debug(f"Caught exception:\n\n{e}")
         result_data["exception-type"] = e.__class__.__name__
         result_data["exception"] = str(e)
+        if "timings" not in result_data and marks:
+            # The phases reached before the request failed
+            result_data["timings"] = _traced_timings(marks, failed=True)
+    finally:
+        if not shared:
+            await client.aclose()
 
     result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
 
     return output
+
+
+def _http_test_spec(
+    url,
+    method,
+    headers,
+    timeout,
+    verify,
+    source_ip,
+    reuse_connection=True,
+    max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+    body_capture=NetcheckHttpBodyCapture.full,
+) -> dict:
+    if headers is None:
+        headers = {}
+    if "User-Agent" not in headers:
+        headers["User-Agent"] = "netcheck"
+
+    # This structure gets stored along with the test results
+    test_spec = {
+        "type": "http",
+        "timeout": timeout,
+        "verify-tls-cert": verify,
+        "method": method,
+        "headers": headers,
+        "url": url,
+    }
+    if source_ip is not None:
+        test_spec["source-ip"] = source_ip
+    if not reuse_connection:
+        test_spec["reuse-connection"] = False
+    if max_body_bytes != DEFAULT_MAX_BODY_BYTES:
+        test_spec["max-body-bytes"] = max_body_bytes
+    if body_capture != NetcheckHttpBodyCapture.full:
+        test_spec["body-capture"] = NetcheckHttpBodyCapture(body_capture).value
+    return test_spec
+
+
+def _traced_timings(marks: Dict[str, int], failed: bool = False) -> Dict[str, float]:
+    """
+    Timings of a request from the `marks` of httpcore's trace events.
+
+    A phase the request failed in lasts until it failed. Phases that were never started
+    are zero, e.g. connecting on a reused connection, unless the request `failed`, when
+    only the phases it reached are reported.
+    """
+    # httpcore resolves the host as part of connecting, so there is no separate dns phase
+    phases = {
+        "connect": ("connect_tcp.started", "connect_tcp"),
+        "tls": ("start_tls.started", "start_tls"),
+        "ttfb": ("send_request_headers.started", "receive_response_headers"),
+    }
+    timings = {}
+    for phase, (start, end) in phases.items():
+        if start in marks:
+            finished = marks.get(f"{end}.complete", marks.get(f"{end}.failed"))
+            timings[phase] = elapsed(marks[start], finished)
+        elif not failed:
+            timings[phase] = ZERO_DURATION
+    return timings
+
+
+def _httpx_headers_to_dict(headers) -> Dict[str, str]:
+    # Keep the header names as sent by the server, like requests does
+    result = {}
+    for key, value in headers.raw:
+        key = key.decode("latin-1")
+        value = value.decode("latin-1")
+        result[key] = f"{result[key]}, {value}" if key in result else value
+    return result
+
+
+def _body_capture(test_config, fields) -> NetcheckHttpBodyCapture:
+    # Without an explicit mode the body is only kept when the validation rule may read it
+    if "body-capture" in test_config:
+        return NetcheckHttpBodyCapture(test_config["body-capture"])
+    if fields is not None and "body" not in fields and "json" not in fields:
+        return NetcheckHttpBodyCapture.none
+    return NetcheckHttpBodyCapture.full
+
+
+def run_http_rule(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print(f"http check with url '{test_config['url']}'")
+    return http_request_check(
+        test_config["url"],
+        test_config.get("method", "get").lower(),
+        headers=test_config.get("headers"),
+        timeout=test_config.get("timeout"),
+        verify=test_config.get("verify-tls-cert", True),
+        source_ip=test_config.get("source-ip"),
+        reuse_connection=test_config.get("reuse-connection", True),
+        sessions=resources.http_sessions if resources is not None else None,
+        max_body_bytes=test_config.get("max-body-bytes", DEFAULT_MAX_BODY_BYTES),
+        body_capture=_body_capture(test_config, fields),
+        capture_headers=fields is None or "headers" in fields,
+    )
+
+
+async def run_http_rule_async(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print(f"http check with url '{test_config['url']}'")
+    return await http_request_check_async(
+        test_config["url"],
+        test_config.get("method", "get").lower(),
+        headers=test_config.get("headers"),
+        timeout=test_config.get("timeout"),
+        verify=test_config.get("verify-tls-cert", True),
+        source_ip=test_config.get("source-ip"),
+        reuse_connection=test_config.get("reuse-connection", True),
+        clients=resources.async_http_clients if resources is not None else None,
+        max_body_bytes=test_config.get("max-body-bytes", DEFAULT_MAX_BODY_BYTES),
+        body_capture=_body_capture(test_config, fields),
+        capture_headers=fields is None or "headers" in fields,
+    )
+
+
+def _is_safe_method(test_config) -> bool:
+    # Only a GET leaves the server as it was, so other requests are never shared
+    return test_config.get("method", "get").lower() == NetcheckHttpMethod.get
+
+
+CHECK_TYPES = {
+    "http": CheckType(
+        run_http_rule, DEFAULT_HTTP_VALIDATION_RULE, run_http_rule_async, _is_safe_method, DEFAULT_HTTP_TIMEOUT
+    ),
+}
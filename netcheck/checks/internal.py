@@ -1,5 +1,7 @@
 import datetime
 
+from netcheck.checks import CheckType
+
 
 def internal_check(
     timeout=5,
@@ -20,3 +22,16 @@ def internal_check(
     result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
 
     return output
+
+
+def run_internal_rule(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print(f"Internal check with command '{test_config['command']}'")
+    return internal_check(
+        test_config.get("timeout", 5),
+    )
+
+
+CHECK_TYPES = {
+    "internal": CheckType(run_internal_rule, "true"),
+}
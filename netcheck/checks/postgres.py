@@ -1,12 +1,17 @@
 import datetime
 import decimal
 import logging
+import threading
+import time
 from typing import Any, Optional
 import uuid
 
 import psycopg
+from psycopg.pq import TransactionStatus
 from psycopg.rows import dict_row
 
+from netcheck.checks import CheckType, elapsed
+
 logger = logging.getLogger("netcheck.postgres")
 
 DEFAULT_POSTGRES_VALIDATION_RULE = """
@@ -26,6 +31,132 @@ GRANTABLE_PRIVILEGES = {
 }
 
 
+class PostgresConnectionPool:
+    """
+    Idle Postgres connections kept per DSN, shared by the postgres checks of a run.
+
+    A connection is only returned to the pool after its transaction was rolled back,
+    so no session state from a probe outlives it: `set_config(..., true)` settings
+    such as `statement_timeout` are transaction local and `read_only` is set again
+    every time a connection is handed out.
+
+    Args:
+        max_idle: Idle connections kept per DSN. With 0 every connection is closed
+            after use.
+    """
+
+    def __init__(self, max_idle: int = 1):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: dict[str, list[psycopg.Connection]] = {}
+        self._closed = False
+
+    def acquire(self, dsn: str, timeout: float, read_only: bool) -> tuple[psycopg.Connection, bool]:
+        """
+        Return a connection to `dsn` and whether it was reused from the pool.
+
+        An idle connection is pinged before it is handed out, as the server may have
+        closed it since it was released; one that fails is closed and the next idle
+        connection, or a new one, is tried instead.
+        """
+        connection = None
+        while connection is None:
+            with self._lock:
+                idle = self._idle.get(dsn, [])
+                if not idle:
+                    break
+                candidate = idle.pop()
+            if not candidate.closed and _is_alive(candidate):
+                connection = candidate
+        reused = connection is not None
+        if connection is None:
+            connection = psycopg.connect(dsn, connect_timeout=max(1, int(timeout)), row_factory=dict_row)
+        connection.read_only = read_only
+        return connection, reused
+
+    def release(self, dsn: str, connection: psycopg.Connection, reusable: bool = True):
+        """
+        Hand a connection back, closing it unless it is idle and there is room in the pool.
+
+        Once the pool is closed every connection is closed, e.g. one released by a probe
+        abandoned at the run deadline.
+        """
+        if reusable and not connection.closed and connection.info.transaction_status == TransactionStatus.IDLE:
+            with self._lock:
+                idle = self._idle.setdefault(dsn, [])
+                if not self._closed and len(idle) < self.max_idle:
+                    idle.append(connection)
+                    return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for idle in self._idle.values():
+                for connection in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+class AsyncPostgresConnectionPool:
+    """`PostgresConnectionPool` of `psycopg.AsyncConnection` for `postgres_query_check_async`."""
+
+    def __init__(self, max_idle: int = 1):
+        self.max_idle = max_idle
+        self._idle: dict[str, list[psycopg.AsyncConnection]] = {}
+        self._closed = False
+
+    async def acquire(self, dsn: str, timeout: float, read_only: bool) -> tuple[psycopg.AsyncConnection, bool]:
+        connection = None
+        idle = self._idle.get(dsn, [])
+        while idle and connection is None:
+            candidate = idle.pop()
+            if not candidate.closed and await _is_alive_async(candidate):
+                connection = candidate
+        reused = connection is not None
+        if connection is None:
+            connection = await psycopg.AsyncConnection.connect(
+                dsn, connect_timeout=max(1, int(timeout)), row_factory=dict_row
+            )
+        await connection.set_read_only(read_only)
+        return connection, reused
+
+    async def release(self, dsn: str, connection: psycopg.AsyncConnection, reusable: bool = True):
+        if reusable and not connection.closed and connection.info.transaction_status == TransactionStatus.IDLE:
+            idle = self._idle.setdefault(dsn, [])
+            if not self._closed and len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        await connection.close()
+
+    async def aclose(self):
+        self._closed = True
+        for idle in self._idle.values():
+            for connection in idle:
+                await connection.close()
+        self._idle.clear()
+
+
+def _is_alive(connection: psycopg.Connection) -> bool:
+    try:
+        connection.execute("select 1")
+        connection.rollback()
+    except psycopg.Error:
+        connection.close()
+        return False
+    return True
+
+
+async def _is_alive_async(connection: psycopg.AsyncConnection) -> bool:
+    try:
+        await connection.execute("select 1")
+        await connection.rollback()
+    except psycopg.Error:
+        await connection.close()
+        return False
+    return True
+
+
 def postgres_query_check(
     dsn: str,
     query: str,
@@ -34,6 +165,7 @@ def postgres_query_check(
     read_only: bool = True,
     rollback: bool = True,
     row_limit: int = 100,
+    connections: Optional[PostgresConnectionPool] = None,
 ) -> dict:
     test_spec = {
         "type": "postgres",
@@ -50,6 +182,8 @@ def postgres_query_check(
     }
     output = {"spec": test_spec, "data": result_data}
 
+    # Filled in as the probe gets through each phase, so a failed probe reports them too
+    timings = {}
     try:
         result = _execute_query(
             dsn=dsn,
@@ -59,6 +193,8 @@ def postgres_query_check(
             read_only=read_only,
             rollback=rollback,
             row_limit=row_limit,
+            connections=connections,
+            timings=timings,
         )
         result_data.update(result)
         result_data["success"] = True
@@ -70,6 +206,65 @@ def postgres_query_check(
         sqlstate = getattr(error, "sqlstate", None)
         if sqlstate is not None:
             result_data["sqlstate"] = sqlstate
+    if timings:
+        result_data["timings"] = timings
+
+    result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
+    return output
+
+
+async def postgres_query_check_async(
+    dsn: str,
+    query: str,
+    params: Optional[list[Any] | dict[str, Any]] = None,
+    timeout: float = 5,
+    read_only: bool = True,
+    rollback: bool = True,
+    row_limit: int = 100,
+    connections: Optional[AsyncPostgresConnectionPool] = None,
+) -> dict:
+    """Coroutine version of `postgres_query_check` using `psycopg.AsyncConnection`."""
+    test_spec = {
+        "type": "postgres",
+        "dsn": dsn,
+        "query": query,
+        "params": params,
+        "timeout": timeout,
+        "read-only": read_only,
+        "rollback": rollback,
+        "row-limit": row_limit,
+    }
+    result_data = {
+        "startTimestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+    }
+    output = {"spec": test_spec, "data": result_data}
+
+    # Filled in as the probe gets through each phase, so a failed probe reports them too
+    timings = {}
+    try:
+        result = await _execute_query_async(
+            dsn=dsn,
+            query=query.strip(),
+            params=params,
+            timeout=timeout,
+            read_only=read_only,
+            rollback=rollback,
+            row_limit=row_limit,
+            connections=connections,
+            timings=timings,
+        )
+        result_data.update(result)
+        result_data["success"] = True
+    except Exception as error:
+        logger.debug("Postgres check failed", exc_info=error)
+        result_data["success"] = False
+        result_data["exception-type"] = error.__class__.__name__
+        result_data["exception"] = str(error)
+        sqlstate = getattr(error, "sqlstate", None)
+        if sqlstate is not None:
+            result_data["sqlstate"] = sqlstate
+    if timings:
+        result_data["timings"] = timings
 
     result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
     return output
@@ -79,6 +274,8 @@ def postgres_grants_check(
     dsn: str,
     rules: list[dict[str, Any]],
     timeout: float = 5,
+    catalogs: Optional["PostgresCatalogRegistry"] = None,
+    connections: Optional[PostgresConnectionPool] = None,
 ) -> dict:
     test_spec = {
         "type": "postgres-grants",
@@ -93,13 +290,25 @@ def postgres_grants_check(
     }
     output = {"spec": test_spec, "data": result_data}
 
+    if connections is None:
+        connections = PostgresConnectionPool(max_idle=0)
+
+    phases = _Phases(result_data.setdefault("timings", {}))
     try:
-        with psycopg.connect(dsn, connect_timeout=max(1, int(timeout)), row_factory=dict_row) as connection:
+        phases.start("connect")
+        connection, result_data["connection-reused"] = connections.acquire(dsn, timeout, read_only=True)
+        phases.start("query")
+        reusable = False
+        try:
             with connection.cursor() as cursor:
                 cursor.execute("select set_config('statement_timeout', %s, true)", (str(max(1, int(timeout * 1000))),))
+                catalog = catalogs.snapshot(dsn) if catalogs is not None else PostgresCatalogSnapshot()
                 for rule in rules:
-                    result_data["violations"].extend(_evaluate_grant_rule(cursor, rule))
-                connection.rollback()
+                    result_data["violations"].extend(_evaluate_grant_rule(cursor, rule, catalog))
+            connection.rollback()
+            reusable = True
+        finally:
+            connections.release(dsn, connection, reusable)
         result_data["success"] = True
     except Exception as error:
         logger.debug("Postgres grants check failed", exc_info=error)
@@ -109,6 +318,8 @@ def postgres_grants_check(
         sqlstate = getattr(error, "sqlstate", None)
         if sqlstate is not None:
             result_data["sqlstate"] = sqlstate
+    finally:
+        phases.stop()
 
     result_data["violation-count"] = len(result_data["violations"])
     result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
@@ -123,33 +334,133 @@ def _execute_query(
     read_only: bool,
     rollback: bool,
     row_limit: int,
+    connections: Optional[PostgresConnectionPool] = None,
+    timings: Optional[dict[str, float]] = None,
 ) -> dict:
-    with psycopg.connect(dsn, connect_timeout=max(1, int(timeout)), row_factory=dict_row) as connection:
-        connection.read_only = read_only
-        with connection.cursor() as cursor:
-            cursor.execute("select set_config('statement_timeout', %s, true)", (str(max(1, int(timeout * 1000))),))
-            cursor.execute(query, params)
+    if connections is None:
+        connections = PostgresConnectionPool(max_idle=0)
 
-            rows = []
-            columns = []
-            if cursor.description is not None:
-                columns = [column.name for column in cursor.description]
-                rows = [_jsonable(row) for row in cursor.fetchmany(row_limit)]
+    phases = _Phases(timings if timings is not None else {})
+    phases.start("connect")
+    try:
+        connection, reused = connections.acquire(dsn, timeout, read_only)
+        phases.start("query")
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "select set_config('statement_timeout', %s, true)", (str(max(1, int(timeout * 1000))),)
+                )
+                cursor.execute(query, params)
+                phases.start("fetch")
+
+                rows = []
+                columns = []
+                if cursor.description is not None:
+                    columns = [column.name for column in cursor.description]
+                    rows = [_jsonable(row) for row in cursor.fetchmany(row_limit)] if row_limit > 0 else []
+
+                row_count = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else len(rows)
+
+            phases.start("query")
+            if rollback:
+                connection.rollback()
+            else:
+                connection.commit()
+        finally:
+            # Committed connections may carry session state set by the query, so only
+            # rolled back connections go back to the pool
+            connections.release(dsn, connection, reusable=rollback)
+    finally:
+        phases.stop()
 
-            row_count = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else len(rows)
+    return {
+        "row-count": row_count,
+        "columns": columns,
+        "rows": rows,
+        "connection-reused": reused,
+        "timings": phases.timings,
+    }
 
-        if rollback:
-            connection.rollback()
-        else:
-            connection.commit()
+
+async def _execute_query_async(
+    dsn: str,
+    query: str,
+    params: Optional[list[Any] | dict[str, Any]],
+    timeout: float,
+    read_only: bool,
+    rollback: bool,
+    row_limit: int,
+    connections: Optional[AsyncPostgresConnectionPool] = None,
+    timings: Optional[dict[str, float]] = None,
+) -> dict:
+    if connections is None:
+        connections = AsyncPostgresConnectionPool(max_idle=0)
+
+    phases = _Phases(timings if timings is not None else {})
+    phases.start("connect")
+    try:
+        connection, reused = await connections.acquire(dsn, timeout, read_only)
+        phases.start("query")
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    "select set_config('statement_timeout', %s, true)", (str(max(1, int(timeout * 1000))),)
+                )
+                await cursor.execute(query, params)
+                phases.start("fetch")
+
+                rows = []
+                columns = []
+                if cursor.description is not None:
+                    columns = [column.name for column in cursor.description]
+                    rows = [_jsonable(row) for row in await cursor.fetchmany(row_limit)] if row_limit > 0 else []
+
+                row_count = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else len(rows)
+
+            phases.start("query")
+            if rollback:
+                await connection.rollback()
+            else:
+                await connection.commit()
+        finally:
+            await connections.release(dsn, connection, reusable=rollback)
+    finally:
+        phases.stop()
 
     return {
         "row-count": row_count,
         "columns": columns,
         "rows": rows,
+        "connection-reused": reused,
+        "timings": phases.timings,
     }
 
 
+class _Phases:
+    """
+    Times the consecutive phases of a probe into `timings`: acquiring a connection
+    (`connect`), running the query and ending its transaction (`query`) and fetching
+    the result rows (`fetch`). A phase started again is added to its total. Phases are
+    recorded as they end, so a probe that fails still reports those it reached,
+    including the one it failed in.
+    """
+
+    def __init__(self, timings: dict[str, float]):
+        self.timings = timings
+        self._phase = None
+        self._started = 0
+
+    def start(self, phase: str):
+        self.stop()
+        self._phase = phase
+        self._started = time.perf_counter_ns()
+
+    def stop(self):
+        if self._phase is not None:
+            self.timings[self._phase] = round(self.timings.get(self._phase, 0.0) + elapsed(self._started), 6)
+            self._phase = None
+
+
 def _jsonable(value):
     if isinstance(value, dict):
         return {key: _jsonable(item) for key, item in value.items()}
@@ -166,7 +477,7 @@ def _jsonable(value):
     return value
 
 
-def _evaluate_grant_rule(cursor, rule: dict[str, Any]) -> list[dict[str, Any]]:
+def _evaluate_grant_rule(cursor, rule: dict[str, Any], catalog: "PostgresCatalogSnapshot") -> list[dict[str, Any]]:
     rule_name = rule.get("name", "unnamed")
     mode = rule.get("mode", "deny")
     if mode not in {"deny", "require"}:
@@ -186,158 +497,255 @@ def _evaluate_grant_rule(cursor, rule: dict[str, Any]) -> list[dict[str, Any]]:
             f"postgres-grants rule '{rule_name}' has unsupported {object_type} privileges: {', '.join(unsupported)}"
         )
 
-    role_names = _selected_roles(cursor, rule.get("roles", {}))
-    objects = _selected_objects(cursor, object_type, object_selector)
+    role_names = _selected_roles(catalog.roles(cursor), rule.get("roles", {}))
+    objects = _selected_objects(cursor, catalog, object_type, object_selector)
 
     violations = []
-    for role_name in role_names:
-        for object_ref in objects:
-            for privilege in privileges:
-                has_privilege = _has_privilege(cursor, role_name, object_type, object_ref["identity"], privilege)
-                if (mode == "deny" and has_privilege) or (mode == "require" and not has_privilege):
-                    violations.append(
-                        {
-                            "rule": rule_name,
-                            "role": role_name,
-                            "object-type": object_type,
-                            "schema": object_ref.get("schema"),
-                            "object": object_ref["name"],
-                            "privilege": privilege,
-                            "expected": "absent" if mode == "deny" else "present",
-                        }
-                    )
+    for role_index, object_index, privilege_index in _privilege_violations(
+        cursor, mode, object_type, role_names, [object_ref["identity"] for object_ref in objects], privileges
+    ):
+        object_ref = objects[object_index]
+        violations.append(
+            {
+                "rule": rule_name,
+                "role": role_names[role_index],
+                "object-type": object_type,
+                "schema": object_ref.get("schema"),
+                "object": object_ref["name"],
+                "privilege": privileges[privilege_index],
+                "expected": "absent" if mode == "deny" else "present",
+            }
+        )
 
     return violations
 
 
-def _selected_roles(cursor, selector: dict[str, Any]) -> list[str]:
-    requested_names = selector.get("names")
-    include_system_roles = bool(selector.get("include-system-roles", False))
-    exclude_names = set(selector.get("exclude", []))
-    member_of = selector.get("member-of", [])
-    exclude_member_of = selector.get("exclude-member-of", [])
+class PostgresCatalogSnapshot:
+    """
+    Roles, databases, schemas, relations and functions read from the system catalogs.
 
-    conditions = []
-    params: list[Any] = []
-    if requested_names:
-        conditions.append("r.rolname = any(%s)")
-        params.append(requested_names)
-    if "login" in selector:
-        conditions.append("r.rolcanlogin = %s")
-        params.append(bool(selector["login"]))
-    if not include_system_roles:
-        conditions.append("r.rolname !~ '^pg_'")
-    if exclude_names:
-        conditions.append("not r.rolname = any(%s)")
-        params.append(list(exclude_names))
-    for parent_role in member_of:
-        conditions.append("pg_has_role(r.rolname, %s, 'member')")
-        params.append(parent_role)
-    for parent_role in exclude_member_of:
-        conditions.append("not pg_has_role(r.rolname, %s, 'member')")
-        params.append(parent_role)
-
-    where_clause = " and ".join(conditions) if conditions else "true"
-    cursor.execute(f"select r.rolname from pg_roles r where {where_clause} order by r.rolname", params)
-    return [row["rolname"] for row in cursor.fetchall()]
-
-
-def _selected_objects(cursor, object_type: str, selector: dict[str, Any]) -> list[dict[str, Any]]:
-    match object_type:
-        case "database":
-            return _selected_databases(cursor, selector)
-        case "schema":
-            return _selected_schemas(cursor, selector)
-        case "table":
-            # r=table, p=partitioned, v=view, m=materialized view, f=foreign table
-            # has_table_privilege applies to all of these
-            return _selected_relations(cursor, selector, relation_kinds=["r", "p", "v", "m", "f"])
-        case "sequence":
-            return _selected_relations(cursor, selector, relation_kinds=["S"])
-        case "function":
-            return _selected_functions(cursor, selector)
-        case _:
-            raise ValueError(f"unsupported object type '{object_type}'")
+    Each part of the catalog is loaded the first time a grants rule needs it and then
+    reused by every later rule, so selectors are resolved in memory instead of scanning
+    `pg_class` or `pg_proc` once per rule. Rows keep the server's sort order.
+    """
 
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parts: dict[str, list[dict[str, Any]]] = {}
 
-def _selected_databases(cursor, selector: dict[str, Any]) -> list[dict[str, Any]]:
-    names = selector.get("names")
-    params = []
-    where_clause = "datallowconn"
-    if names and names != ["*"]:
-        where_clause += " and datname = any(%s)"
-        params.append(names)
-    cursor.execute(f"select datname from pg_database where {where_clause} order by datname", params)
+    def roles(self, cursor) -> list[dict[str, Any]]:
+        return self._load(cursor, "roles", _load_roles)
+
+    def databases(self, cursor) -> list[dict[str, Any]]:
+        return self._load(cursor, "databases", _load_databases)
+
+    def schemas(self, cursor) -> list[dict[str, Any]]:
+        return self._load(cursor, "schemas", _load_schemas)
+
+    def relations(self, cursor) -> list[dict[str, Any]]:
+        return self._load(cursor, "relations", _load_relations)
+
+    def functions(self, cursor) -> list[dict[str, Any]]:
+        return self._load(cursor, "functions", _load_functions)
+
+    def _load(self, cursor, part: str, loader) -> list[dict[str, Any]]:
+        with self._lock:
+            if part not in self._parts:
+                self._parts[part] = loader(cursor)
+            return self._parts[part]
+
+
+class PostgresCatalogRegistry:
+    """One `PostgresCatalogSnapshot` per DSN, shared by the `postgres-grants` checks of a run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: dict[str, PostgresCatalogSnapshot] = {}
+
+    def snapshot(self, dsn: str) -> PostgresCatalogSnapshot:
+        with self._lock:
+            if dsn not in self._snapshots:
+                self._snapshots[dsn] = PostgresCatalogSnapshot()
+            return self._snapshots[dsn]
+
+
+def _load_roles(cursor) -> list[dict[str, Any]]:
+    cursor.execute("select r.rolname, r.rolcanlogin, r.rolsuper from pg_roles r order by r.rolname")
+    roles = cursor.fetchall()
+    cursor.execute(
+        """
+        select member.rolname as member, parent.rolname as parent
+        from pg_auth_members m
+        join pg_roles member on member.oid = m.member
+        join pg_roles parent on parent.oid = m.roleid
+        """
+    )
+    parents: dict[str, set[str]] = {}
+    for row in cursor.fetchall():
+        parents.setdefault(row["member"], set()).add(row["parent"])
+
+    # Same semantics as pg_has_role(role, parent, 'member'): a role is a member of
+    # itself and of every role reachable through pg_auth_members.
+    def memberships(role_name: str) -> frozenset[str]:
+        seen = {role_name}
+        pending = [role_name]
+        while pending:
+            for parent in parents.get(pending.pop(), ()):
+                if parent not in seen:
+                    seen.add(parent)
+                    pending.append(parent)
+        return frozenset(seen)
+
+    return [
+        {
+            "name": row["rolname"],
+            "login": bool(row["rolcanlogin"]),
+            "superuser": bool(row["rolsuper"]),
+            "member-of": memberships(row["rolname"]),
+        }
+        for row in roles
+    ]
+
+
+def _load_databases(cursor) -> list[dict[str, Any]]:
+    cursor.execute("select datname from pg_database where datallowconn order by datname")
     return [{"name": row["datname"], "identity": row["datname"]} for row in cursor.fetchall()]
 
 
-def _selected_schemas(cursor, selector: dict[str, Any]) -> list[dict[str, Any]]:
-    names = selector.get("names")
-    params = []
-    conditions = ["left(nspname, 3) <> 'pg_'", "nspname <> 'information_schema'"]
-    if names and names != ["*"]:
-        conditions.append("nspname = any(%s)")
-        params.append(names)
+def _load_schemas(cursor) -> list[dict[str, Any]]:
     cursor.execute(
-        f"select nspname from pg_namespace where {' and '.join(conditions)} order by nspname",
-        params,
+        """
+        select nspname from pg_namespace
+        where left(nspname, 3) <> 'pg_' and nspname <> 'information_schema'
+        order by nspname
+        """
     )
     return [{"name": row["nspname"], "identity": row["nspname"]} for row in cursor.fetchall()]
 
 
-def _selected_relations(cursor, selector: dict[str, Any], relation_kinds: list[str]) -> list[dict[str, Any]]:
-    schemas = selector.get("schemas")
-    names = selector.get("names")
-    params: list[Any] = [relation_kinds]
-    conditions = ["c.relkind = any(%s)", "left(n.nspname, 3) <> 'pg_'", "n.nspname <> 'information_schema'"]
-    if schemas and schemas != ["*"]:
-        conditions.append("n.nspname = any(%s)")
-        params.append(schemas)
-    if names and names != ["*"]:
-        conditions.append("c.relname = any(%s)")
-        params.append(names)
+def _load_relations(cursor) -> list[dict[str, Any]]:
     cursor.execute(
-        f"""
-        select n.nspname as schema_name, c.relname, c.oid::regclass::text as identity
+        """
+        select n.nspname as schema_name, c.relname, c.relkind, c.oid::regclass::text as identity
         from pg_class c
         join pg_namespace n on n.oid = c.relnamespace
-        where {" and ".join(conditions)}
+        where c.relkind = any(%s) and left(n.nspname, 3) <> 'pg_' and n.nspname <> 'information_schema'
         order by n.nspname, c.relname
         """,
-        params,
+        (["r", "p", "v", "m", "f", "S"],),
     )
     return [
-        {"schema": row["schema_name"], "name": row["relname"], "identity": row["identity"]} for row in cursor.fetchall()
+        {"schema": row["schema_name"], "name": row["relname"], "kind": row["relkind"], "identity": row["identity"]}
+        for row in cursor.fetchall()
     ]
 
 
-def _selected_functions(cursor, selector: dict[str, Any]) -> list[dict[str, Any]]:
-    schemas = selector.get("schemas")
-    names = selector.get("names")
-    params = []
-    conditions = ["left(n.nspname, 3) <> 'pg_'", "n.nspname <> 'information_schema'"]
-    if schemas and schemas != ["*"]:
-        conditions.append("n.nspname = any(%s)")
-        params.append(schemas)
-    if names and names != ["*"]:
-        conditions.append("p.proname = any(%s)")
-        params.append(names)
+def _load_functions(cursor) -> list[dict[str, Any]]:
     cursor.execute(
-        f"""
+        """
         select n.nspname as schema_name, p.proname, p.oid::regprocedure::text as identity
         from pg_proc p
         join pg_namespace n on n.oid = p.pronamespace
-        where {" and ".join(conditions)}
+        where left(n.nspname, 3) <> 'pg_' and n.nspname <> 'information_schema'
         order by n.nspname, p.proname, p.oid
-        """,
-        params,
+        """
     )
     return [
         {"schema": row["schema_name"], "name": row["proname"], "identity": row["identity"]} for row in cursor.fetchall()
     ]
 
 
-def _has_privilege(cursor, role_name: str, object_type: str, object_identity: str, privilege: str) -> bool:
+def _selected_roles(roles: list[dict[str, Any]], selector: dict[str, Any]) -> list[str]:
+    requested_names = selector.get("names")
+    include_system_roles = bool(selector.get("include-system-roles", False))
+    exclude_names = set(selector.get("exclude", []))
+    member_of = selector.get("member-of", [])
+    exclude_member_of = selector.get("exclude-member-of", [])
+
+    known_roles = {role["name"] for role in roles}
+    for parent_role in [*member_of, *exclude_member_of]:
+        if parent_role not in known_roles:
+            # The error postgres raises for an unknown role, so results keep its sqlstate (42704)
+            raise psycopg.errors.UndefinedObject(f'role "{parent_role}" does not exist')
+
+    def is_member(role: dict[str, Any], parent_role: str) -> bool:
+        # Superusers are members of every role
+        return role["superuser"] or parent_role in role["member-of"]
+
+    return [
+        role["name"]
+        for role in roles
+        if (not requested_names or role["name"] in requested_names)
+        and ("login" not in selector or role["login"] == bool(selector["login"]))
+        and (include_system_roles or not role["name"].startswith("pg_"))
+        and role["name"] not in exclude_names
+        and all(is_member(role, parent_role) for parent_role in member_of)
+        and not any(is_member(role, parent_role) for parent_role in exclude_member_of)
+    ]
+
+
+def _selected_objects(
+    cursor, catalog: PostgresCatalogSnapshot, object_type: str, selector: dict[str, Any]
+) -> list[dict[str, Any]]:
+    match object_type:
+        case "database":
+            return _filter_by_name(catalog.databases(cursor), selector)
+        case "schema":
+            return _filter_by_name(catalog.schemas(cursor), selector)
+        case "table":
+            # r=table, p=partitioned, v=view, m=materialized view, f=foreign table
+            # has_table_privilege applies to all of these
+            return _selected_relations(catalog.relations(cursor), selector, relation_kinds=["r", "p", "v", "m", "f"])
+        case "sequence":
+            return _selected_relations(catalog.relations(cursor), selector, relation_kinds=["S"])
+        case "function":
+            return _filter_by_schema_and_name(catalog.functions(cursor), selector)
+        case _:
+            raise ValueError(f"unsupported object type '{object_type}'")
+
+
+def _filter_by_name(objects: list[dict[str, Any]], selector: dict[str, Any]) -> list[dict[str, Any]]:
+    names = selector.get("names")
+    if not names or names == ["*"]:
+        return objects
+    return [object_ref for object_ref in objects if object_ref["name"] in names]
+
+
+def _filter_by_schema_and_name(objects: list[dict[str, Any]], selector: dict[str, Any]) -> list[dict[str, Any]]:
+    schemas = selector.get("schemas")
+    if schemas and schemas != ["*"]:
+        objects = [object_ref for object_ref in objects if object_ref["schema"] in schemas]
+    return _filter_by_name(objects, selector)
+
+
+def _selected_relations(
+    relations: list[dict[str, Any]], selector: dict[str, Any], relation_kinds: list[str]
+) -> list[dict[str, Any]]:
+    relations = [
+        {"schema": relation["schema"], "name": relation["name"], "identity": relation["identity"]}
+        for relation in relations
+        if relation["kind"] in relation_kinds
+    ]
+    return _filter_by_schema_and_name(relations, selector)
+
+
+def _privilege_violations(
+    cursor,
+    mode: str,
+    object_type: str,
+    role_names: list[str],
+    object_identities: list[str],
+    privileges: list[str],
+) -> list[tuple[int, int, int]]:
+    """
+    Check every role × object × privilege combination in a single query.
+
+    Returns the zero based (role, object, privilege) indexes of the combinations that
+    violate the rule, in role, object, privilege order: privileges that are held for a
+    `deny` rule, or missing for a `require` rule.
+    """
+    if not role_names or not object_identities:
+        return []
     function_name = {
         "database": "has_database_privilege",
         "schema": "has_schema_privilege",
@@ -345,5 +753,83 @@ def _has_privilege(cursor, role_name: str, object_type: str, object_identity: st
         "sequence": "has_sequence_privilege",
         "function": "has_function_privilege",
     }[object_type]
-    cursor.execute(f"select {function_name}(%s, %s, %s) as allowed", (role_name, object_identity, privilege))
-    return bool(cursor.fetchone()["allowed"])
+    condition = f"{function_name}(r.role_name, o.identity, p.privilege)"
+    if mode == "require":
+        condition = f"not {condition}"
+    cursor.execute(
+        f"""
+        select r.role_index, o.object_index, p.privilege_index
+        from unnest(%s::text[]) with ordinality as r(role_name, role_index)
+        cross join unnest(%s::text[]) with ordinality as o(identity, object_index)
+        cross join unnest(%s::text[]) with ordinality as p(privilege, privilege_index)
+        where {condition}
+        order by r.role_index, o.object_index, p.privilege_index
+        """,
+        (role_names, object_identities, privileges),
+    )
+    return [
+        (row["role_index"] - 1, row["object_index"] - 1, row["privilege_index"] - 1) for row in cursor.fetchall()
+    ]
+
+
+def _row_limit(test_config, fields) -> int:
+    # Rows are only fetched when the validation rule may read them
+    if fields is not None and "rows" not in fields:
+        return 0
+    return test_config.get("row-limit", 100)
+
+
+def run_postgres_rule(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print("Postgres check running SQL statement")
+    return postgres_query_check(
+        dsn=test_config["dsn"],
+        query=test_config["query"],
+        params=test_config.get("params"),
+        timeout=test_config.get("timeout", 5),
+        read_only=test_config.get("read-only", True),
+        rollback=test_config.get("rollback", True),
+        row_limit=_row_limit(test_config, fields),
+        connections=resources.postgres_connections if resources is not None else None,
+    )
+
+
+async def run_postgres_rule_async(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print("Postgres check running SQL statement")
+    return await postgres_query_check_async(
+        dsn=test_config["dsn"],
+        query=test_config["query"],
+        params=test_config.get("params"),
+        timeout=test_config.get("timeout", 5),
+        read_only=test_config.get("read-only", True),
+        rollback=test_config.get("rollback", True),
+        row_limit=_row_limit(test_config, fields),
+        connections=resources.async_postgres_connections if resources is not None else None,
+    )
+
+
+def run_postgres_grants_rule(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print("Postgres grants check evaluating effective privileges")
+    return postgres_grants_check(
+        dsn=test_config["dsn"],
+        rules=test_config.get("rules", []),
+        timeout=test_config.get("timeout", 5),
+        catalogs=resources.postgres_catalogs if resources is not None else None,
+        connections=resources.postgres_connections if resources is not None else None,
+    )
+
+
+def _is_read_only(test_config) -> bool:
+    # A statement that may write, or is committed, may change what the next one sees, so
+    # it is only shared when it runs read-only and is rolled back
+    return test_config.get("read-only", True) and test_config.get("rollback", True)
+
+
+CHECK_TYPES = {
+    "postgres": CheckType(
+        run_postgres_rule, DEFAULT_POSTGRES_VALIDATION_RULE, run_postgres_rule_async, _is_read_only, default_timeout=5
+    ),
+    "postgres-grants": CheckType(run_postgres_grants_rule, DEFAULT_POSTGRES_GRANTS_VALIDATION_RULE, default_timeout=5),
+}
@@ -1,8 +1,12 @@
+import asyncio
 import datetime
 import logging
 import socket
+import time
 from typing import Optional
 
+from netcheck.checks import CheckType, elapsed
+
 logger = logging.getLogger("netcheck.tcp")
 DEFAULT_TCP_VALIDATION_RULE = """
 data.connected == true
@@ -29,10 +33,12 @@ def tcp_check(
 
     source_address = (source_ip, 0) if source_ip is not None else None
 
+    started = time.perf_counter_ns()
     try:
         with socket.create_connection(
             (host, port), timeout=timeout, source_address=source_address
         ):
+            result_data["timings"] = {"connect": elapsed(started)}
             result_data["connected"] = True
             result_data["error"] = None
     except socket.timeout:
@@ -47,7 +53,86 @@ def tcp_check(
         logger.debug(f"TCP connection to {host}:{port} failed: {e}")
         result_data["connected"] = False
         result_data["error"] = str(e)
+    # Failed connections report how long it took to give up
+    result_data.setdefault("timings", {"connect": elapsed(started)})
 
     result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
 
     return output
+
+
+async def tcp_check_async(
+    host: str, port: int, timeout: float = 5, source_ip: Optional[str] = None
+) -> dict:
+    test_spec = {
+        "type": "tcp",
+        "host": host,
+        "port": port,
+        "timeout": timeout,
+    }
+    if source_ip is not None:
+        test_spec["source-ip"] = source_ip
+
+    result_data = {
+        "startTimestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+    }
+
+    output = {"spec": test_spec, "data": result_data}
+
+    local_addr = (source_ip, 0) if source_ip is not None else None
+
+    started = time.perf_counter_ns()
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, local_addr=local_addr), timeout=timeout
+        )
+        result_data["timings"] = {"connect": elapsed(started)}
+        writer.close()
+        await writer.wait_closed()
+        result_data["connected"] = True
+        result_data["error"] = None
+    except (asyncio.TimeoutError, socket.timeout):
+        logger.debug(f"TCP connection to {host}:{port} timed out")
+        result_data["connected"] = False
+        result_data["error"] = f"Connection timed out after {timeout}s"
+    except ConnectionRefusedError:
+        logger.debug(f"TCP connection to {host}:{port} refused")
+        result_data["connected"] = False
+        result_data["error"] = f"Connection refused to {host}:{port}"
+    except OSError as e:
+        logger.debug(f"TCP connection to {host}:{port} failed: {e}")
+        result_data["connected"] = False
+        result_data["error"] = str(e)
+    # Failed connections report how long it took to give up
+    result_data.setdefault("timings", {"connect": elapsed(started)})
+
+    result_data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
+
+    return output
+
+
+def run_tcp_rule(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print(f"TCP check connecting to {test_config['host']}:{test_config['port']}")
+    return tcp_check(
+        host=test_config["host"],
+        port=int(test_config["port"]),
+        timeout=test_config.get("timeout", 5),
+        source_ip=test_config.get("source-ip"),
+    )
+
+
+async def run_tcp_rule_async(test_config, err_console, verbose=False, resources=None, fields=None):
+    if verbose:
+        err_console.print(f"TCP check connecting to {test_config['host']}:{test_config['port']}")
+    return await tcp_check_async(
+        host=test_config["host"],
+        port=int(test_config["port"]),
+        timeout=test_config.get("timeout", 5),
+        source_ip=test_config.get("source-ip"),
+    )
+
+
+CHECK_TYPES = {
+    "tcp": CheckType(run_tcp_rule, DEFAULT_TCP_VALIDATION_RULE, run_tcp_rule_async, default_timeout=5),
+}
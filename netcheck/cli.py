@@ -1,17 +1,14 @@
 import json
 import logging
+import sys
 from enum import Enum
 from pathlib import Path
-from rich import print_json
-from rich.console import Console
 import typer
 from typing import List, Optional
 
-from netcheck.checks.dns import DEFAULT_DNS_VALIDATION_RULE
-from netcheck.checks.tcp import DEFAULT_TCP_VALIDATION_RULE
-from netcheck.checks.postgres import DEFAULT_POSTGRES_VALIDATION_RULE
-from netcheck.checks.http import NetcheckHttpMethod
-from netcheck.runner import run_from_config, check_individual_assertion
+from netcheck.checks import NetcheckHttpBodyCapture, NetcheckHttpMethod
+from netcheck.output import write_compact_json, write_pretty_json
+from netcheck.runner import run_from_config, check_individual_assertion, default_validation_rule, NetcheckEngine
 from netcheck.version import NETCHECK_VERSION
 
 
@@ -20,11 +17,26 @@ logger = logging.getLogger("netcheck")
 # logging.basicConfig(level=logging.INFO)
 logging.captureWarnings(True)
 
-err_console = Console(stderr=True)
+class _StderrConsole:
+    """Rich console on stderr that is only created (and rich imported) when first used."""
+
+    _console = None
+
+    def __getattr__(self, name):
+        if self._console is None:
+            from rich.console import Console
+
+            self._console = Console(stderr=True)
+        return getattr(self._console, name)
+
+
+err_console = _StderrConsole()
 
 
 class NetcheckOutputType(str, Enum):
     json = "json"
+    json_compact = "json-compact"
+    ndjson = "ndjson"
 
 
 class NetcheckTestType(str, Enum):
@@ -61,11 +73,68 @@ def run(
         file_okay=True,
         help="Config file with netcheck assertions",
     ),
-    # output: Optional[NetcheckOutputType] = typer.Option(
-    #     NetcheckOutputType.json, "-o", "--output", help="Output format"
-    # ),
+    output: Optional[NetcheckOutputType] = typer.Option(
+        None,
+        "-o",
+        "--output",
+        case_sensitive=False,
+        help=(
+            "Output format. Defaults to pretty json on a terminal, and json-compact otherwise. "
+            "ndjson streams one record per rule as it finishes"
+        ),
+    ),
     verbose: bool = typer.Option(False, "-v", "--verbose"),
     disable_redaction: bool = typer.Option(False, "--disable-redaction", is_flag=True),
+    concurrency: int = typer.Option(
+        1,
+        "--concurrency",
+        "-j",
+        min=1,
+        help=(
+            "Maximum number of rules to check in parallel. Probes abandoned at their time limit or the deadline"
+            " keep running in the background and don't count towards it"
+        ),
+    ),
+    engine: NetcheckEngine = typer.Option(
+        NetcheckEngine.threads,
+        "--engine",
+        case_sensitive=False,
+        help="Run blocking checks on a thread pool, or coroutine checks on one asyncio event loop",
+    ),
+    pool_size: Optional[int] = typer.Option(
+        None,
+        "--pool-size",
+        min=1,
+        help="Connections kept open per host and shared between rules (defaults to --concurrency)",
+    ),
+    capture_all: bool = typer.Option(
+        False,
+        "--capture-all",
+        help="Capture every result field, not only those the validation rules read (implied by --disable-redaction)",
+    ),
+    metrics_textfile: Optional[Path] = typer.Option(
+        None,
+        "--metrics-textfile",
+        dir_okay=False,
+        help="Also write Prometheus metrics about the run to this file, e.g. for node_exporter's textfile collector",
+    ),
+    deadline: Optional[float] = typer.Option(
+        None,
+        "--deadline",
+        min=0.001,
+        help="Seconds the whole run may take. Rules still outstanding are reported as error (running) or skip",
+    ),
+    rule_timeout: Optional[float] = typer.Option(
+        None,
+        "--rule-timeout",
+        min=0.001,
+        help="Seconds any one rule may take, however slowly its server responds (rules are also held to their timeout)",
+    ),
+    deduplicate: bool = typer.Option(
+        True,
+        "--deduplicate/--no-deduplicate",
+        help="Probe once for rules that send the same probe, and validate each rule against the shared result",
+    ),
 ):
     """
     Carry out all network assertions in given config file.
@@ -74,15 +143,144 @@ def run(
     with config.open() as f:
         data = json.load(f)
 
+    metrics = None
+    if metrics_textfile is not None:
+        from netcheck.metrics import MetricsRegistry
+
+        metrics = MetricsRegistry()
+
     # TODO: Validate the config format once stable
-    overall_results = run_from_config(data, err_console, verbose, disable_redaction)
+    overall_results = run_from_config(
+        data,
+        err_console,
+        verbose,
+        disable_redaction,
+        concurrency=concurrency,
+        engine=engine,
+        pool_size=pool_size,
+        stream=write_compact_json if output == NetcheckOutputType.ndjson else None,
+        metrics=metrics,
+        capture_all=capture_all,
+        deadline=deadline,
+        rule_timeout=rule_timeout,
+        deduplicate=deduplicate,
+    )
+    if metrics is not None:
+        metrics.write_textfile(str(metrics_textfile))
+    if output == NetcheckOutputType.ndjson:
+        # Every record, including the summary, has already been written
+        return
 
     if not verbose:
         # Unless we are in verbose mode we strip the context from
         # the output
         overall_results.pop("context", None)
 
-    print_json(data=overall_results)
+    write_output(overall_results, output)
+
+
+@app.command()
+def serve(
+    config: List[Path] = typer.Option(
+        ...,
+        "--config",
+        "-c",
+        exists=True,
+        file_okay=True,
+        help="Config file with netcheck assertions. May be given more than once",
+    ),
+    interval: float = typer.Option(
+        60.0, "--interval", min=0.001, help="Seconds between runs of assertions without their own interval"
+    ),
+    jitter: float = typer.Option(
+        0.1, "--jitter", min=0, max=0.99, help="Random variation of each interval, as a fraction of it"
+    ),
+    concurrency: int = typer.Option(
+        1,
+        "--concurrency",
+        "-j",
+        min=1,
+        help=(
+            "Maximum number of assertions to run in parallel. Probes abandoned at their time limit keep running"
+            " in the background and don't count towards it"
+        ),
+    ),
+    pool_size: Optional[int] = typer.Option(
+        None,
+        "--pool-size",
+        min=1,
+        help="Connections kept open per host and shared between runs (defaults to --concurrency)",
+    ),
+    output: Optional[NetcheckOutputType] = typer.Option(
+        None, "-o", "--output", case_sensitive=False, help="Output format for each run's results"
+    ),
+    capture_all: bool = typer.Option(
+        False,
+        "--capture-all",
+        help="Capture every result field, not only those the validation rules read (implied by --disable-redaction)",
+    ),
+    metrics_port: Optional[int] = typer.Option(
+        None, "--metrics-port", min=0, max=65535, help="Serve Prometheus metrics at /metrics on this port"
+    ),
+    metrics_address: str = typer.Option("", "--metrics-address", help="Address to serve metrics on (default all)"),
+    rule_timeout: Optional[float] = typer.Option(
+        None,
+        "--rule-timeout",
+        min=0.001,
+        help="Seconds any one rule may take, however slowly its server responds (rules are also held to their timeout)",
+    ),
+    verbose: bool = typer.Option(False, "-v", "--verbose"),
+    disable_redaction: bool = typer.Option(False, "--disable-redaction", is_flag=True),
+):
+    """
+    Keep running the assertions in the given config files, each on its own interval.
+
+    Every completed run of an assertion is written as a netcheck-output document.
+    Stops on SIGINT or SIGTERM after in-progress runs finish.
+    """
+    import signal
+    import threading
+
+    from netcheck.serve import serve as serve_configs
+
+    configs = []
+    for path in config:
+        with path.open() as f:
+            configs.append(json.load(f))
+
+    metrics = None
+    if metrics_port is not None:
+        from netcheck.metrics import MetricsRegistry, start_metrics_server
+
+        metrics = MetricsRegistry()
+        start_metrics_server(metrics, metrics_port, metrics_address)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    def emit(overall_results):
+        if not verbose:
+            overall_results.pop("context", None)
+        write_output(overall_results, output)
+
+    try:
+        serve_configs(
+            configs,
+            err_console,
+            emit,
+            interval=interval,
+            jitter=jitter,
+            concurrency=concurrency,
+            pool_size=pool_size,
+            verbose=verbose,
+            include_context=disable_redaction,
+            stop=stop,
+            metrics=metrics,
+            capture_all=capture_all,
+            rule_timeout=rule_timeout,
+        )
+    except KeyboardInterrupt:
+        pass
 
 
 @app.command()
@@ -105,6 +303,18 @@ def http(
         "--source-ip",
         help="Local IP address to bind outgoing connections to (must exist on a local interface)",
     ),
+    max_body_bytes: Optional[int] = typer.Option(
+        None, "--max-body-bytes", min=0, help="Read at most this many bytes of the response body (default 1 MiB)"
+    ),
+    body_capture: Optional[NetcheckHttpBodyCapture] = typer.Option(
+        None,
+        "--body-capture",
+        case_sensitive=False,
+        help="Keep the body, only its sha256 digest, or nothing. Defaults to full if the validation rule reads it",
+    ),
+    output: Optional[NetcheckOutputType] = typer.Option(
+        None, "-o", "--output", case_sensitive=False, help="Output format (defaults to json on a terminal)"
+    ),
     verbose: bool = typer.Option(False, "-v", "--verbose"),
 ):
     """Carry out a http network check"""
@@ -124,6 +334,10 @@ def http(
     }
     if source_ip is not None:
         test_config["source-ip"] = source_ip
+    if max_body_bytes is not None:
+        test_config["max-body-bytes"] = max_body_bytes
+    if body_capture is not None:
+        test_config["body-capture"] = body_capture.value
 
     if verbose:
         err_console.print("Netcheck http configuration:")
@@ -136,15 +350,27 @@ def http(
         validation_rule,
         verbose=verbose,
         include_context=True,
+        # The printed result is all there is, so capture everything
+        capture_all=True,
     )
 
-    output_result(result, should_fail, verbose)
+    output_result(result, should_fail, verbose, output)
 
 
-def output_result(result, should_fail, verbose):
+def output_result(result, should_fail, verbose, output: Optional[NetcheckOutputType] = None):
     failed = result["status"] == "fail"
     notify_for_unexpected_test_result(failed, should_fail, verbose=verbose)
-    print_json(data=result)
+    write_output(result, output)
+
+
+def write_output(data, output: Optional[NetcheckOutputType] = None):
+    if output is None:
+        output = NetcheckOutputType.json if sys.stdout.isatty() else NetcheckOutputType.json_compact
+    if output == NetcheckOutputType.json:
+        write_pretty_json(data)
+    else:
+        # ndjson only changes `netcheck run`, elsewhere each document is already one line
+        write_compact_json(data)
 
 
 @app.command()
@@ -165,6 +391,9 @@ def dns(
         "--source-ip",
         help="Local IP address to send DNS queries from (must exist on a local interface)",
     ),
+    output: Optional[NetcheckOutputType] = typer.Option(
+        None, "-o", "--output", case_sensitive=False, help="Output format (defaults to json on a terminal)"
+    ),
     verbose: bool = typer.Option(False, "-v", "--verbose"),
 ):
     """Carry out a dns check"""
@@ -184,7 +413,7 @@ def dns(
 
     if validation_rule is None:
         # use the default DNS validation rule
-        validation_rule = DEFAULT_DNS_VALIDATION_RULE
+        validation_rule = default_validation_rule("dns")
     else:
         err_console.print("Validating result against custom validation rule")
 
@@ -195,9 +424,10 @@ def dns(
         validation_rule=validation_rule,
         verbose=verbose,
         include_context=True,
+        capture_all=True,
     )
 
-    output_result(result, should_fail, verbose)
+    output_result(result, should_fail, verbose, output)
 
 
 @app.command()
@@ -212,6 +442,9 @@ def tcp(
         "--source-ip",
         help="Local IP address to bind the outgoing connection to (must exist on a local interface)",
     ),
+    output: Optional[NetcheckOutputType] = typer.Option(
+        None, "-o", "--output", case_sensitive=False, help="Output format (defaults to json on a terminal)"
+    ),
     verbose: bool = typer.Option(False, "-v", "--verbose"),
 ):
     """Carry out a tcp connectivity check"""
@@ -230,7 +463,7 @@ def tcp(
         err_console.print_json(data=test_config)
 
     if validation_rule is None:
-        validation_rule = DEFAULT_TCP_VALIDATION_RULE
+        validation_rule = default_validation_rule("tcp")
     else:
         err_console.print("Validating result against custom validation rule")
 
@@ -241,9 +474,10 @@ def tcp(
         validation_rule=validation_rule,
         verbose=verbose,
         include_context=True,
+        capture_all=True,
     )
 
-    output_result(result, should_fail, verbose)
+    output_result(result, should_fail, verbose, output)
 
 
 @app.command()
@@ -257,6 +491,9 @@ def postgres(
     should_fail: bool = typer.Option(False, "--should-fail/--should-pass"),
     validation_rule: str = typer.Option(None, "--validation-rule", help="Validation rule in CEL to apply to result"),
     disable_redaction: bool = typer.Option(False, "--disable-redaction", is_flag=True),
+    output: Optional[NetcheckOutputType] = typer.Option(
+        None, "-o", "--output", case_sensitive=False, help="Output format (defaults to json on a terminal)"
+    ),
     verbose: bool = typer.Option(False, "-v", "--verbose"),
 ):
     """Carry out a PostgreSQL SQL check."""
@@ -279,7 +516,7 @@ def postgres(
         err_console.print_json(data=safe_config)
 
     if validation_rule is None:
-        validation_rule = DEFAULT_POSTGRES_VALIDATION_RULE
+        validation_rule = default_validation_rule("postgres")
     else:
         err_console.print("Validating result against custom validation rule")
 
@@ -290,9 +527,10 @@ def postgres(
         validation_rule=validation_rule,
         verbose=verbose,
         include_context=disable_redaction,
+        capture_all=True,
     )
 
-    output_result(result, should_fail, verbose)
+    output_result(result, should_fail, verbose, output)
 
 
 def notify_for_unexpected_test_result(failed, should_fail, verbose=False):
@@ -1,17 +1,45 @@
+import functools
 import os
 import re
-from typing import Dict
+from typing import Dict, Optional, Tuple
 import logging
 
-from netcheck.validation import evaluate_cel_with_context
+from netcheck.validation import CEL_PROGRAM_CACHE_SIZE, ParseCache, evaluate_cel_with_context
 
 logger = logging.getLogger("netcheck.context")
 
 # Regular expression to match and capture the content inside '{{' and '}}'
 TEMPLATE_REGEX = re.compile(r"\{\{(.*?)\}\}")
 
+# Templates that are a plain dotted path such as `customdata.url` are resolved
+# by walking the context directly instead of evaluating them with CEL.
+DOTTED_PATH_REGEX = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*$")
 
-def evaluate_template(template: str, context: Dict) -> str:
+
+@functools.lru_cache(maxsize=CEL_PROGRAM_CACHE_SIZE)
+def compile_template(s: str) -> Tuple[Tuple[bool, str], ...]:
+    """
+    Split a string into its literal text and `{{ }}` template expressions.
+
+    Args:
+        s (str): The input string that may contain templates.
+
+    Returns:
+        A tuple of `(is_expression, text)` parts. Expressions are stripped of surrounding whitespace.
+    """
+    parts = []
+    position = 0
+    for match in TEMPLATE_REGEX.finditer(s):
+        if match.start() > position:
+            parts.append((False, s[position : match.start()]))
+        parts.append((True, match.group(1).strip()))
+        position = match.end()
+    if position < len(s):
+        parts.append((False, s[position:]))
+    return tuple(parts)
+
+
+def evaluate_template(template: str, context: Dict, parse_cache: Optional[ParseCache] = None) -> str:
     """
     Evaluate a template string e.g. `contextname.key` and return the result of evaluating
     with CEL.
@@ -19,30 +47,68 @@ def evaluate_template(template: str, context: Dict) -> str:
     Args:
         template (str): The template string to be evaluated.
         context (Dict): The context dictionary used for evaluation.
+        parse_cache (ParseCache): Optional cache of documents parsed by `parse_json` and `parse_yaml`.
 
     Returns:
         str: The evaluated result converted to string.
     """
-    return str(evaluate_cel_with_context(context, template))
+    if DOTTED_PATH_REGEX.match(template):
+        value = context
+        try:
+            for key in template.split("."):
+                if not isinstance(value, dict):
+                    raise KeyError(key)
+                value = value[key]
+        except KeyError:
+            # Let CEL decide what a missing variable means
+            pass
+        else:
+            return str(value)
+    return str(evaluate_cel_with_context(context, template, parse_cache))
+
+
+class TemplateRenderer:
+    """
+    Renders templates against one generation of the evaluation context, evaluating
+    each distinct expression at most once.
+    """
+
+    def __init__(self, evaluation_context: Dict, parse_cache: Optional[ParseCache] = None):
+        self.evaluation_context = evaluation_context
+        self.parse_cache = parse_cache
+        self._results: Dict[str, str] = {}
+
+    def evaluate(self, template: str) -> str:
+        result = self._results.get(template)
+        if result is None:
+            result = self._results[template] = evaluate_template(template, self.evaluation_context, self.parse_cache)
+        return result
+
+    def render(self, s: str) -> str:
+        if "{{" not in s:
+            return s
+        return "".join(self.evaluate(text) if is_expression else text for is_expression, text in compile_template(s))
 
 
-def replace_template_in_string(s: str, evaluation_context: Dict) -> str:
+def replace_template_in_string(s: str, evaluation_context: Dict, renderer: Optional[TemplateRenderer] = None) -> str:
     """
     Replace all templates in a given string using the provided evaluation context.
 
     Args:
         s (str): The input string that may contain templates.
         evaluation_context (Dict): The context dictionary used for evaluation.
+        renderer (TemplateRenderer): Optional renderer to share memoized results between calls.
 
     Returns:
         str: The input string with all templates replaced by the output of the evaluate_template function.
 
     """
-    # Extract the group from the regex match and pass to `evaluate_template`.
-    return TEMPLATE_REGEX.sub(lambda m: evaluate_template(m.group(1).strip(), evaluation_context), s)
+    if renderer is None:
+        renderer = TemplateRenderer(evaluation_context)
+    return renderer.render(s)
 
 
-def replace_template(original: Dict, evaluation_context: Dict):
+def replace_template(original: Dict, evaluation_context: Dict, renderer: Optional[TemplateRenderer] = None):
     """
     Recursively replace all templates in the keys and values of a dictionary
     using the provided evaluation context.
@@ -50,25 +116,28 @@ def replace_template(original: Dict, evaluation_context: Dict):
     Args:
         original (Dict): The input dictionary that may contain templates in keys and/or values.
         evaluation_context (Dict): The context dictionary used for evaluation.
+        renderer (TemplateRenderer): Optional renderer to share memoized results between calls.
 
     Returns:
         Dict: A new dictionary with all templates in keys and values replaced by the output of the evaluate_template function.
     """
+    if renderer is None:
+        renderer = TemplateRenderer(evaluation_context)
     result = {}
     for k, v in original.items():
         if isinstance(v, dict):
-            v = replace_template(v, evaluation_context)
+            v = replace_template(v, evaluation_context, renderer)
         elif isinstance(v, list):
             for i in range(len(v)):
                 if isinstance(v[i], dict):
-                    v[i] = replace_template(v[i], evaluation_context)
-                elif isinstance(v[i], str) and TEMPLATE_REGEX.search(v[i]):
-                    v[i] = replace_template_in_string(v[i], evaluation_context)
-        elif isinstance(v, str) and TEMPLATE_REGEX.search(v):
-            v = replace_template_in_string(v, evaluation_context)
-
-        if isinstance(k, str) and TEMPLATE_REGEX.search(k):
-            k = replace_template_in_string(k, evaluation_context)
+                    v[i] = replace_template(v[i], evaluation_context, renderer)
+                elif isinstance(v[i], str):
+                    v[i] = renderer.render(v[i])
+        elif isinstance(v, str):
+            v = renderer.render(v)
+
+        if isinstance(k, str):
+            k = renderer.render(k)
 
         result[k] = v
 
@@ -0,0 +1,180 @@
+"""
+Prometheus metrics about probe results, in the text exposition format.
+
+`netcheck serve` serves them over HTTP at `/metrics`, and `netcheck run` can write them
+to a file for node_exporter's textfile collector. The format is produced directly so
+no Prometheus client library is needed.
+"""
+
+import bisect
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Tuple
+
+logger = logging.getLogger("netcheck.metrics")
+
+# Upper bounds, in seconds, of the probe duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def is_timeout(result: Dict) -> bool:
+    """Whether a probe result reports that the probe timed out."""
+    data = result.get("data", {})
+    return (
+        data.get("response-code") == "TIMEOUT"
+        or "Timeout" in str(data.get("exception-type", ""))
+        or data.get("sqlstate") == "57014"
+        or "timed out" in str(data.get("error") or "")
+        or "timeout expired" in str(data.get("exception", ""))
+    )
+
+
+class MetricsRegistry:
+    """
+    Thread safe collection of probe metrics.
+
+    Exposes per check type probe duration histograms and timeout counts, connection
+    reuse counts, a pass/fail gauge per rule and the CEL program cache statistics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # check type -> [bucket counts..., sum, count]
+        self._durations: Dict[str, list] = {}
+        self._timeouts: Dict[str, int] = {}
+        self._connections: Dict[Tuple[str, str], int] = {}
+        self._rules: Dict[Tuple[str, str, str], Tuple[int, float]] = {}
+
+    def observe(self, assertion: str, rule: str, check_type: str, result: Dict, duration: float):
+        """Record the result of one rule, and how many seconds it took to probe and validate."""
+        reused = result.get("data", {}).get("connection-reused")
+        with self._lock:
+            histogram = self._durations.setdefault(check_type, [0] * (len(DURATION_BUCKETS) + 2))
+            bucket = bisect.bisect_left(DURATION_BUCKETS, duration)
+            if bucket < len(DURATION_BUCKETS):
+                histogram[bucket] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+            if is_timeout(result):
+                self._timeouts[check_type] = self._timeouts.get(check_type, 0) + 1
+            else:
+                self._timeouts.setdefault(check_type, 0)
+            if reused is not None:
+                key = (check_type, "true" if reused else "false")
+                self._connections[key] = self._connections.get(key, 0) + 1
+            self._rules[(assertion, rule, check_type)] = (int(result.get("status") == "pass"), time.time())
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        from netcheck.validation import compile_cel
+
+        lines = [
+            "# HELP netcheck_probe_duration_seconds Time taken to probe and validate a rule.",
+            "# TYPE netcheck_probe_duration_seconds histogram",
+        ]
+        with self._lock:
+            for check_type, histogram in sorted(self._durations.items()):
+                cumulative = 0
+                for upper_bound, count in zip(DURATION_BUCKETS, histogram):
+                    cumulative += count
+                    labels = _labels(type=check_type, le=_number(upper_bound))
+                    lines.append(f"netcheck_probe_duration_seconds_bucket{labels} {cumulative}")
+                labels = _labels(type=check_type, le="+Inf")
+                lines.append(f"netcheck_probe_duration_seconds_bucket{labels} {histogram[-1]}")
+                lines.append(f"netcheck_probe_duration_seconds_sum{_labels(type=check_type)} {_number(histogram[-2])}")
+                lines.append(f"netcheck_probe_duration_seconds_count{_labels(type=check_type)} {histogram[-1]}")
+
+            lines += [
+                "# HELP netcheck_probe_timeouts_total Probes that timed out.",
+                "# TYPE netcheck_probe_timeouts_total counter",
+            ]
+            for check_type, count in sorted(self._timeouts.items()):
+                lines.append(f"netcheck_probe_timeouts_total{_labels(type=check_type)} {count}")
+
+            lines += [
+                "# HELP netcheck_connections_total Probe connections, by whether an open pooled connection was reused.",
+                "# TYPE netcheck_connections_total counter",
+            ]
+            for (check_type, reused), count in sorted(self._connections.items()):
+                lines.append(f"netcheck_connections_total{_labels(type=check_type, reused=reused)} {count}")
+
+            lines += [
+                "# HELP netcheck_rule_passed Whether the latest run of a rule passed (1) or failed (0).",
+                "# TYPE netcheck_rule_passed gauge",
+            ]
+            for (assertion, rule, check_type), (passed, _) in sorted(self._rules.items()):
+                lines.append(f"netcheck_rule_passed{_labels(assertion=assertion, rule=rule, type=check_type)} {passed}")
+
+            lines += [
+                "# HELP netcheck_rule_last_run_timestamp_seconds When a rule last finished, in seconds since epoch.",
+                "# TYPE netcheck_rule_last_run_timestamp_seconds gauge",
+            ]
+            for (assertion, rule, check_type), (_, finished) in sorted(self._rules.items()):
+                labels = _labels(assertion=assertion, rule=rule, type=check_type)
+                lines.append(f"netcheck_rule_last_run_timestamp_seconds{labels} {_number(finished)}")
+
+        cache = compile_cel.cache_info()
+        lines += [
+            "# HELP netcheck_cel_cache_hits_total Validation rules served from the compiled CEL program cache.",
+            "# TYPE netcheck_cel_cache_hits_total counter",
+            f"netcheck_cel_cache_hits_total {cache.hits}",
+            "# HELP netcheck_cel_cache_misses_total Validation rules that had to be compiled.",
+            "# TYPE netcheck_cel_cache_misses_total counter",
+            f"netcheck_cel_cache_misses_total {cache.misses}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomically replace `path` with the current metrics, for node_exporter's textfile collector."""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as f:
+            f.write(self.render())
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, path)
+
+
+def start_metrics_server(metrics: MetricsRegistry, port: int, address: str = ""):
+    """
+    Serve `metrics` at `http://address:port/metrics` from a background thread.
+
+    Returns:
+        The running `ThreadingHTTPServer`. Call its `shutdown()` method to stop it.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="netcheck-metrics", daemon=True).start()
+    return server
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
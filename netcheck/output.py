@@ -0,0 +1,47 @@
+import datetime
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
+
+def json_default(value):
+    """`default` hook for `json.dumps` that writes durations as a number of seconds."""
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def dumps_compact(data) -> bytes:
+    """Serialize `data` as compact UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=json_default)
+        except TypeError:
+            # e.g. integers outside the 64-bit range, which the stdlib encoder handles
+            pass
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=json_default).encode()
+
+
+def write_compact_json(data, stream=None):
+    """Write `data` to `stream` (stdout by default) as one line of compact JSON."""
+    stream = stream if stream is not None else sys.stdout
+    encoded = dumps_compact(data) + b"\n"
+    buffer = getattr(stream, "buffer", None)
+    if buffer is not None:
+        stream.flush()
+        buffer.write(encoded)
+        buffer.flush()
+    else:
+        stream.write(encoded.decode())
+
+
+def write_pretty_json(data):
+    """Write `data` to stdout as indented, highlighted JSON."""
+    # rich's rendering stack is only imported for human readable output
+    from rich import print_json
+
+    print_json(data=data, default=json_default)
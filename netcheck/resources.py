@@ -0,0 +1,116 @@
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from netcheck.checks.dns import DnsResolverRegistry
+    from netcheck.checks.http import AsyncHttpClientRegistry, HttpSessionRegistry
+    from netcheck.checks.postgres import AsyncPostgresConnectionPool, PostgresCatalogRegistry, PostgresConnectionPool
+
+
+class ProbeResources:
+    """
+    Long-lived resources shared by the probes of a run, such as HTTP and Postgres
+    connection pools, DNS resolvers and Postgres catalog snapshots.
+
+    Resources (and the check modules that define them) are only imported and
+    created the first time a check asks for them. `close` releases the blocking
+    pools and `aclose_async` the asyncio ones, which must happen on the loop that
+    used them. Released resources are created again if a later probe needs them.
+    Catalog snapshots only hold for one run, see `reset_snapshots`.
+
+    Args:
+        pool_size: Connections kept open per host. Matching this to the run's
+            concurrency lets every worker hold a warm connection.
+    """
+
+    def __init__(self, pool_size: int = 1):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._http_sessions: Optional["HttpSessionRegistry"] = None
+        self._async_http_clients: Optional["AsyncHttpClientRegistry"] = None
+        self._dns_resolvers: Optional["DnsResolverRegistry"] = None
+        self._postgres_catalogs: Optional["PostgresCatalogRegistry"] = None
+        self._postgres_connections: Optional["PostgresConnectionPool"] = None
+        self._async_postgres_connections: Optional["AsyncPostgresConnectionPool"] = None
+
+    @property
+    def http_sessions(self) -> "HttpSessionRegistry":
+        with self._lock:
+            if self._http_sessions is None:
+                from netcheck.checks.http import HttpSessionRegistry
+
+                self._http_sessions = HttpSessionRegistry(self.pool_size)
+            return self._http_sessions
+
+    @property
+    def async_http_clients(self) -> "AsyncHttpClientRegistry":
+        with self._lock:
+            if self._async_http_clients is None:
+                from netcheck.checks.http import AsyncHttpClientRegistry
+
+                self._async_http_clients = AsyncHttpClientRegistry(self.pool_size)
+            return self._async_http_clients
+
+    @property
+    def dns_resolvers(self) -> "DnsResolverRegistry":
+        with self._lock:
+            if self._dns_resolvers is None:
+                from netcheck.checks.dns import DnsResolverRegistry
+
+                self._dns_resolvers = DnsResolverRegistry()
+            return self._dns_resolvers
+
+    @property
+    def postgres_catalogs(self) -> "PostgresCatalogRegistry":
+        with self._lock:
+            if self._postgres_catalogs is None:
+                from netcheck.checks.postgres import PostgresCatalogRegistry
+
+                self._postgres_catalogs = PostgresCatalogRegistry()
+            return self._postgres_catalogs
+
+    @property
+    def postgres_connections(self) -> "PostgresConnectionPool":
+        with self._lock:
+            if self._postgres_connections is None:
+                from netcheck.checks.postgres import PostgresConnectionPool
+
+                self._postgres_connections = PostgresConnectionPool(self.pool_size)
+            return self._postgres_connections
+
+    @property
+    def async_postgres_connections(self) -> "AsyncPostgresConnectionPool":
+        with self._lock:
+            if self._async_postgres_connections is None:
+                from netcheck.checks.postgres import AsyncPostgresConnectionPool
+
+                self._async_postgres_connections = AsyncPostgresConnectionPool(self.pool_size)
+            return self._async_postgres_connections
+
+    def reset_snapshots(self):
+        """Drop the Postgres catalog snapshots, so the next run reads the catalogs again."""
+        with self._lock:
+            self._postgres_catalogs = None
+
+    def close(self):
+        with self._lock:
+            http_sessions, self._http_sessions = self._http_sessions, None
+            postgres_connections, self._postgres_connections = self._postgres_connections, None
+            self._postgres_catalogs = None
+        if http_sessions is not None:
+            http_sessions.close()
+        if postgres_connections is not None:
+            postgres_connections.close()
+
+    async def aclose_async(self):
+        with self._lock:
+            async_http_clients, self._async_http_clients = self._async_http_clients, None
+            async_postgres_connections, self._async_postgres_connections = self._async_postgres_connections, None
+        if async_http_clients is not None:
+            await async_http_clients.aclose()
+        if async_postgres_connections is not None:
+            await async_postgres_connections.aclose()
+
+    async def aclose(self):
+        self.close()
+        await self.aclose_async()
@@ -1,46 +1,133 @@
+import asyncio
+import copy
 import datetime
 import json
 import logging
-from typing import Dict
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, wait
+from enum import Enum
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
 
 
-from netcheck.validation import evaluate_cel_with_context
+from netcheck.validation import ParseCache, ValidationContext, data_fields, precompile_cel
 from netcheck.version import OUTPUT_JSON_VERSION
 
 from netcheck.version import NETCHECK_VERSION
-from netcheck.checks.internal import internal_check
-from netcheck.checks.dns import dns_lookup_check, DEFAULT_DNS_VALIDATION_RULE
-from netcheck.checks.http import http_request_check, DEFAULT_HTTP_VALIDATION_RULE
-from netcheck.checks.tcp import tcp_check, DEFAULT_TCP_VALIDATION_RULE
-from netcheck.checks.postgres import (
-    postgres_query_check,
-    postgres_grants_check,
-    DEFAULT_POSTGRES_VALIDATION_RULE,
-    DEFAULT_POSTGRES_GRANTS_VALIDATION_RULE,
-)
-from netcheck.context import replace_template, LazyFileLoadingDict
+from netcheck.checks import get_check_type
+from netcheck.context import replace_template, LazyFileLoadingDict, TemplateRenderer
+from netcheck.metrics import MetricsRegistry
+from netcheck.resources import ProbeResources
+from netcheck.sampling import SamplingOptions, latency_summary, sample_failed, sampling_options
 
 logger = logging.getLogger("netcheck.runner")
 
+# Seconds a rule may run past its own `timeout` before the runner gives up on it
+RULE_TIMEOUT_GRACE = 1.0
+
+# Rule keys that only change how a probe's result is judged, not the probe itself
+VALIDATION_KEYS = frozenset({"name", "validation", "validate", "expected"})
+
+
+class NetcheckEngine(str, Enum):
+    """How `run_from_config` executes probes.
+
+    `threads` runs the blocking check functions on a thread pool, `asyncio`
+    runs the coroutine variants of each check on a single event loop.
+    """
+
+    threads = "threads"
+    asyncio = "asyncio"
+
 
 def run_from_config(
     netchecks_config: Dict,
     err_console,
     verbose: bool = False,
     include_context: bool = False,
+    concurrency: int = 1,
+    engine: NetcheckEngine = NetcheckEngine.threads,
+    pool_size: Optional[int] = None,
+    stream: Optional[Callable[[Dict], None]] = None,
+    metrics: Optional[MetricsRegistry] = None,
+    capture_all: bool = False,
+    deadline: Optional[float] = None,
+    rule_timeout: Optional[float] = None,
+    deduplicate: bool = True,
 ):
+    """
+    Run every assertion in a netcheck config and return the `netcheck-output` document.
+
+    When `stream` is given, results are not collected. Instead `stream` is called with
+    a `netcheck-output-header` record before any probe runs, a `netcheck-result` record
+    as each rule finishes (in completion order, from any worker), and finally a
+    `netcheck-output-summary` record, which is also returned.
+
+    When `metrics` is given, every rule's result and duration is recorded in it.
+
+    Probes only capture the `data` fields their validation rule reads. `capture_all`,
+    or `include_context`, makes them capture everything, e.g. for debugging.
+
+    `deadline` bounds the whole run, in seconds. Rules still running when it expires
+    are abandoned and reported with an "error" status, and rules that haven't started
+    with a "skip" status, so a complete document is still returned (or streamed).
+
+    Each rule is limited to its own `timeout` (or its check type's default timeout) plus
+    `RULE_TIMEOUT_GRACE` seconds of wall-clock time, and to `rule_timeout` seconds when
+    that is given. A probe over its
+    limit is abandoned and validated as a failed probe with `data.exception-type` set
+    to "RuleTimeout", see `run_probe`.
+
+    Rules that would send the same probe (see `probe_fingerprint`), e.g. one lookup
+    validated differently by several assertions, share a single probe unless
+    `deduplicate` is false. Every rule still gets its own result. Probes with side
+    effects, such as http requests other than GET or postgres rules with `rollback`
+    false, are never shared.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    if pool_size is not None and pool_size < 1:
+        raise ValueError("pool_size must be at least 1")
+    if deadline is not None and deadline <= 0:
+        raise ValueError("deadline must be positive")
+    if rule_timeout is not None and rule_timeout <= 0:
+        raise ValueError("rule_timeout must be positive")
+    started = time.monotonic()
     if verbose:
         err_console.print(f"Loaded {len(netchecks_config['assertions'])} assertions")
 
-    overall_results = {
-        "type": "netcheck-output",
-        "outputVersion": OUTPUT_JSON_VERSION,
-        "metadata": {
-            "creationTimestamp": datetime.datetime.now(datetime.UTC).isoformat(),
-            "version": NETCHECK_VERSION,
-        },
-        "assertions": [],
-    }
+    netchecks_config, validation_context = load_config(netchecks_config, err_console, verbose)
+    if deadline is not None:
+        deadline = max(deadline - (time.monotonic() - started), 0.0)
+    return run_assertions(
+        netchecks_config["assertions"],
+        validation_context,
+        err_console,
+        verbose=verbose,
+        include_context=include_context,
+        concurrency=concurrency,
+        engine=engine,
+        resources=ProbeResources(pool_size or concurrency),
+        stream=stream,
+        metrics=metrics,
+        capture_all=capture_all,
+        deadline=deadline,
+        rule_timeout=rule_timeout,
+        deduplicate=deduplicate,
+    )
+
+
+def load_config(netchecks_config: Dict, err_console, verbose: bool = False) -> Tuple[Dict, ValidationContext]:
+    """
+    Load the contexts of a netcheck config, render its templates and compile every
+    validation rule.
+
+    Returns:
+        The rendered config, and the validation context its rules are evaluated against.
+    """
+    # Documents parsed by parse_json and parse_yaml in templates and validation rules
+    parse_cache = ParseCache()
 
     # Load optional external contexts from the config
     context = {}
@@ -53,7 +140,7 @@ def run_from_config(
         elif c["type"] == "inline":
             # Inline contexts are processed for CEL templates
             inline_context = c["data"]
-            inline_context = replace_template(inline_context, context)
+            inline_context = replace_template(inline_context, context, TemplateRenderer(context, parse_cache))
             context[c["name"]] = inline_context
         elif c["type"] == "directory":
             # Return a Dict like object that lazy loads individual files
@@ -63,30 +150,339 @@ def run_from_config(
             logger.warning(f"Unknown context type '{c['type']}'")
 
     # Replace any template strings in the config
-    netchecks_config = replace_template(netchecks_config, context)
+    netchecks_config = replace_template(netchecks_config, context, TemplateRenderer(context, parse_cache))
+    validation_context = ValidationContext(context, parse_cache)
 
-    # Run each test
+    # Compile every validation rule up front, so invalid rules are reported before
+    # any probe runs and each evaluation only pays for execution.
+    compiled = precompile_cel(
+        pattern
+        for assertion in netchecks_config["assertions"]
+        for rule in assertion["rules"]
+        for _, pattern in validation_patterns(_validation_or_default(_rule_validation(rule), rule["type"]))
+    )
+    if verbose:
+        err_console.print(f"Compiled {compiled} distinct validation rules")
     for assertion in netchecks_config["assertions"]:
-        assertion_results = []
-        if verbose:
-            err_console.print(f"Running tests for assertion '{assertion['name']}'")
         for rule in assertion["rules"]:
-            result = check_individual_assertion(
-                rule["type"],
-                rule,
-                err_console=err_console,
-                validation_rule=rule.get("validation") or rule.get("validate", {}).get("pattern"),
-                validation_context=context,
-                verbose=verbose,
-                include_context=include_context,
-            )
-            assertion_results.append(result)
+            sampling_options(rule)
+
+    return netchecks_config, validation_context
+
+
+def run_assertions(
+    assertions: List[Dict],
+    validation_context: ValidationContext,
+    err_console,
+    verbose: bool = False,
+    include_context: bool = False,
+    concurrency: int = 1,
+    engine: NetcheckEngine = NetcheckEngine.threads,
+    resources: Optional[ProbeResources] = None,
+    stream: Optional[Callable[[Dict], None]] = None,
+    close_resources: bool = True,
+    metrics: Optional[MetricsRegistry] = None,
+    capture_all: bool = False,
+    deadline: Optional[float] = None,
+    rule_timeout: Optional[float] = None,
+    deduplicate: bool = True,
+):
+    """
+    Run already loaded assertions (see `load_config`) and return the `netcheck-output`
+    document, or stream it as described in `run_from_config`.
+
+    Probes share the connection pools and resolvers in `resources`. They are closed
+    at the end of the run unless `close_resources` is false, so a long running caller
+    can keep them warm between runs. Catalog snapshots are always dropped.
+
+    `deadline` is the number of seconds from now the run may take. It, `rule_timeout`
+    and `deduplicate` are described in `run_from_config`.
+    """
+    engine = NetcheckEngine(engine)
+    deadline_at = None if deadline is None else time.monotonic() + deadline
+    if resources is None:
+        resources = ProbeResources(concurrency)
+
+    overall_results = {
+        "type": "netcheck-output",
+        "outputVersion": OUTPUT_JSON_VERSION,
+        "metadata": {
+            "creationTimestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+            "version": NETCHECK_VERSION,
+        },
+        "assertions": [],
+    }
+
+    # Run each test. Rules are dispatched to a bounded pool of workers, but results
+    # are collected in config order so the output is independent of the concurrency.
+    jobs = [
+        (
+            assertion["name"],
+            [
+                dict(
+                    test_type=rule["type"],
+                    test_config=rule,
+                    err_console=err_console,
+                    validation_rule=_rule_validation(rule),
+                    validation_context=validation_context,
+                    verbose=verbose,
+                    include_context=include_context,
+                    resources=resources,
+                    # Unredacted output is for debugging, so it shows everything
+                    capture_all=capture_all or include_context,
+                    time_limit=rule_time_limit(rule, rule_timeout),
+                )
+                for rule in assertion["rules"]
+            ],
+        )
+        for assertion in assertions
+    ]
+
+    # Rules sharing a probe are run as one job, in the order of their first rule
+    probes = {}
+    for assertion_index, (_, rule_jobs) in enumerate(jobs):
+        for rule_index, job in enumerate(rule_jobs):
+            key = probe_fingerprint(job["test_config"]) if deduplicate else None
+            if key is None:
+                key = (assertion_index, rule_index)
+            probes.setdefault(key, []).append((assertion_index, rule_index, job))
+    probes = list(probes.values())
+    deduplicated = sum(len(rule_jobs) for _, rule_jobs in jobs) - len(probes)
+    overall_results["metadata"]["deduplicatedProbes"] = deduplicated
 
-        overall_results["assertions"].append({"name": assertion["name"], "results": assertion_results})
+    if stream is None:
+        all_results = [[None] * len(rule_jobs) for _, rule_jobs in jobs]
+
+        def collect(assertion_index, rule_index, result):
+            all_results[assertion_index][rule_index] = result
+
+    else:
+        status_counts = Counter()
+        stream(
+            {
+                "type": "netcheck-output-header",
+                "outputVersion": overall_results["outputVersion"],
+                "metadata": overall_results["metadata"],
+                "assertions": [{"name": name, "rule-count": len(rule_jobs)} for name, rule_jobs in jobs],
+            }
+        )
+
+        def collect(assertion_index, rule_index, result):
+            record = {
+                "type": "netcheck-result",
+                "assertion": jobs[assertion_index][0],
+                "rule-index": rule_index,
+                "result": result,
+            }
+            status_counts[result["status"]] += 1
+            stream(record)
+
+    # Rules are recorded once, under one lock from claiming the rule to writing its
+    # result, so the deadline sweep below can't pass over a rule that is still being
+    # written. A probe abandoned at the deadline may still finish later, and its result
+    # is then dropped.
+    record_lock = threading.Lock()
+    started = set()
+    recorded = set()
+
+    def on_start(rules):
+        if deadline_at is not None and time.monotonic() >= deadline_at:
+            return False
+        with record_lock:
+            started.update((assertion_index, rule_index) for assertion_index, rule_index, _ in rules)
+        return True
+
+    def on_result(assertion_index, rule_index, result, duration=None):
+        with record_lock:
+            if (assertion_index, rule_index) in recorded:
+                return
+            recorded.add((assertion_index, rule_index))
+            if metrics is not None and duration is not None:
+                name, rule_jobs = jobs[assertion_index]
+                metrics.observe(name, str(rule_index), rule_jobs[rule_index]["test_type"], result, duration)
+            collect(assertion_index, rule_index, result)
+
+    if verbose:
+        for name, _ in jobs:
+            err_console.print(f"Running tests for assertion '{name}'")
+        if deduplicated:
+            err_console.print(f"Sharing probes between rules saves {deduplicated} probes")
+    try:
+        if engine == NetcheckEngine.asyncio:
+            asyncio.run(_run_jobs_async(probes, concurrency, resources, on_start, on_result, deadline_at))
+        else:
+            _run_jobs_threaded(probes, concurrency, on_start, on_result, deadline_at)
+    finally:
+        # Catalogs may change before the next run, even when the pools are kept warm
+        resources.reset_snapshots()
+        if close_resources:
+            resources.close()
+
+    if deadline_at is not None:
+        for assertion_index, (_, rule_jobs) in enumerate(jobs):
+            for rule_index, job in enumerate(rule_jobs):
+                with record_lock:
+                    in_flight = (assertion_index, rule_index) in started
+                on_result(assertion_index, rule_index, deadline_result(job, in_flight))
+
+    if stream is not None:
+        summary = {
+            "type": "netcheck-output-summary",
+            "rule-count": sum(status_counts.values()),
+            "status-counts": dict(status_counts),
+            "deduplicated-probes": deduplicated,
+            "endTimestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+        }
+        stream(summary)
+        return summary
+
+    for (name, _), assertion_results in zip(jobs, all_results):
+        overall_results["assertions"].append({"name": name, "results": assertion_results})
 
     return overall_results
 
 
+def _rule_validation(rule: Dict):
+    # An empty validation is kept, so `validation_patterns` rejects it rather than the
+    # default rule quietly standing in for it
+    if "validation" in rule:
+        return rule["validation"]
+    return rule.get("validate", {}).get("pattern")
+
+
+def validation_patterns(validation) -> List[Tuple[Optional[str], str]]:
+    """
+    The CEL expressions of a rule's validation, with their names.
+
+    A validation is a single expression, a list of expressions or a map of names to
+    expressions. The rule passes when every one of them does.
+
+    Returns:
+        (name, expression) pairs in the order given. Names are None unless given in a map.
+
+    Raises:
+        ValueError: If the validation isn't one of these forms, or is empty.
+    """
+    if isinstance(validation, str):
+        patterns = [(None, validation)]
+    elif isinstance(validation, dict):
+        patterns = [(str(name), pattern) for name, pattern in validation.items()]
+    elif isinstance(validation, list):
+        patterns = [(None, pattern) for pattern in validation]
+    else:
+        patterns = []
+    if not patterns or not all(isinstance(pattern, str) for _, pattern in patterns):
+        raise ValueError(f"Validation must be a CEL expression, or a list or map of them, not {validation!r}")
+    return patterns
+
+
+def rule_time_limit(rule: Dict, rule_timeout: Optional[float] = None) -> Optional[float]:
+    """
+    Wall-clock seconds a rule's probe may take: its `timeout`, or the check type's
+    `default_timeout`, plus `RULE_TIMEOUT_GRACE`, capped at `rule_timeout`. None when
+    neither is set, e.g. for an internal rule.
+    """
+    timeout = rule.get("timeout")
+    if timeout is None:
+        timeout = get_check_type(rule["type"]).default_timeout
+    limits = [float(timeout) + RULE_TIMEOUT_GRACE] if timeout is not None else []
+    if rule_timeout is not None:
+        limits.append(rule_timeout)
+    return min(limits, default=None)
+
+
+def probe_fingerprint(rule: Dict) -> Optional[str]:
+    """
+    Identify the probe a rule sends: its type, target and every other option except
+    the `VALIDATION_KEYS`. Rules with the same fingerprint can share one probe result.
+
+    Returns None for a probe that must not be shared, e.g. an http POST, as decided by
+    the check type's `shareable`.
+    """
+    shareable = get_check_type(rule["type"]).shareable
+    if shareable is not None and not shareable(rule):
+        return None
+    return json.dumps({k: v for k, v in rule.items() if k not in VALIDATION_KEYS}, sort_keys=True, default=str)
+
+
+def _remaining(deadline_at: Optional[float]) -> Optional[float]:
+    return None if deadline_at is None else max(deadline_at - time.monotonic(), 0.0)
+
+
+def _run_jobs_threaded(probes, concurrency, on_start, on_result, deadline_at=None):
+    def run_job(rules):
+        if not on_start(rules):
+            return
+        started = time.perf_counter()
+        results = check_rules_sharing_probe([job for _, _, job in rules])
+        duration = time.perf_counter() - started
+        for (assertion_index, rule_index, _), result in zip(rules, results):
+            on_result(assertion_index, rule_index, result, duration)
+
+    # Workers are daemon threads, so probes still running past the deadline are left
+    # behind without holding up the exit of the process
+    pending = _map_in_daemon_threads(run_job, probes, concurrency)
+    wait(pending, timeout=_remaining(deadline_at))
+    for future in pending:
+        if future.done():
+            future.result()
+
+
+async def _run_jobs_async(probes, concurrency, resources, on_start, on_result, deadline_at=None):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_job(rules):
+        async with semaphore:
+            if not on_start(rules):
+                return
+            started = time.perf_counter()
+            results = await check_rules_sharing_probe_async([job for _, _, job in rules])
+            duration = time.perf_counter() - started
+        for (assertion_index, rule_index, _), result in zip(rules, results):
+            on_result(assertion_index, rule_index, result, duration)
+
+    pending = [asyncio.ensure_future(run_job(rules)) for rules in probes]
+    try:
+        await asyncio.wait_for(asyncio.gather(*pending), timeout=_remaining(deadline_at))
+    except TimeoutError:
+        # Every rule left is cancelled, and reported by run_assertions
+        pass
+    finally:
+        for task in pending:
+            task.cancel()
+        # Async pools belong to this event loop
+        await resources.aclose_async()
+
+
+def deadline_result(job: Dict, in_flight: bool) -> Dict:
+    """
+    The result of a rule that didn't finish before the run deadline.
+
+    Rules that were running are reported with an "error" status, and rules that never
+    started with "skip".
+    """
+    test_config = job["test_config"]
+    if in_flight:
+        status, message = "error", "Still running at the run deadline"
+    else:
+        status, message = "skip", "Not started before the run deadline"
+    result = {
+        "spec": {
+            **test_config,
+            "type": job["test_type"],
+            "pattern": _validation_or_default(job["validation_rule"], job["test_type"]),
+        },
+        "data": {"deadline-exceeded": True, "error": message},
+        "status": status,
+        "message": message,
+    }
+    if "name" in test_config:
+        result["name"] = test_config["name"]
+    if not job["include_context"]:
+        _redact(result)
+    return result
+
+
 def check_individual_assertion(
     test_type: str,
     test_config,
@@ -95,114 +491,447 @@ def check_individual_assertion(
     validation_context=None,
     verbose=False,
     include_context=False,
+    resources: Optional[ProbeResources] = None,
+    capture_all: bool = False,
+    time_limit: Optional[float] = None,
 ):
-    match test_type:
-        case "dns":
-            if verbose:
-                err_console.print(f"DNS check looking up host '{test_config['host']}'")
-            test_detail = dns_lookup_check(
-                host=test_config["host"],
-                server=test_config.get("server"),
-                timeout=test_config.get("timeout"),
-                source_ip=test_config.get("source-ip"),
-            )
-        case "http":
-            if verbose:
-                err_console.print(f"http check with url '{test_config['url']}'")
-            test_detail = http_request_check(
-                test_config["url"],
-                test_config.get("method", "get").lower(),
-                headers=test_config.get("headers"),
-                timeout=test_config.get("timeout"),
-                verify=test_config.get("verify-tls-cert", True),
-                source_ip=test_config.get("source-ip"),
-            )
-        case "tcp":
-            if verbose:
-                err_console.print(f"TCP check connecting to {test_config['host']}:{test_config['port']}")
-            test_detail = tcp_check(
-                host=test_config["host"],
-                port=int(test_config["port"]),
-                timeout=test_config.get("timeout", 5),
-                source_ip=test_config.get("source-ip"),
-            )
-        case "internal":
-            if verbose:
-                err_console.print(f"Internal check with command '{test_config['command']}'")
-            test_detail = internal_check(
-                test_config.get("timeout", 5),
-            )
-        case "postgres":
-            if verbose:
-                err_console.print("Postgres check running SQL statement")
-            test_detail = postgres_query_check(
-                dsn=test_config["dsn"],
-                query=test_config["query"],
-                params=test_config.get("params"),
-                timeout=test_config.get("timeout", 5),
-                read_only=test_config.get("read-only", True),
-                rollback=test_config.get("rollback", True),
-                row_limit=test_config.get("row-limit", 100),
+    """
+    Probe a rule and validate the result.
+
+    The probe skips capturing `data` fields the validation rule doesn't read, unless
+    `capture_all` is set (see `netcheck.validation.data_fields`). `time_limit` is
+    passed to `run_probe`.
+    """
+    fields = _probe_fields(test_type, validation_rule, capture_all)
+    test_detail = run_probe(
+        test_type, test_config, err_console, verbose=verbose, resources=resources, fields=fields, time_limit=time_limit
+    )
+    return evaluate_probe_result(
+        test_type,
+        test_config,
+        test_detail,
+        err_console,
+        validation_rule=validation_rule,
+        validation_context=validation_context,
+        verbose=verbose,
+        include_context=include_context,
+    )
+
+
+async def check_individual_assertion_async(
+    test_type: str,
+    test_config,
+    err_console,
+    validation_rule=None,
+    validation_context=None,
+    verbose=False,
+    include_context=False,
+    resources: Optional[ProbeResources] = None,
+    capture_all: bool = False,
+    time_limit: Optional[float] = None,
+):
+    """Coroutine version of `check_individual_assertion`."""
+    fields = _probe_fields(test_type, validation_rule, capture_all)
+    test_detail = await run_probe_async(
+        test_type, test_config, err_console, verbose=verbose, resources=resources, fields=fields, time_limit=time_limit
+    )
+    return evaluate_probe_result(
+        test_type,
+        test_config,
+        test_detail,
+        err_console,
+        validation_rule=validation_rule,
+        validation_context=validation_context,
+        verbose=verbose,
+        include_context=include_context,
+    )
+
+
+def check_rules_sharing_probe(jobs: List[Dict]) -> List[Dict]:
+    """
+    Probe once for rules with the same `probe_fingerprint`, and validate a copy of the
+    result for each of them.
+
+    Args:
+        jobs: `check_individual_assertion` keyword arguments for each rule.
+
+    Returns:
+        The result of each rule, in the order of `jobs`.
+    """
+    if len(jobs) == 1:
+        return [check_individual_assertion(**jobs[0])]
+    job = jobs[0]
+    test_detail = run_probe(
+        job["test_type"],
+        job["test_config"],
+        job["err_console"],
+        verbose=job["verbose"],
+        resources=job["resources"],
+        fields=_shared_probe_fields(jobs),
+        time_limit=job["time_limit"],
+    )
+    return [_evaluate_shared_probe(job, test_detail) for job in jobs]
+
+
+async def check_rules_sharing_probe_async(jobs: List[Dict]) -> List[Dict]:
+    """Coroutine version of `check_rules_sharing_probe`."""
+    if len(jobs) == 1:
+        return [await check_individual_assertion_async(**jobs[0])]
+    job = jobs[0]
+    test_detail = await run_probe_async(
+        job["test_type"],
+        job["test_config"],
+        job["err_console"],
+        verbose=job["verbose"],
+        resources=job["resources"],
+        fields=_shared_probe_fields(jobs),
+        time_limit=job["time_limit"],
+    )
+    return [_evaluate_shared_probe(job, test_detail) for job in jobs]
+
+
+def _probe_fields(test_type: str, validation_rule, capture_all: bool) -> Optional[FrozenSet[str]]:
+    if capture_all:
+        return None
+    fields = frozenset()
+    for _, pattern in validation_patterns(_validation_or_default(validation_rule, test_type)):
+        pattern_fields = data_fields(pattern)
+        if pattern_fields is None:
+            return None
+        fields |= pattern_fields
+    return fields
+
+
+def _shared_probe_fields(jobs: List[Dict]) -> Optional[FrozenSet[str]]:
+    fields = frozenset()
+    for job in jobs:
+        rule_fields = _probe_fields(job["test_type"], job["validation_rule"], job["capture_all"])
+        if rule_fields is None:
+            return None
+        fields |= rule_fields
+    return fields
+
+
+def _evaluate_shared_probe(job: Dict, test_detail: Dict) -> Dict:
+    # Validation adds to and redacts the result, so each rule gets its own copy
+    return evaluate_probe_result(
+        job["test_type"],
+        job["test_config"],
+        copy.deepcopy(test_detail),
+        job["err_console"],
+        validation_rule=job["validation_rule"],
+        validation_context=job["validation_context"],
+        verbose=job["verbose"],
+        include_context=job["include_context"],
+    )
+
+
+def run_probe(
+    test_type: str,
+    test_config,
+    err_console,
+    verbose=False,
+    resources: Optional[ProbeResources] = None,
+    fields: Optional[FrozenSet[str]] = None,
+    time_limit: Optional[float] = None,
+) -> Dict:
+    """Carry out the network probe described by a rule and return its `spec` and `data`.
+
+    When `resources` is given, probes share its connection pools with the rest of the run.
+    `fields` are the `data` fields the rule's validation reads (None for all of them),
+    see `CheckType`.
+
+    A check's own timeouts apply to single socket operations, so a server trickling its
+    response can hold a probe far longer. With a `time_limit`, the probe runs in a daemon
+    thread that is abandoned once the limit passes, and the result records the overrun
+    (see `time_limit_result`).
+
+    A rule with `samples` is probed that many times (see `netcheck.sampling`), each
+    sample held to the `time_limit`. The result is the first sample's, with the
+    latency of them all summarized in `data.latency`.
+    """
+    sampling = sampling_options(test_config)
+    if sampling is not None:
+        return _run_sampled_probe(sampling, test_type, test_config, err_console, verbose, resources, fields, time_limit)
+    return _run_single_probe(test_type, test_config, err_console, verbose, resources, fields, time_limit)
+
+
+def _run_single_probe(test_type, test_config, err_console, verbose, resources, fields, time_limit) -> Dict:
+    check_type = get_check_type(test_type)
+    if time_limit is None:
+        return check_type.probe(test_config, err_console, verbose=verbose, resources=resources, fields=fields)
+
+    started_at = datetime.datetime.now(datetime.UTC)
+    future = _run_in_daemon_thread(
+        _run_single_probe, test_type, test_config, err_console, verbose, resources, fields, None
+    )
+    try:
+        return future.result(timeout=time_limit)
+    except TimeoutError:
+        if future.done():
+            raise
+        return _abandon(future, test_type, test_config, time_limit, started_at)
+
+
+async def run_probe_async(
+    test_type: str,
+    test_config,
+    err_console,
+    verbose=False,
+    resources: Optional[ProbeResources] = None,
+    fields: Optional[FrozenSet[str]] = None,
+    time_limit: Optional[float] = None,
+) -> Dict:
+    """Coroutine version of `run_probe`.
+
+    Check types without a native coroutine implementation are run in a daemon thread.
+    """
+    sampling = sampling_options(test_config)
+    if sampling is not None:
+        return await _run_sampled_probe_async(
+            sampling, test_type, test_config, err_console, verbose, resources, fields, time_limit
+        )
+    return await _run_single_probe_async(test_type, test_config, err_console, verbose, resources, fields, time_limit)
+
+
+async def _run_single_probe_async(test_type, test_config, err_console, verbose, resources, fields, time_limit) -> Dict:
+    check_type = get_check_type(test_type)
+    if time_limit is None:
+        if check_type.probe_async is None:
+            return await asyncio.wrap_future(
+                _run_in_daemon_thread(
+                    _run_single_probe, test_type, test_config, err_console, verbose, resources, fields, None
+                )
             )
-        case "postgres-grants":
-            if verbose:
-                err_console.print("Postgres grants check evaluating effective privileges")
-            test_detail = postgres_grants_check(
-                dsn=test_config["dsn"],
-                rules=test_config.get("rules", []),
-                timeout=test_config.get("timeout", 5),
+        return await check_type.probe_async(
+            test_config, err_console, verbose=verbose, resources=resources, fields=fields
+        )
+
+    # Coroutines are cancelled at the limit, and blocking probes are left running in a daemon thread
+    started_at = datetime.datetime.now(datetime.UTC)
+    if check_type.probe_async is None:
+        future = _run_in_daemon_thread(
+            _run_single_probe, test_type, test_config, err_console, verbose, resources, fields, None
+        )
+        probe = asyncio.wrap_future(future)
+    else:
+        future = None
+        probe = check_type.probe_async(test_config, err_console, verbose=verbose, resources=resources, fields=fields)
+    try:
+        return await asyncio.wait_for(probe, time_limit)
+    except TimeoutError:
+        if future is not None:
+            return _abandon(future, test_type, test_config, time_limit, started_at)
+        return time_limit_result(test_type, test_config, time_limit, started_at)
+
+
+def _run_sampled_probe(
+    sampling: SamplingOptions, test_type, test_config, err_console, verbose, resources, fields, time_limit
+) -> Dict:
+    started = time.monotonic()
+
+    def sample(index):
+        delay = started + index * sampling.interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        # Only the first sample's output is kept, so the others skip every optional field
+        began = time.perf_counter_ns()
+        output = _run_single_probe(
+            test_type,
+            test_config,
+            err_console,
+            verbose and index == 0,
+            resources,
+            fields if index == 0 else frozenset(),
+            time_limit,
+        )
+        return time.perf_counter_ns() - began, output
+
+    if sampling.concurrency == 1:
+        return _sampled_result(sampling, map(sample, range(sampling.samples)))
+    pending = _map_in_daemon_threads(sample, range(sampling.samples), sampling.concurrency)
+    return _sampled_result(sampling, (future.result() for future in pending))
+
+
+async def _run_sampled_probe_async(
+    sampling: SamplingOptions, test_type, test_config, err_console, verbose, resources, fields, time_limit
+) -> Dict:
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(sampling.concurrency)
+
+    async def sample(index):
+        await asyncio.sleep(max(started + index * sampling.interval - time.monotonic(), 0))
+        async with semaphore:
+            began = time.perf_counter_ns()
+            output = await _run_single_probe_async(
+                test_type,
+                test_config,
+                err_console,
+                verbose and index == 0,
+                resources,
+                fields if index == 0 else frozenset(),
+                time_limit,
             )
-        case _:
-            logger.warning("Unhandled test type")
-            raise NotImplementedError("Unknown test type")
+            return time.perf_counter_ns() - began, output
+
+    return _sampled_result(sampling, await asyncio.gather(*(sample(index) for index in range(sampling.samples))))
+
+
+def _sampled_result(sampling: SamplingOptions, samples) -> Dict:
+    output = None
+    durations = []
+    errors = 0
+    for duration, sample_output in samples:
+        if output is None:
+            output = sample_output
+        if sample_failed(sample_output["data"]):
+            errors += 1
+        else:
+            durations.append(duration)
+
+    output["spec"].update(
+        {"samples": sampling.samples, "sample-interval": sampling.interval, "sample-concurrency": sampling.concurrency}
+    )
+    data = output["data"]
+    if "endTimestamp" in data:
+        data["endTimestamp"] = datetime.datetime.now(datetime.UTC).isoformat()
+    data["latency"] = latency_summary(durations, errors)
+    return output
+
+
+def _run_in_daemon_thread(fn, *args) -> Future:
+    future = Future()
+
+    def target():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    threading.Thread(target=target, name="netcheck-probe", daemon=True).start()
+    return future
+
+
+def _map_in_daemon_threads(fn, items, concurrency: int) -> List[Future]:
+    """
+    Call `fn` on each of `items` from at most `concurrency` daemon threads.
+
+    Unlike a `ThreadPoolExecutor`, whose workers are joined when the interpreter exits,
+    calls still running are abandoned with the process.
+    """
+    pending = [(item, Future()) for item in items]
+    queue = iter(pending)
+    queue_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with queue_lock:
+                item, future = next(queue, (None, None))
+            if future is None:
+                return
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(item))
+                except BaseException as e:
+                    future.set_exception(e)
+
+    for _ in range(min(concurrency, len(pending))):
+        threading.Thread(target=worker, name="netcheck", daemon=True).start()
+    return [future for _, future in pending]
+
+
+def _abandon(future: Future, test_type: str, test_config: Dict, time_limit: float, started_at) -> Dict:
+    def log_overrun(future):
+        late = datetime.datetime.now(datetime.UTC) - started_at
+        logger.warning("Abandoned %s probe finished after %.1fs", test_type, late.total_seconds())
 
+    future.add_done_callback(log_overrun)
+    return time_limit_result(test_type, test_config, time_limit, started_at)
+
+
+def time_limit_result(test_type: str, test_config: Dict, time_limit: float, started_at: datetime.datetime) -> Dict:
+    """
+    Probe result for a rule abandoned after `time_limit` seconds.
+
+    It is validated like any failed probe, so a rule that expects to fail passes.
+    """
+    return {
+        "spec": {**test_config, "type": test_type},
+        "data": {
+            "startTimestamp": started_at.isoformat(),
+            "endTimestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+            "exception-type": "RuleTimeout",
+            "exception": f"Probe still running after its time limit of {time_limit:g}s",
+            "time-limit": time_limit,
+        },
+    }
+
+
+def default_validation_rule(test_type: str) -> str:
+    return get_check_type(test_type).default_validation_rule
+
+
+def _validation_or_default(validation_rule, test_type: str):
+    return default_validation_rule(test_type) if validation_rule is None else validation_rule
+
+
+def evaluate_probe_result(
+    test_type: str,
+    test_config,
+    test_detail: Dict,
+    err_console,
+    validation_rule=None,
+    validation_context=None,
+    verbose=False,
+    include_context=False,
+):
+    """
+    Validate a probe result, redact sensitive fields and record the pass/fail status.
+
+    When the validation is a list or map of expressions (see `validation_patterns`),
+    the result's `validations` reports whether each one passed, and the rule passes
+    when all of them do.
+    """
     if "name" in test_config:
         test_detail["name"] = test_config["name"]
 
     if validation_rule is None:
         # use the default validation rule
-        match test_type:
-            case "http":
-                validation_rule = DEFAULT_HTTP_VALIDATION_RULE
-            case "dns":
-                validation_rule = DEFAULT_DNS_VALIDATION_RULE
-            case "tcp":
-                validation_rule = DEFAULT_TCP_VALIDATION_RULE
-            case "internal":
-                validation_rule = "true"
-            case "postgres":
-                validation_rule = DEFAULT_POSTGRES_VALIDATION_RULE
-            case "postgres-grants":
-                validation_rule = DEFAULT_POSTGRES_GRANTS_VALIDATION_RULE
-            case _:
-                raise NotImplementedError("Unknown check type")
+        validation_rule = default_validation_rule(test_type)
     elif verbose:
         err_console.print("Using custom validation rule")
 
     test_detail["spec"]["pattern"] = validation_rule
 
-    logger.info(f"Validating probe result with rule: {validation_rule}")
-    logger.info(f"Probe result: {test_detail}")
-    if validation_context is not None:
-        if "data" in validation_context or "spec" in validation_context:
-            raise ValueError("validation_context cannot contain a 'data' or 'spec' key")
-        test_detail.update(validation_context)
+    logger.info("Validating probe result with rule: %s", validation_rule)
+    # Formatted lazily, as a result may hold a large body
+    logger.info("Probe result: %s", test_detail)
+    if validation_context is None:
+        validation_context = ValidationContext({})
+    elif not isinstance(validation_context, ValidationContext):
+        validation_context = ValidationContext(validation_context)
 
-    passed = evaluate_cel_with_context(test_detail, validation_rule)
+    if isinstance(validation_rule, str):
+        passed = validation_context.evaluate(validation_rule, test_detail["spec"], test_detail["data"])
+    else:
+        validations = []
+        for name, pattern in validation_patterns(validation_rule):
+            outcome = {"pattern": pattern}
+            if name is not None:
+                outcome = {"name": name, **outcome}
+            outcome["passed"] = bool(validation_context.evaluate(pattern, test_detail["spec"], test_detail["data"]))
+            validations.append(outcome)
+        test_detail["validations"] = validations
+        passed = all(outcome["passed"] for outcome in validations)
 
-    # Remove the context from the `test_detail` object
-    if not include_context and validation_context is not None:
-        for key in validation_context:
-            if key in test_detail:
-                del test_detail[key]
+    # Only include the context in the `test_detail` object when asked to
+    if include_context:
+        test_detail.update(validation_context.variables)
 
     # Strip out known sensitive fields
     if not include_context:
-        for field in {"headers", "dsn", "password", "params", "connection"}:
-            if field in test_detail["spec"]:
-                test_detail["spec"][field] = "REDACTED"
-            if field in test_detail["data"]:
-                test_detail["data"][field] = "REDACTED"
+        _redact(test_detail)
 
     # Add the pass/status to the individual result. We also support an "expected": "fail" option
     # which will cause the test to fail if the validation passes.
@@ -212,3 +941,11 @@ def check_individual_assertion(
         test_detail["status"] = "pass" if passed else "fail"
 
     return test_detail
+
+
+def _redact(test_detail: Dict):
+    for field in {"headers", "dsn", "password", "params", "connection"}:
+        if field in test_detail["spec"]:
+            test_detail["spec"][field] = "REDACTED"
+        if field in test_detail["data"]:
+            test_detail["data"][field] = "REDACTED"
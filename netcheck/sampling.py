@@ -0,0 +1,106 @@
+"""
+Repeated-sample latency measurement.
+
+A rule with `"samples": N` probes its target N times instead of once, starting a
+sample every `sample-interval` seconds with up to `sample-concurrency` of them in
+flight, and summarizes how long the samples took in `data.latency`.
+"""
+
+import bisect
+import math
+from typing import Dict, List, NamedTuple, Optional
+
+from netcheck.metrics import DURATION_BUCKETS
+
+# Percentiles reported in `data.latency`, e.g. `p99`
+PERCENTILES = (50, 90, 99)
+
+# Fields of `data.latency` that are durations, in seconds
+LATENCY_DURATIONS = ("min", "mean", *(f"p{percentile}" for percentile in PERCENTILES), "max")
+
+# Rule keys that configure sampling rather than the probe
+SAMPLING_KEYS = frozenset({"samples", "sample-interval", "sample-concurrency"})
+
+
+class SamplingOptions(NamedTuple):
+    samples: int
+    interval: float = 0.0
+    concurrency: int = 1
+
+
+def sampling_options(test_config: Dict) -> Optional[SamplingOptions]:
+    """
+    Read a rule's sampling options.
+
+    Returns:
+        None if the rule doesn't set `samples`.
+
+    Raises:
+        ValueError: If an option is out of range.
+    """
+    if test_config.get("samples") is None:
+        return None
+    options = SamplingOptions(
+        int(test_config["samples"]),
+        float(test_config.get("sample-interval", 0)),
+        int(test_config.get("sample-concurrency", 1)),
+    )
+    if options.samples < 1:
+        raise ValueError(f"samples must be at least 1, got {options.samples}")
+    if options.interval < 0:
+        raise ValueError(f"sample-interval must not be negative, got {options.interval}")
+    if options.concurrency < 1:
+        raise ValueError(f"sample-concurrency must be at least 1, got {options.concurrency}")
+    return options
+
+
+def sample_failed(data: Dict) -> bool:
+    """Whether a probe's `data` reports an error, such as a refused connection or a timeout."""
+    return any(data.get(key) is not None for key in ("exception-type", "exception", "error"))
+
+
+def latency_summary(durations_ns: List[int], errors: int) -> Dict:
+    """
+    Summarize sample durations for `data.latency`.
+
+    Args:
+        durations_ns: Duration of every sample that didn't fail, in nanoseconds.
+        errors: Number of samples that failed. They count towards `error-rate` but
+            not the latency statistics.
+
+    Returns:
+        `samples`, `errors` and `error-rate`, plus `min`, `mean`, the `PERCENTILES`
+        (nearest rank), `max` and a `histogram` when any sample succeeded. Latencies
+        are in seconds, and durations in CEL. The histogram counts samples by the upper bound, in
+        seconds, of the first `netcheck.metrics.DURATION_BUCKETS` bucket they fit,
+        leaving out empty buckets.
+    """
+    count = len(durations_ns) + errors
+    summary = {"samples": count, "errors": errors, "error-rate": errors / count if count else 0.0}
+    if not durations_ns:
+        return summary
+
+    ordered = sorted(durations_ns)
+    summary["min"] = _duration(ordered[0])
+    summary["mean"] = _duration(sum(ordered) / len(ordered))
+    for percentile in PERCENTILES:
+        rank = max(math.ceil(percentile / 100 * len(ordered)), 1)
+        summary[f"p{percentile}"] = _duration(ordered[rank - 1])
+    summary["max"] = _duration(ordered[-1])
+
+    # The durations are sorted, so each bucket's count is the distance between bounds
+    histogram = {}
+    start = 0
+    for bound in DURATION_BUCKETS:
+        end = bisect.bisect_right(ordered, bound * 1e9, lo=start)
+        if end > start:
+            histogram[str(bound)] = end - start
+        start = end
+    if start < len(ordered):
+        histogram["+Inf"] = len(ordered) - start
+    summary["histogram"] = histogram
+    return summary
+
+
+def _duration(nanoseconds: float) -> float:
+    return round(nanoseconds / 1e9, 6)
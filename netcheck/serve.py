@@ -0,0 +1,131 @@
+import heapq
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+from netcheck.metrics import MetricsRegistry
+from netcheck.resources import ProbeResources
+from netcheck.runner import load_config, run_assertions
+
+logger = logging.getLogger("netcheck.serve")
+
+INTERVAL_REGEX = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*$")
+INTERVAL_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_interval(interval: Union[int, float, str]) -> float:
+    """Convert an assertion interval such as `30`, `"30s"`, `"5m"` or `"1h"` to seconds."""
+    if isinstance(interval, (int, float)):
+        seconds = float(interval)
+    else:
+        match = INTERVAL_REGEX.match(interval)
+        if match is None:
+            raise ValueError(f"Invalid interval '{interval}'")
+        seconds = float(match.group(1)) * INTERVAL_UNITS[match.group(2) or "s"]
+    if seconds <= 0:
+        raise ValueError(f"Interval must be positive, got '{interval}'")
+    return seconds
+
+
+def serve(
+    netchecks_configs: List[Dict],
+    err_console,
+    emit: Callable[[Dict], None],
+    interval: float = 60,
+    jitter: float = 0.1,
+    concurrency: int = 1,
+    pool_size: Optional[int] = None,
+    verbose: bool = False,
+    include_context: bool = False,
+    stop: Optional[threading.Event] = None,
+    metrics: Optional[MetricsRegistry] = None,
+    capture_all: bool = False,
+    rule_timeout: Optional[float] = None,
+):
+    """
+    Run every assertion of the given configs repeatedly until `stop` is set.
+
+    Each assertion runs on its own schedule: every `interval` seconds, or its own
+    `interval` key (e.g. `"30s"`), stretched or shortened by up to `jitter` (a
+    fraction of the interval) so checks against the same target spread out. The first
+    runs are spread over the first `jitter` fraction of each interval.
+
+    Configs are loaded and compiled once, and DNS resolvers, HTTP sessions and
+    Postgres connections stay open between runs. Every completed run is passed to
+    `emit` as a `netcheck-output` document holding that one assertion. An assertion
+    is skipped while its previous run is still in progress.
+
+    Args:
+        concurrency: Number of assertions that may run at the same time.
+        metrics: Registry every rule result is recorded in, e.g. for a `/metrics` endpoint.
+        capture_all: Capture every `data` field, not only those the validation rules read.
+        rule_timeout: Wall-clock limit in seconds for every rule, see `run_from_config`.
+    """
+    if not 0 <= jitter < 1:
+        raise ValueError("jitter must be at least 0 and less than 1")
+    stop = stop if stop is not None else threading.Event()
+    resources = ProbeResources(pool_size or concurrency)
+    emit_lock = threading.Lock()
+
+    scheduled = []
+    for netchecks_config in netchecks_configs:
+        loaded_config, validation_context = load_config(netchecks_config, err_console, verbose)
+        for assertion in loaded_config["assertions"]:
+            scheduled.append(
+                {
+                    "assertion": assertion,
+                    "validation-context": validation_context,
+                    "interval": parse_interval(assertion.get("interval", interval)),
+                    "running": threading.Event(),
+                }
+            )
+    if verbose:
+        err_console.print(f"Scheduling {len(scheduled)} assertions")
+
+    def run(entry):
+        try:
+            output = run_assertions(
+                [entry["assertion"]],
+                entry["validation-context"],
+                err_console,
+                verbose=verbose,
+                include_context=include_context,
+                resources=resources,
+                close_resources=False,
+                metrics=metrics,
+                capture_all=capture_all,
+                rule_timeout=rule_timeout,
+            )
+            with emit_lock:
+                emit(output)
+        except Exception:
+            logger.exception(f"Running assertion '{entry['assertion']['name']}' failed")
+        finally:
+            entry["running"].clear()
+
+    now = time.monotonic()
+    queue = [(now + random.uniform(0, jitter) * entry["interval"], index) for index, entry in enumerate(scheduled)]
+    heapq.heapify(queue)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="netcheck-serve") as executor:
+        try:
+            while queue and not stop.is_set():
+                due, index = queue[0]
+                if stop.wait(max(0.0, due - time.monotonic())):
+                    break
+                heapq.heappop(queue)
+                entry = scheduled[index]
+                if entry["running"].is_set():
+                    logger.warning(f"Skipping assertion '{entry['assertion']['name']}', previous run still in progress")
+                else:
+                    entry["running"].set()
+                    executor.submit(run, entry)
+                next_due = due + entry["interval"] * random.uniform(1 - jitter, 1 + jitter)
+                heapq.heappush(queue, (max(next_due, time.monotonic()), index))
+        finally:
+            stop.set()
+    resources.close()
@@ -1,28 +1,179 @@
+import ast
 import base64
+import datetime
+import functools
+import hashlib
 import json
 import logging
-from typing import Dict
-import yaml
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional
 
 from cel import cel
 
+from netcheck.sampling import LATENCY_DURATIONS
+
 
 logger = logging.getLogger("netcheck.validation")
 
+# Maximum number of distinct compiled CEL programs kept in memory
+CEL_PROGRAM_CACHE_SIZE = 4096
+
+# Maximum total size of the documents a ParseCache keeps parsed values for
+PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+CEL_FUNCTIONS = {
+    "parse_json": lambda s: json.loads(s),
+    "parse_yaml": lambda s: _parse_yaml(s),
+    "b64decode": lambda s: base64.b64decode(s).decode("utf-8"),
+    "b64encode": lambda s: base64.b64encode(s.encode()).decode(),
+}
+
+
+def _parse_yaml(s):
+    # yaml is only imported by rules that use parse_yaml
+    import yaml
+
+    return yaml.safe_load(s)
+
+
+class ParseCache:
+    """
+    Parsed documents for the `parse_json` and `parse_yaml` CEL functions, keyed by a
+    digest of the document, so a response body or ConfigMap file is parsed once however
+    many expressions and rules parse it.
+
+    One cache is shared by everything evaluated in a run. Once the documents behind the
+    cached values add up to more than `max_bytes`, the least recently used are dropped.
+    """
+
+    def __init__(self, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse_json(self, s):
+        return self._parse("json", json.loads, s)
+
+    def parse_yaml(self, s):
+        return self._parse("yaml", _parse_yaml, s)
+
+    def functions(self) -> Dict[str, Callable]:
+        """`CEL_FUNCTIONS`, with the parse functions backed by this cache."""
+        return {**CEL_FUNCTIONS, "parse_json": self.parse_json, "parse_yaml": self.parse_yaml}
+
+    def _parse(self, kind: str, parse: Callable, s):
+        document = s.encode() if isinstance(s, str) else bytes(s)
+        key = (kind, hashlib.sha256(document).digest())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Parse errors are raised to CEL every time rather than cached
+        value = parse(s)
+        if len(document) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = (value, len(document))
+                    self._size += len(document)
+                while self._size > self.max_bytes:
+                    _, (_, size) = self._entries.popitem(last=False)
+                    self._size -= size
+        return value
+
+
+@functools.lru_cache(maxsize=CEL_PROGRAM_CACHE_SIZE)
+def compile_cel(expression: str) -> cel.Program:
+    """
+    Compile a CEL expression, reusing the program from a process-wide LRU cache keyed
+    by the expression text. Cache statistics are available via `compile_cel.cache_info()`.
+
+    Raises:
+        ValueError: If the CEL expression is invalid.
+    """
+    try:
+        return cel.compile(expression)
+    except ValueError as e:
+        logger.error(f"Invalid CEL expression syntax: {e}")
+        raise ValueError(f"Invalid CEL expression: {e}") from e
+
 
-def evaluate_cel_with_context(context: Dict, validation_rule: str):
+def precompile_cel(expressions: Iterable[str]) -> int:
+    """
+    Compile every expression up front so that invalid rules are reported before any
+    probe runs, and so later evaluations only pay for execution.
+
+    Returns:
+        int: The number of distinct expressions compiled.
+    """
+    unique_expressions = set(expressions)
+    for expression in unique_expressions:
+        compile_cel(expression)
+    return len(unique_expressions)
+
+
+def data_fields(validation_rule: str) -> Optional[FrozenSet[str]]:
+    """
+    Statically find which fields of a probe's `data` a validation rule reads, so probes
+    can skip capturing the rest.
+
+    Returns:
+        A frozenset of field names (empty if the rule doesn't use `data` at all), or None
+        if the rule may read any field.
+
+    Raises:
+        ValueError: If the CEL expression is invalid.
+    """
+    if "data" not in compile_cel(validation_rule).variables():
+        return frozenset()
+    return referenced_fields(validation_rule, "data")
+
+
+def cel_durations(data: Dict) -> Dict:
+    """
+    Probe `data` as rules see it: the `timings` and `latency` durations, recorded in
+    seconds so results stay plain JSON, as CEL `duration` values.
+    """
+    timings = data.get("timings")
+    latency = data.get("latency")
+    if not isinstance(timings, dict) and not isinstance(latency, dict):
+        return data
+    data = dict(data)
+    if isinstance(timings, dict):
+        data["timings"] = {phase: _duration(seconds) for phase, seconds in timings.items()}
+    if isinstance(latency, dict):
+        data["latency"] = {
+            key: _duration(value) if key in LATENCY_DURATIONS else value for key, value in latency.items()
+        }
+    return data
+
+
+def _duration(seconds):
+    return datetime.timedelta(seconds=seconds) if isinstance(seconds, (int, float)) else seconds
+
+
+def evaluate_cel_with_context(context: Dict, validation_rule: str, parse_cache: Optional[ParseCache] = None):
     """
     Evaluates a Common Expression Language (CEL) validation rule with a given context.
 
-    This function compiles the CEL validation rule into an Abstract Syntax Tree (AST),
-    creates a CEL program with additional functions (parse_json), sets up the context, and then
-    evaluates the CEL expression. If the evaluation fails due to a missing key in the
-    context, the function returns False.
+    This function fetches the compiled CEL program for the validation rule from the
+    program cache (compiling it on first use), sets up the context with additional
+    functions (parse_json), and then evaluates the CEL expression. If the evaluation fails
+    due to a missing key in the context, the function returns False.
 
     Args:
         context: A dictionary representing the context in which the validation rule
             is evaluated. The context should be in a format that can be converted to CEL.
         validation_rule: A CEL validation rule to be evaluated.
+        parse_cache: Cache for `parse_json` and `parse_yaml` to share with other evaluations.
 
     Returns:
         Any: The result of the CEL expression evaluation. If the evaluation fails due to a
@@ -31,32 +182,23 @@ def evaluate_cel_with_context(context: Dict, validation_rule: str):
     Raises:
         ValueError: If the CEL expression is invalid.
     """
-    functions = {
-        "parse_json": lambda s: json.loads(s),
-        "parse_yaml": lambda s: yaml.safe_load(s),
-        "b64decode": lambda s: base64.b64decode(s).decode("utf-8"),
-        "b64encode": lambda s: base64.b64encode(s.encode()).decode(),
-    }
+    program = compile_cel(validation_rule)
     env = cel.Context(
         variables=context,
-        functions=functions,
+        functions=parse_cache.functions() if parse_cache is not None else CEL_FUNCTIONS,
     )
+    return _execute(program, env)
 
+
+def _execute(program: cel.Program, env: cel.Context):
     # Evaluate the CEL expression
     try:
-        result = cel.evaluate(validation_rule, env)
-    except ValueError as e:
-        error_msg = str(e)
-        # Distinguish between parse errors (config bugs) and execution errors (validation failures)
-        if "Failed to parse" in error_msg:
-            # Parse/syntax errors indicate invalid CEL configuration - raise to surface
-            logger.error(f"Invalid CEL expression syntax: {e}")
-            raise ValueError(f"Invalid CEL expression: {e}") from e
-        else:
-            # Execution errors (type mismatches, etc.) indicate validation failure
-            # These can happen with valid expressions that fail at runtime
-            logger.debug(f"CEL execution failed: {e}")
-            return False
+        result = program.execute(env)
+    except (ValueError, TypeError, LookupError, ArithmeticError) as e:
+        # Execution errors (type mismatches, missing keys, etc.) indicate validation failure
+        # These can happen with valid expressions that fail at runtime
+        logger.debug(f"CEL execution failed: {e}")
+        return False
     except RuntimeError as e:
         # Runtime errors (undefined variables) indicate validation failure
         # This can happen if the probe failed to return expected values
@@ -64,3 +206,126 @@ def evaluate_cel_with_context(context: Dict, validation_rule: str):
         return False
 
     return result
+
+
+class ValidationContext:
+    """
+    Shared CEL variables (the config's contexts) reused to validate many probe results.
+
+    Each rule is evaluated with the per-probe `spec` and `data` overlaid on only the
+    part of the shared context that it reads: variables the rule doesn't reference are
+    left out, and for a rule that only reads `configmap.key` or `configmap['key']` just
+    those keys are passed to CEL. Per-rule validation cost therefore doesn't grow with
+    the size of a ConfigMap or directory context the rule barely touches.
+    """
+
+    def __init__(self, variables: Dict[str, Any], parse_cache: Optional[ParseCache] = None):
+        if "data" in variables or "spec" in variables:
+            raise ValueError("validation_context cannot contain a 'data' or 'spec' key")
+        self.variables = variables
+        self.parse_cache = parse_cache if parse_cache is not None else ParseCache()
+        self._functions = self.parse_cache.functions()
+        self._projections: Dict[str, Dict[str, Any]] = {}
+
+    def evaluate(self, validation_rule: str, spec: Dict, data: Dict):
+        """
+        Evaluate a validation rule against a probe result.
+
+        When the result has a `body` and the rule reads `data.json`, the body is parsed
+        as JSON (through the parse cache) and passed to the rule as `data.json`, without
+        adding it to the result. Durations are passed as CEL durations (see `cel_durations`).
+
+        Returns and raises as `evaluate_cel_with_context`.
+        """
+        program = compile_cel(validation_rule)
+        shared = self._projections.get(validation_rule)
+        if shared is None:
+            shared = self._projections[validation_rule] = self._project(program, validation_rule)
+        if isinstance(data.get("body"), str) and "json" not in data:
+            fields = data_fields(validation_rule)
+            if fields is None or "json" in fields:
+                try:
+                    data = {**data, "json": self.parse_cache.parse_json(data["body"])}
+                except ValueError:
+                    logger.debug("Body is not JSON, leaving data.json unset")
+        env = cel.Context(
+            variables={**shared, "spec": spec, "data": cel_durations(data)},
+            functions=self._functions,
+        )
+        return _execute(program, env)
+
+    def _project(self, program: cel.Program, validation_rule: str) -> Dict[str, Any]:
+        projection = {}
+        for name in program.variables():
+            if name not in self.variables:
+                continue
+            value = self.variables[name]
+            fields = referenced_fields(validation_rule, name)
+            if fields is not None and isinstance(value, dict):
+                value = {field: value[field] for field in fields if field in value}
+            projection[name] = value
+        return projection
+
+
+# A CEL token: a string literal, an identifier, or a single other character
+_TOKEN_REGEX = re.compile(
+    r"""
+    (?P<string>[rRbB]{0,2}(?:'''.*?'''|\"\"\".*?\"\"\"|'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"))
+    | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<punct>\S)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+@functools.lru_cache(maxsize=CEL_PROGRAM_CACHE_SIZE)
+def referenced_fields(expression: str, variable: str) -> Optional[FrozenSet[str]]:
+    """
+    Statically find which top-level fields of `variable` a CEL expression reads.
+
+    Accesses of the form `variable.field` and `variable['field']` are understood.
+    Any other use of the variable (passing it to a function, calling a method on
+    it, indexing with a computed key, ...) may read every field, in which case
+    None is returned.
+
+    Returns:
+        A frozenset of field names, or None if the whole value may be used.
+    """
+    tokens = [(match.lastgroup, match.group()) for match in _TOKEN_REGEX.finditer(expression)]
+    fields = set()
+    for i, token in enumerate(tokens):
+        if token != ("ident", variable) or (i > 0 and tokens[i - 1] == ("punct", ".")):
+            continue
+        following = tokens[i + 1 : i + 4]
+        if len(following) >= 2 and following[0] == ("punct", ".") and following[1][0] == "ident":
+            if len(following) == 3 and following[2] == ("punct", "("):
+                return None
+            fields.add(following[1][1])
+        elif (
+            len(following) == 3
+            and following[0] == ("punct", "[")
+            and following[1][0] == "string"
+            and following[2] == ("punct", "]")
+        ):
+            field = _string_literal(following[1][1])
+            if field is None:
+                return None
+            fields.add(field)
+        else:
+            return None
+    return frozenset(fields)
+
+
+def _string_literal(token: str) -> Optional[str]:
+    prefix = token[: len(token) - len(token.lstrip("rRbB"))]
+    if "b" in prefix.lower():
+        return None
+    if "r" in prefix.lower():
+        body = token[len(prefix) :]
+        quote = 3 if body[:3] in ("'''", '"""') else 1
+        return body[quote:-quote]
+    try:
+        value = ast.literal_eval(token)
+    except (ValueError, SyntaxError):
+        return None
+    return value if isinstance(value, str) else None
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark `netcheck run` wall-clock time against the number of concurrent workers.
+
+A local HTTP server stands in for slow endpoints: every request sleeps for
+`--delay` seconds before responding. The generated config contains `--rules`
+http rules spread over a handful of assertions, and is run once per
+concurrency level.
+
+    uv run python scripts/benchmark_concurrency.py --rules 64 --delay 0.25
+"""
+
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+from netcheck.runner import run_from_config
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    delay = 0.25
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def build_config(url: str, rules: int, rules_per_assertion: int = 8) -> dict:
+    return {
+        "assertions": [
+            {
+                "name": f"assertion-{i}",
+                # Distinct URLs, so identical rules aren't collapsed into one shared probe
+                "rules": [
+                    {"type": "http", "url": f"{url}?rule={j}"} for j in range(i, min(i + rules_per_assertion, rules))
+                ],
+            }
+            for i in range(0, rules, rules_per_assertion)
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=64)
+    parser.add_argument("--delay", type=float, default=0.25, help="Seconds each request takes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    SlowHandler.delay = args.delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    config = build_config(url, args.rules)
+    print(f"{args.rules} http rules, {args.delay}s per request")
+    print(f"{'concurrency':>12} {'seconds':>10} {'speedup':>8}")
+    baseline = None
+    for concurrency in args.concurrency:
+        start = time.perf_counter()
+        results = run_from_config(config, Mock(), concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+        assert all(r["status"] == "pass" for a in results["assertions"] for r in a["results"])
+        baseline = baseline or elapsed
+        print(f"{concurrency:>12} {elapsed:>10.3f} {baseline / elapsed:>7.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark dns check throughput with a shared resolver registry against a fresh
+resolver per lookup.
+
+A local UDP server stands in for the nameserver and answers every A query with
+127.0.0.1. `--hosts` distinct names are looked up once per mode and thread count.
+"Fresh" reproduces the old behaviour of resetting the default resolver (and
+re-reading /etc/resolv.conf) for every lookup, which is only safe sequentially.
+
+    uv run python scripts/benchmark_dns.py --hosts 1000
+"""
+
+import argparse
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dns.message
+import dns.resolver
+import dns.rrset
+
+from netcheck.checks.dns import DnsResolverRegistry, dns_lookup_check
+
+
+def serve(sock):
+    while True:
+        try:
+            wire, address = sock.recvfrom(512)
+        except OSError:
+            return
+        query = dns.message.from_wire(wire)
+        response = dns.message.make_response(query)
+        response.answer.append(dns.rrset.from_text(query.question[0].name, 60, "IN", "A", "127.0.0.1"))
+        sock.sendto(response.to_wire(), address)
+
+
+class FreshResolverRegistry(DnsResolverRegistry):
+    """Builds a new resolver from the system configuration for every lookup."""
+
+    def resolver(self, nameserver=None, source_ip=None, search=True):
+        dns.resolver.reset_default_resolver()
+        resolver = dns.resolver.get_default_resolver()
+        resolver.port = self.port
+        resolver.nameservers = [nameserver]
+        return resolver
+
+
+def run(hosts, resolvers, threads):
+    def lookup(host):
+        return dns_lookup_check(host, "127.0.0.1", timeout=5, resolvers=resolvers)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lookup, hosts))
+    elapsed = time.perf_counter() - start
+    assert all(r["data"]["response-code"] == "NOERROR" for r in results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    threading.Thread(target=serve, args=(sock,), daemon=True).start()
+    port = sock.getsockname()[1]
+    hosts = [f"host-{i}.example.test." for i in range(args.hosts)]
+
+    print(f"{args.hosts} lookups against a local nameserver")
+    print(f"{'resolver':>10} {'threads':>8} {'seconds':>10} {'lookups/s':>10}")
+    elapsed = run(hosts, FreshResolverRegistry(port=port), 1)
+    print(f"{'fresh':>10} {1:>8} {elapsed:>10.3f} {args.hosts / elapsed:>10.0f}")
+    for threads in args.threads:
+        elapsed = run(hosts, DnsResolverRegistry(port=port), threads)
+        print(f"{'shared':>10} {threads:>8} {elapsed:>10.3f} {args.hosts / elapsed:>10.0f}")
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
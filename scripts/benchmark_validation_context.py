@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Measure per-rule validation time as the shared context grows.
+
+Compares merging the whole context into every probe result (the old
+behaviour, via `evaluate_cel_with_context`) with the layered
+`ValidationContext`, for a rule that ignores the context and for one that
+reads a single key from it.
+
+    uv run python scripts/benchmark_validation_context.py
+"""
+
+import argparse
+import time
+
+from netcheck.validation import ValidationContext, evaluate_cel_with_context
+
+RULES = {
+    "data only": "data['status-code'] in [200, 201]",
+    "reads context": "data['status-code'] == 200 && configmap['key-7'] != ''",
+}
+
+
+def per_rule_seconds(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    spec = {"type": "http", "url": "http://example"}
+    data = {"status-code": 200, "body": "ok"}
+
+    print(f"{'context keys':>12} {'rule':>14} {'merged (us)':>12} {'layered (us)':>13}")
+    for size in args.sizes:
+        context = {"configmap": {f"key-{i}": "x" * 64 for i in range(size)}}
+        layered = ValidationContext(context)
+        for label, rule in RULES.items():
+            merged_time = per_rule_seconds(
+                lambda: evaluate_cel_with_context({**context, "spec": spec, "data": data}, rule), args.repeat
+            )
+            # The first evaluation converts the referenced context; later ones reuse it
+            layered.evaluate(rule, spec, data)
+            layered_time = per_rule_seconds(lambda: layered.evaluate(rule, spec, data), args.repeat)
+            print(f"{size:>12} {label:>14} {merged_time * 1e6:>12.1f} {layered_time * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 import os
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-from pytest import fixture
+from pytest import fixture, skip
 
 TEST_DATA_DIR = os.path.join(
     os.path.dirname(os.path.realpath(__file__)),
@@ -66,3 +73,133 @@ def http_headers_config_filename():
 @fixture()
 def tcp_config_filename():
     return os.path.join(TEST_DATA_DIR, "tcp-config.json")
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """
+    Responds to `/status/<code>` with that status code and echoes request headers as JSON,
+    to `/bytes/<n>` with `n` bytes of text, and to `/trickle/<seconds>` with a body sent a
+    byte at a time over that many seconds.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.startswith("/trickle/"):
+            return self._trickle(float(self.path.rsplit("/", 1)[1]))
+        status = 200
+        content_type = "application/json"
+        if self.path.startswith("/status/"):
+            status = int(self.path.rsplit("/", 1)[1])
+        if self.path.startswith("/bytes/"):
+            body = b"0123456789" * (int(self.path.rsplit("/", 1)[1]) // 10)
+            content_type = "text/plain; charset=utf-8"
+        else:
+            body = ("{" + ", ".join(f'"{k}": "{v}"' for k, v in sorted(self.headers.items())) + "}").encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _trickle(self, seconds):
+        chunks = int(seconds / 0.05)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(chunks))
+        self.end_headers()
+        try:
+            for _ in range(chunks):
+                self.wfile.write(b".")
+                self.wfile.flush()
+                time.sleep(0.05)
+        except ConnectionError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@fixture()
+def local_http_server():
+    """Base URL of a local HTTP server standing in for a remote endpoint."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@fixture(scope="session")
+def self_signed_cert(tmp_path_factory):
+    """(certificate, key) file paths of a self-signed certificate for 127.0.0.1, made with openssl."""
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        skip("openssl is not installed")
+    directory = tmp_path_factory.mktemp("tls")
+    cert, key = str(directory / "cert.pem"), str(directory / "key.pem")
+    subprocess.run(
+        [openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+         "-keyout", key, "-out", cert],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+@fixture()
+def local_https_server(self_signed_cert):
+    """Base URL of `local_http_server` served over TLS with a self-signed certificate."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*self_signed_cert)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"https://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@fixture()
+def local_tcp_port():
+    """Port of a local TCP listener that accepts connections."""
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1024)
+        yield listener.getsockname()[1]
+
+
+def _serve_dns(sock):
+    """Answer every A query with 127.0.0.1, except names under `missing.` which are NXDOMAIN."""
+    import dns.message
+    import dns.rcode
+    import dns.rrset
+
+    while True:
+        try:
+            wire, address = sock.recvfrom(512)
+        except OSError:
+            return
+        query = dns.message.from_wire(wire)
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        if question.name.to_text().endswith("missing."):
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        else:
+            response.answer.append(dns.rrset.from_text(question.name, 60, "IN", "A", "127.0.0.1"))
+        sock.sendto(response.to_wire(), address)
+
+
+@fixture()
+def local_dns_port():
+    """Port of a local UDP DNS server standing in for a nameserver on 127.0.0.1."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    thread = threading.Thread(target=_serve_dns, args=(sock,), daemon=True)
+    thread.start()
+    yield sock.getsockname()[1]
+    sock.close()
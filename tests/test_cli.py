@@ -1,10 +1,13 @@
 import json
+import subprocess
+import sys
 import tempfile
+import time
 
 import pytest
 from typer.testing import CliRunner
 
-import netcheck.runner as netcheck_runner
+import netcheck.checks.postgres as postgres_checks
 from netcheck.cli import app
 
 runner = CliRunner()
@@ -292,7 +295,8 @@ def test_run_http_config_with_headers(http_headers_config_filename):
 
 
 def test_run_http_config_with_headers_redacted_by_default(http_headers_config_filename):
-    result = runner.invoke(app, ["run", "--config", http_headers_config_filename])
+    # The first rule's default validation doesn't read the body, so it's only kept with --capture-all
+    result = runner.invoke(app, ["run", "--config", http_headers_config_filename, "--capture-all"])
     assert result.exit_code == 0, result.stderr
     data = result.stdout
     response = json.loads(data)
@@ -319,6 +323,44 @@ def test_run_internal_config_default(internal_config_filename):
     assert expected_fail_result["status"] == "fail"
 
 
+def test_run_output_defaults_to_compact_json_when_not_a_tty(internal_config_filename):
+    result = runner.invoke(app, ["run", "--config", internal_config_filename])
+    assert result.exit_code == 0, result.stderr
+    assert result.stdout.count("\n") == 1
+    assert json.loads(result.stdout)["type"] == "netcheck-output"
+
+
+@pytest.mark.parametrize("output, lines", [("json", lambda n: n > 1), ("json-compact", lambda n: n == 1)])
+def test_run_output_formats(internal_config_filename, output, lines):
+    result = runner.invoke(app, ["run", "--config", internal_config_filename, "--output", output])
+    assert result.exit_code == 0, result.stderr
+    assert lines(result.stdout.count("\n"))
+    assert json.loads(result.stdout)["assertions"][0]["results"][0]["status"] == "pass"
+
+
+def test_run_ndjson_output(internal_config_filename):
+    result = runner.invoke(app, ["run", "--config", internal_config_filename, "--output", "ndjson"])
+    assert result.exit_code == 0, result.stderr
+
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert records[0]["type"] == "netcheck-output-header"
+    assert [r["type"] for r in records[1:-1]] == ["netcheck-result"] * 2
+    assert {r["result"]["status"] for r in records[1:-1]} == {"pass", "fail"}
+    assert records[-1]["status-counts"] == {"pass": 1, "fail": 1}
+
+
+def test_compact_json_writes_durations_and_large_integers():
+    import datetime
+    import io
+
+    from netcheck.output import write_compact_json
+
+    stream = io.StringIO()
+    write_compact_json({"timings": {"query": datetime.timedelta(milliseconds=1500)}, "big": 2**70}, stream)
+
+    assert json.loads(stream.getvalue()) == {"timings": {"query": 1.5}, "big": 2**70}
+
+
 def test_default_tcp_check():
     result = runner.invoke(app, ["tcp"])
     assert result.exit_code == 0
@@ -432,7 +474,7 @@ def test_run_tcp_config(tcp_config_filename):
 
 def test_postgres_cli_verbose(monkeypatch):
     monkeypatch.setattr(
-        netcheck_runner,
+        postgres_checks,
         "postgres_query_check",
         lambda **kwargs: {
             "spec": {"type": "postgres", "dsn": kwargs["dsn"], "query": kwargs["query"]},
@@ -454,7 +496,7 @@ def test_postgres_cli_verbose(monkeypatch):
 
 def test_postgres_cli_disable_redaction(monkeypatch):
     monkeypatch.setattr(
-        netcheck_runner,
+        postgres_checks,
         "postgres_query_check",
         lambda **kwargs: {
             "spec": {"type": "postgres", "dsn": kwargs["dsn"], "query": kwargs["query"]},
@@ -474,7 +516,7 @@ def test_postgres_cli_disable_redaction(monkeypatch):
 
 def test_postgres_cli_redacts_dsn_by_default(monkeypatch):
     monkeypatch.setattr(
-        netcheck_runner,
+        postgres_checks,
         "postgres_query_check",
         lambda **kwargs: {
             "spec": {"type": "postgres", "dsn": kwargs["dsn"], "query": kwargs["query"]},
@@ -492,7 +534,7 @@ def test_postgres_cli_redacts_dsn_by_default(monkeypatch):
 
 def test_run_config_supports_validate_pattern(monkeypatch):
     monkeypatch.setattr(
-        netcheck_runner,
+        postgres_checks,
         "postgres_query_check",
         lambda **kwargs: {
             "spec": {"type": "postgres", "dsn": kwargs["dsn"], "query": kwargs["query"]},
@@ -528,3 +570,81 @@ def test_run_config_supports_validate_pattern(monkeypatch):
     assert result["name"] == "answer-is-42"
     assert result["status"] == "pass"
     assert result["spec"]["pattern"] == "data.rows[0].answer == 42"
+
+
+def test_run_writes_metrics_textfile(internal_config_filename, tmp_path):
+    textfile = tmp_path / "netcheck.prom"
+    result = runner.invoke(
+        app, ["run", "--config", internal_config_filename, "--output", "json", "--metrics-textfile", str(textfile)]
+    )
+    assert result.exit_code == 0, result.stderr
+
+    metrics = textfile.read_text()
+    assert "# TYPE netcheck_probe_duration_seconds histogram" in metrics
+    assert 'netcheck_probe_duration_seconds_count{type="internal"} 2' in metrics
+
+
+def test_http_check_body_capture_options(local_http_server):
+    result = runner.invoke(
+        app,
+        ["http", "--url", f"{local_http_server}/bytes/100", "--body-capture", "hash", "--max-body-bytes", "10",
+         "--output", "json-compact"],
+    )
+    assert result.exit_code == 0, result.stderr
+
+    data = json.loads(result.stdout)["data"]
+    assert "body" not in data
+    assert data["body-bytes"] == 10
+    assert data["body-truncated"] is True
+    assert len(data["body-sha256"]) == 64
+
+
+def test_run_with_deadline(internal_config_filename):
+    result = runner.invoke(app, ["run", "--config", internal_config_filename, "--deadline", "30"])
+    assert result.exit_code == 0, result.stderr
+    statuses = [r["status"] for a in json.loads(result.stdout)["assertions"] for r in a["results"]]
+    assert sorted(statuses) == ["fail", "pass"]
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_run_default_http_rule_skips_body_and_headers(local_http_server, tmp_path, engine):
+    config = tmp_path / "config.json"
+    config.write_text(
+        json.dumps({"assertions": [{"name": "default", "rules": [{"type": "http", "url": f"{local_http_server}/"}]}]})
+    )
+
+    skipped = runner.invoke(app, ["run", "--config", str(config), "--engine", engine])
+    captured = runner.invoke(app, ["run", "--config", str(config), "--engine", engine, "--capture-all"])
+
+    assert skipped.exit_code == 0, skipped.stderr
+    data = json.loads(skipped.stdout)["assertions"][0]["results"][0]["data"]
+    assert "body" not in data and "headers" not in data
+    assert data["body-bytes"] > 0
+    data = json.loads(captured.stdout)["assertions"][0]["results"][0]["data"]
+    assert data["body"] and data["headers"]
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_run_exits_soon_after_deadline(local_http_server, tmp_path, engine):
+    config = tmp_path / "config.json"
+    config.write_text(
+        json.dumps(
+            {"assertions": [{"name": "slow", "rules": [{"type": "http", "url": f"{local_http_server}/trickle/30"}]}]}
+        )
+    )
+
+    started = time.monotonic()
+    completed = subprocess.run(
+        [sys.executable, "-c", "from netcheck.cli import app; app()"]
+        + ["run", "--config", str(config), "--engine", engine, "--deadline", "1"],
+        capture_output=True,
+        text=True,
+        timeout=25,
+    )
+    elapsed = time.monotonic() - started
+
+    assert completed.returncode == 0, completed.stderr
+    [result] = json.loads(completed.stdout)["assertions"][0]["results"]
+    assert result["data"]["deadline-exceeded"] is True
+    # The probe is still trickling, but the process doesn't wait for it
+    assert elapsed < 10
@@ -5,7 +5,13 @@ import tempfile
 import pytest
 from pathlib import Path
 
-from netcheck.context import LazyFileLoadingDict, replace_template_in_string, replace_template
+import netcheck.context as netcheck_context
+from netcheck.context import (
+    LazyFileLoadingDict,
+    compile_template,
+    replace_template_in_string,
+    replace_template,
+)
 
 
 class TestLazyFileLoadingDict:
@@ -152,3 +158,44 @@ class TestTemplateReplacement:
         result = replace_template(config, context)
 
         assert result["items"] == ["test", "static", "test"]
+
+    def test_compile_template_splits_literals_and_expressions(self):
+        assert compile_template("Bearer {{ api.token }}!") == ((False, "Bearer "), (True, "api.token"), (False, "!"))
+        assert compile_template("no templates") == ((False, "no templates"),)
+
+    def test_dotted_path_does_not_use_cel(self, monkeypatch):
+        def fail(*args):
+            raise AssertionError("CEL should not be used for a dotted path")
+
+        monkeypatch.setattr(netcheck_context, "evaluate_cel_with_context", fail)
+        context = {"customdata": {"url": "https://example.com", "port": 443}}
+
+        rendered = replace_template_in_string("{{ customdata.url }}:{{customdata.port}}", context)
+        assert rendered == "https://example.com:443"
+
+    def test_dotted_path_reads_lazy_directory_context(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            Path(tmpdir, "API_TOKEN").write_text("token-value")
+            context = {"context": LazyFileLoadingDict(tmpdir)}
+
+            assert replace_template_in_string("{{ context.API_TOKEN }}", context) == "token-value"
+
+    def test_missing_dotted_path_falls_back_to_cel(self):
+        assert replace_template_in_string("{{ missing.value }}", {}) == "False"
+
+    def test_identical_expressions_evaluated_once(self, monkeypatch):
+        calls = []
+        evaluate = netcheck_context.evaluate_cel_with_context
+
+        def counting_evaluate(context, template, parse_cache=None):
+            calls.append(template)
+            return evaluate(context, template, parse_cache)
+
+        monkeypatch.setattr(netcheck_context, "evaluate_cel_with_context", counting_evaluate)
+        context = {"token": "c2VjcmV0"}
+        config = {"rules": [{"headers": {"X-Token": "{{ b64decode(token) }}"}} for _ in range(100)]}
+
+        result = replace_template(config, context)
+
+        assert calls == ["b64decode(token)"]
+        assert all(rule["headers"]["X-Token"] == "secret" for rule in result["rules"])
@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from netcheck.checks.dns import DnsResolverRegistry, dns_lookup_check, dns_lookup_check_async
+
+
+def test_registry_reuses_resolvers():
+    resolvers = DnsResolverRegistry()
+    assert resolvers.resolver("127.0.0.1") is resolvers.resolver("127.0.0.1")
+    assert resolvers.resolver("127.0.0.1") is not resolvers.resolver("127.0.0.2")
+    assert resolvers.resolver("127.0.0.1") is not resolvers.resolver("127.0.0.1", source_ip="127.0.0.1")
+    assert resolvers.resolver("127.0.0.1") is not resolvers.resolver("127.0.0.1", search=False)
+    assert resolvers.resolver("127.0.0.1").nameservers == ["127.0.0.1"]
+    assert resolvers.async_resolver("127.0.0.1") is not resolvers.resolver("127.0.0.1")
+
+
+def test_registry_does_not_touch_default_resolver():
+    import dns.resolver
+
+    default = dns.resolver.get_default_resolver()
+    nameservers = list(default.nameservers)
+    DnsResolverRegistry().resolver("127.0.0.1")
+
+    assert dns.resolver.get_default_resolver() is default
+    assert default.nameservers == nameservers
+
+
+def test_dns_check_with_shared_resolvers(local_dns_port):
+    resolvers = DnsResolverRegistry(port=local_dns_port)
+
+    found = dns_lookup_check("example.test.", "127.0.0.1", timeout=2, resolvers=resolvers)
+    missing = dns_lookup_check("host.missing.", "127.0.0.1", timeout=2, resolvers=resolvers)
+
+    assert found["data"]["response-code"] == "NOERROR"
+    assert found["data"]["A"] == ["127.0.0.1"]
+    assert missing["data"]["response-code"] == "NXDOMAIN"
+    assert found["data"]["timings"]["resolve"] > 0
+    assert missing["data"]["timings"]["resolve"] > 0
+    assert "response" in found["data"]
+
+
+def test_dns_check_can_skip_formatting_response(local_dns_port):
+    resolvers = DnsResolverRegistry(port=local_dns_port)
+
+    result = dns_lookup_check("example.test.", "127.0.0.1", timeout=2, resolvers=resolvers, capture_response=False)
+
+    assert result["data"]["A"] == ["127.0.0.1"]
+    assert "response" not in result["data"]
+
+
+def test_dns_checks_run_concurrently_against_shared_resolver(local_dns_port):
+    resolvers = DnsResolverRegistry(port=local_dns_port)
+    hosts = [f"host-{i}.example.test." for i in range(200)]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(
+            executor.map(lambda host: dns_lookup_check(host, "127.0.0.1", timeout=2, resolvers=resolvers), hosts)
+        )
+
+    assert [r["spec"]["host"] for r in results] == hosts
+    assert all(r["data"]["response-code"] == "NOERROR" for r in results)
+
+
+def test_async_dns_check_with_shared_resolvers(local_dns_port):
+    resolvers = DnsResolverRegistry(port=local_dns_port)
+
+    async def lookup_all():
+        return await asyncio.gather(
+            *(dns_lookup_check_async(f"host-{i}.example.test.", "127.0.0.1", 2, resolvers=resolvers) for i in range(50))
+        )
+
+    results = asyncio.run(lookup_all())
+
+    assert all(r["data"]["A"] == ["127.0.0.1"] for r in results)
@@ -0,0 +1,381 @@
+import asyncio
+import hashlib
+import socket
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from netcheck.checks.http import (
+    AsyncHttpClientRegistry,
+    HttpSessionRegistry,
+    NetcheckHttpBodyCapture,
+    http_request_check,
+    http_request_check_async,
+)
+from netcheck.runner import run_from_config
+
+
+def test_http_check_reuses_connection_from_registry(local_http_server):
+    sessions = HttpSessionRegistry()
+    try:
+        first = http_request_check(f"{local_http_server}/status/200", sessions=sessions)
+        second = http_request_check(f"{local_http_server}/status/200", sessions=sessions)
+    finally:
+        sessions.close()
+
+    assert first["data"]["status-code"] == 200
+    assert first["data"]["connection-reused"] is False
+    assert second["data"]["connection-reused"] is True
+    assert "reuse-connection" not in second["spec"]
+
+
+def test_http_check_cold_connection(local_http_server):
+    sessions = HttpSessionRegistry()
+    try:
+        http_request_check(f"{local_http_server}/status/200", sessions=sessions)
+        cold = http_request_check(f"{local_http_server}/status/200", reuse_connection=False, sessions=sessions)
+    finally:
+        sessions.close()
+
+    assert cold["data"]["connection-reused"] is False
+    assert cold["spec"]["reuse-connection"] is False
+
+
+def test_http_check_without_registry_uses_fresh_connection(local_http_server):
+    for _ in range(2):
+        result = http_request_check(f"{local_http_server}/status/200")
+        assert result["data"]["connection-reused"] is False
+
+
+def test_http_check_records_phase_timings(local_http_server):
+    sessions = HttpSessionRegistry()
+    try:
+        first = http_request_check(f"{local_http_server}/status/200", sessions=sessions)
+        second = http_request_check(f"{local_http_server}/status/200", sessions=sessions)
+    finally:
+        sessions.close()
+
+    timings = first["data"]["timings"]
+    assert list(timings) == ["dns", "connect", "tls", "ttfb", "body"]
+    assert all(isinstance(duration, float) for duration in timings.values())
+    assert timings["connect"] > 0
+    assert timings["tls"] == 0
+    # A reused connection spends no time resolving or connecting
+    reused = second["data"]["timings"]
+    assert reused["dns"] == reused["connect"] == reused["tls"] == 0
+    assert reused["ttfb"] > 0
+
+
+@pytest.mark.filterwarnings("ignore::urllib3.exceptions.InsecureRequestWarning")
+@pytest.mark.parametrize("check", [http_request_check, http_request_check_async])
+def test_http_check_records_peer_and_tls_parameters(local_https_server, check):
+    sessions = HttpSessionRegistry() if check is http_request_check else AsyncHttpClientRegistry()
+    kwargs = {"sessions": sessions} if check is http_request_check else {"clients": sessions}
+    port = int(local_https_server.rsplit(":", 1)[1])
+
+    async def run():
+        results = []
+        for _ in range(2):
+            result = check(f"{local_https_server}/status/200", verify=False, **kwargs)
+            results.append(await result if asyncio.iscoroutine(result) else result)
+        if check is http_request_check:
+            sessions.close()
+        else:
+            await sessions.aclose()
+        return results
+
+    first, reused = asyncio.run(run())
+
+    for result in (first, reused):
+        data = result["data"]
+        assert (data["peer-address"], data["peer-port"]) == ("127.0.0.1", port)
+        assert data["tls-version"].startswith("TLSv1.")
+        assert data["tls-cipher"]
+    assert first["data"]["timings"]["tls"] > 0
+    assert reused["data"]["connection-reused"] is True
+    assert reused["data"]["timings"]["tls"] == 0
+
+
+def test_plain_http_check_has_no_tls_parameters(local_http_server):
+    data = http_request_check(f"{local_http_server}/status/200")["data"]
+    assert data["peer-address"] == "127.0.0.1"
+    assert "tls-version" not in data
+
+
+def _resolve_once(monkeypatch, *addresses):
+    """Resolve netcheck.test to `addresses` only once, returning the names that were resolved."""
+    getaddrinfo = socket.getaddrinfo
+    resolved = []
+
+    def resolve_once(host, *args, **kwargs):
+        if host != "netcheck.test":
+            # Numeric hosts don't need a name lookup
+            return getaddrinfo(host, *args, **kwargs)
+        # Resolving again, e.g. a link-local address without its scope id, would fail
+        if resolved:
+            raise socket.gaierror(socket.EAI_NONAME, "resolved more than once")
+        resolved.append(host)
+        return [(family, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", sockaddr) for family, sockaddr in addresses]
+
+    monkeypatch.setattr(socket, "getaddrinfo", resolve_once)
+    return resolved
+
+
+def test_http_check_connects_to_the_resolved_sockaddr(local_http_server, monkeypatch):
+    port = int(local_http_server.rsplit(":", 1)[1])
+    resolved = _resolve_once(monkeypatch, (socket.AF_INET, ("127.0.0.1", port)))
+
+    data = http_request_check(f"http://netcheck.test:{port}/status/200")["data"]
+
+    assert data["status-code"] == 200, data
+    assert resolved == ["netcheck.test"]
+    assert (data["peer-address"], data["peer-port"]) == ("127.0.0.1", port)
+
+
+def test_http_check_falls_back_to_the_next_resolved_address(local_http_server, monkeypatch):
+    # The server only listens on 127.0.0.1, so connecting over IPv6 fails
+    port = int(local_http_server.rsplit(":", 1)[1])
+    _resolve_once(monkeypatch, (socket.AF_INET6, ("::1", port, 0, 0)), (socket.AF_INET, ("127.0.0.1", port)))
+
+    data = http_request_check(f"http://netcheck.test:{port}/status/200")["data"]
+
+    assert data["status-code"] == 200, data
+    assert (data["peer-address"], data["peer-port"]) == ("127.0.0.1", port)
+    assert data["timings"]["connect"] > 0
+
+
+def test_http_check_through_proxy_reports_the_proxy_connection(local_http_server, monkeypatch):
+    monkeypatch.setenv("HTTP_PROXY", local_http_server)
+    monkeypatch.delenv("NO_PROXY", raising=False)
+    monkeypatch.delenv("no_proxy", raising=False)
+
+    data = http_request_check("http://netcheck.test/status/200")["data"]
+
+    assert data["status-code"] == 200, data
+    assert set(data["timings"]) == {"dns", "connect", "tls", "ttfb", "body"}
+    assert (data["peer-address"], data["peer-port"]) == ("127.0.0.1", int(local_http_server.rsplit(":", 1)[1]))
+
+
+def test_http_check_closes_response_when_reading_body_fails(local_http_server, monkeypatch):
+    closed = []
+    close = requests.Response.close
+
+    def broken_iter_content(self, *args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("Connection broken")
+        yield
+
+    def spied_close(self):
+        closed.append(self)
+        close(self)
+
+    monkeypatch.setattr(requests.Response, "iter_content", broken_iter_content)
+    monkeypatch.setattr(requests.Response, "close", spied_close)
+    sessions = HttpSessionRegistry()
+    try:
+        data = http_request_check(f"{local_http_server}/status/200", sessions=sessions)["data"]
+    finally:
+        sessions.close()
+
+    assert data["exception-type"] == "ChunkedEncodingError"
+    assert len(closed) == 1
+    assert "body" in data["timings"]
+
+
+def test_session_registry_keys_by_settings():
+    sessions = HttpSessionRegistry(pool_maxsize=4)
+    assert sessions.adapter() is sessions.adapter(None, True)
+    assert sessions.adapter(verify=False) is not sessions.adapter()
+    assert sessions.adapter("127.0.0.1") is not sessions.adapter()
+    sessions.close()
+
+
+def test_async_http_check_reuses_connection_from_registry(local_http_server):
+    async def check_twice():
+        clients = AsyncHttpClientRegistry()
+        try:
+            first = await http_request_check_async(f"{local_http_server}/status/200", clients=clients)
+            second = await http_request_check_async(f"{local_http_server}/status/200", clients=clients)
+            cold = await http_request_check_async(
+                f"{local_http_server}/status/200", reuse_connection=False, clients=clients
+            )
+        finally:
+            await clients.aclose()
+        return first, second, cold
+
+    first, second, cold = asyncio.run(check_twice())
+
+    assert first["data"]["connection-reused"] is False
+    assert second["data"]["connection-reused"] is True
+    assert cold["data"]["connection-reused"] is False
+    # httpcore resolves the host while connecting, so there is no dns phase
+    assert list(first["data"]["timings"]) == ["connect", "tls", "ttfb", "body"]
+    assert first["data"]["timings"]["connect"] > 0
+    assert second["data"]["timings"]["connect"] == 0
+
+
+def test_run_shares_connections_between_rules(local_http_server):
+    # The rules send the same request, so they are kept from sharing one probe
+    url = f"{local_http_server}/status/200"
+    config = {
+        "assertions": [
+            {"name": "first", "rules": [{"type": "http", "url": url}]},
+            {
+                "name": "second",
+                "rules": [
+                    {"type": "http", "url": url},
+                    {"type": "http", "url": url, "reuse-connection": False},
+                ],
+            },
+        ]
+    }
+
+    for engine in ("threads", "asyncio"):
+        results = run_from_config(config, Mock(), engine=engine, deduplicate=False)
+        reused = [r["data"]["connection-reused"] for a in results["assertions"] for r in a["results"]]
+        assert reused == [False, True, False]
+
+
+def test_validation_rules_can_use_timings(local_http_server):
+    rule = {
+        "type": "http",
+        "url": f"{local_http_server}/status/200",
+        "validation": (
+            "data.timings.connect + data.timings.ttfb < duration('5s') && data.timings.body >= duration('0s')"
+        ),
+    }
+    config = {"assertions": [{"name": "timed", "rules": [rule]}]}
+
+    for engine in ("threads", "asyncio"):
+        results = run_from_config(config, Mock(), engine=engine)
+        assert results["assertions"][0]["results"][0]["status"] == "pass"
+
+
+def _check_sync(url, **kwargs):
+    return http_request_check(url, **kwargs)
+
+
+def _check_async(url, **kwargs):
+    return asyncio.run(http_request_check_async(url, **kwargs))
+
+
+@pytest.mark.parametrize("check", [_check_sync, _check_async])
+def test_http_check_without_response_reports_timings_reached(check):
+    result = check("http://127.0.0.1:1/")
+
+    assert result["data"]["exception-type"] in ("ConnectionError", "ConnectError")
+    assert "connect" in result["data"]["timings"]
+    assert "ttfb" not in result["data"]["timings"]
+
+
+@pytest.mark.parametrize("check", [_check_sync, _check_async])
+def test_http_check_truncates_large_bodies(local_http_server, check):
+    result = check(f"{local_http_server}/bytes/200000", max_body_bytes=1000)
+
+    assert result["spec"]["max-body-bytes"] == 1000
+    assert result["data"]["status-code"] == 200
+    assert result["data"]["body"] == "0123456789" * 100
+    assert result["data"]["body-bytes"] == 1000
+    assert result["data"]["body-truncated"] is True
+
+
+@pytest.mark.parametrize("check", [_check_sync, _check_async])
+def test_http_check_hashes_body(local_http_server, check):
+    result = check(f"{local_http_server}/bytes/200000", max_body_bytes=200000, body_capture="hash")
+
+    assert "body" not in result["data"]
+    assert result["data"]["body-sha256"] == hashlib.sha256(b"0123456789" * 20000).hexdigest()
+    assert result["data"]["body-bytes"] == 200000
+    assert result["data"]["body-truncated"] is False
+    assert result["spec"]["body-capture"] == "hash"
+
+
+@pytest.mark.parametrize("check", [_check_sync, _check_async])
+def test_http_check_hashes_at_most_max_body_bytes(local_http_server, check):
+    result = check(f"{local_http_server}/bytes/200000", max_body_bytes=1005, body_capture="hash")
+
+    assert result["data"]["body-sha256"] == hashlib.sha256((b"0123456789" * 101)[:1005]).hexdigest()
+    assert result["data"]["body-bytes"] == 1005
+    assert result["data"]["body-truncated"] is True
+
+
+@pytest.mark.parametrize("check", [_check_sync, _check_async])
+def test_http_check_without_body_capture(local_http_server, check):
+    result = check(f"{local_http_server}/bytes/500", body_capture=NetcheckHttpBodyCapture.none)
+
+    assert "body" not in result["data"]
+    assert result["data"]["body-bytes"] == 500
+    assert result["data"]["body-truncated"] is False
+
+
+def test_run_only_captures_body_when_validation_reads_it(local_http_server):
+    url = f"{local_http_server}/status/200"
+    config = {
+        "assertions": [
+            {
+                "name": "body",
+                "rules": [
+                    {"type": "http", "url": url},
+                    {"type": "http", "url": url, "validation": "parse_json(data.body)['User-Agent'] == 'netcheck'"},
+                    {"type": "http", "url": url, "body-capture": "full"},
+                ],
+            }
+        ]
+    }
+
+    for engine in ("threads", "asyncio"):
+        results = run_from_config(config, Mock(), engine=engine, deduplicate=False)
+        skipped, read, forced = results["assertions"][0]["results"]
+        assert "body" not in skipped["data"]
+        assert skipped["spec"]["body-capture"] == "none"
+        assert read["status"] == "pass"
+        assert forced["data"]["body"].startswith("{")
+        # Unread bodies are still drained, so the connection stays reusable
+        assert read["data"]["connection-reused"] is True
+
+
+def test_run_skips_headers_the_validation_does_not_read(local_http_server):
+    url = f"{local_http_server}/status/200"
+    config = {
+        "assertions": [
+            {
+                "name": "headers",
+                "rules": [
+                    {"type": "http", "url": url},
+                    {"type": "http", "url": url, "validation": "data.headers['Content-Type'] == 'application/json'"},
+                ],
+            }
+        ]
+    }
+
+    skipped, read = run_from_config(config, Mock(), deduplicate=False)["assertions"][0]["results"]
+    assert "headers" not in skipped["data"]
+    assert read["status"] == "pass"
+    assert read["data"]["headers"] == "REDACTED"
+
+    skipped, _ = run_from_config(config, Mock(), capture_all=True, deduplicate=False)["assertions"][0]["results"]
+    assert skipped["data"]["headers"] == "REDACTED"
+    assert skipped["data"]["body"].startswith("{")
+
+
+def test_validation_rules_can_read_data_json(local_http_server):
+    url = f"{local_http_server}/status/200"
+    config = {
+        "assertions": [
+            {
+                "name": "json",
+                "rules": [
+                    {"type": "http", "url": url, "validation": "data.json['User-Agent'] == 'netcheck'"},
+                    {"type": "http", "url": url, "validation": "data.json['User-Agent'] == 'curl'", "expected": "fail"},
+                ],
+            }
+        ]
+    }
+
+    for engine in ("threads", "asyncio"):
+        results = run_from_config(config, Mock(), engine=engine)
+        for result in results["assertions"][0]["results"]:
+            assert result["status"] == "pass"
+            # Reading data.json needs the body, so it is still captured
+            assert "body-capture" not in result["spec"]
+            assert "json" not in result["data"]
@@ -0,0 +1,56 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Seconds allowed for `import netcheck.cli` in a fresh interpreter. Without lazy
+# check modules this was ~0.65s locally, with them ~0.25s.
+CLI_IMPORT_BUDGET = 0.5
+
+HEAVY_MODULES = ["psycopg", "requests", "urllib3", "dns", "pydantic", "yaml", "httpx"]
+
+
+def _run_python(code: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def _loaded_heavy_modules_after(statements: str) -> list:
+    return _run_python(
+        f"""
+import json, sys
+{statements}
+print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}} & set({HEAVY_MODULES!r}))))
+"""
+    )
+
+
+def test_cli_import_does_not_load_check_dependencies():
+    assert _loaded_heavy_modules_after("import netcheck.cli") == []
+
+
+@pytest.mark.parametrize(
+    "test_type, expected",
+    [
+        ("tcp", []),
+        ("internal", []),
+        ("dns", ["dns"]),
+        ("postgres", ["psycopg"]),
+    ],
+)
+def test_check_type_imports_only_its_own_dependencies(test_type, expected):
+    statements = f"from netcheck.runner import default_validation_rule; default_validation_rule({test_type!r})"
+    assert _loaded_heavy_modules_after(statements) == expected
+
+
+def test_cli_import_time_budget():
+    timings = _run_python(
+        """
+import json, time
+start = time.perf_counter()
+import netcheck.cli
+print(json.dumps(time.perf_counter() - start))
+"""
+    )
+    assert timings < CLI_IMPORT_BUDGET
@@ -0,0 +1,110 @@
+import urllib.request
+from unittest.mock import Mock
+
+import pytest
+
+from netcheck.metrics import MetricsRegistry, is_timeout, start_metrics_server
+from netcheck.runner import run_from_config
+
+
+def _samples(text):
+    """Parse exposition text into a {series: value} dict, ignoring comments."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+    return samples
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"response-code": "TIMEOUT"},
+        {"exception-type": "ReadTimeout"},
+        {"connected": False, "error": "Connection timed out after 5s"},
+        {"sqlstate": "57014"},
+        {"exception": "connection timeout expired"},
+    ],
+)
+def test_is_timeout(data):
+    assert is_timeout({"data": data})
+
+
+def test_is_timeout_ignores_other_failures():
+    assert not is_timeout({"data": {"connected": False, "error": "Connection refused"}})
+
+
+def test_render_exposition_format():
+    metrics = MetricsRegistry()
+    metrics.observe("web", "0", "http", {"status": "pass", "data": {"connection-reused": False}}, 0.03)
+    metrics.observe("web", "0", "http", {"status": "fail", "data": {"connection-reused": True}}, 0.2)
+    metrics.observe("db", "1", "tcp", {"status": "fail", "data": {"error": "Connection timed out after 1s"}}, 12.0)
+
+    samples = _samples(metrics.render())
+
+    assert samples['netcheck_probe_duration_seconds_bucket{type="http",le="0.025"}'] == 0
+    assert samples['netcheck_probe_duration_seconds_bucket{type="http",le="0.05"}'] == 1
+    assert samples['netcheck_probe_duration_seconds_bucket{type="http",le="0.25"}'] == 2
+    assert samples['netcheck_probe_duration_seconds_bucket{type="http",le="+Inf"}'] == 2
+    assert samples['netcheck_probe_duration_seconds_sum{type="http"}'] == pytest.approx(0.23)
+    assert samples['netcheck_probe_duration_seconds_count{type="http"}'] == 2
+    assert samples['netcheck_probe_duration_seconds_bucket{type="tcp",le="10"}'] == 0
+    assert samples['netcheck_probe_duration_seconds_bucket{type="tcp",le="30"}'] == 1
+    assert samples['netcheck_probe_timeouts_total{type="http"}'] == 0
+    assert samples['netcheck_probe_timeouts_total{type="tcp"}'] == 1
+    assert samples['netcheck_connections_total{type="http",reused="false"}'] == 1
+    assert samples['netcheck_connections_total{type="http",reused="true"}'] == 1
+    # The gauge holds the latest result of each rule
+    assert samples['netcheck_rule_passed{assertion="web",rule="0",type="http"}'] == 0
+    assert samples['netcheck_rule_passed{assertion="db",rule="1",type="tcp"}'] == 0
+    assert "netcheck_cel_cache_hits_total" in samples
+
+
+def test_render_escapes_label_values():
+    metrics = MetricsRegistry()
+    metrics.observe('say "hi"\\\n', "0", "internal", {"status": "pass", "data": {}}, 0.001)
+
+    assert 'netcheck_rule_passed{assertion="say \\"hi\\"\\\\\\n",rule="0",type="internal"} 1' in metrics.render()
+
+
+def test_run_from_config_records_metrics(tmp_path, local_tcp_port):
+    config = {
+        "assertions": [
+            {
+                "name": "tcp",
+                "rules": [
+                    {"type": "tcp", "host": "127.0.0.1", "port": local_tcp_port},
+                    {"type": "tcp", "host": "127.0.0.1", "port": 1, "expected": "fail"},
+                ],
+            }
+        ]
+    }
+    metrics = MetricsRegistry()
+
+    run_from_config(config, Mock(), concurrency=2, metrics=metrics)
+    metrics.write_textfile(str(tmp_path / "netcheck.prom"))
+
+    samples = _samples((tmp_path / "netcheck.prom").read_text())
+    assert samples['netcheck_probe_duration_seconds_count{type="tcp"}'] == 2
+    assert samples['netcheck_rule_passed{assertion="tcp",rule="0",type="tcp"}'] == 1
+    assert samples['netcheck_rule_passed{assertion="tcp",rule="1",type="tcp"}'] == 1
+    assert list(tmp_path.iterdir()) == [tmp_path / "netcheck.prom"]
+
+
+def test_metrics_server():
+    metrics = MetricsRegistry()
+    metrics.observe("a", "0", "internal", {"status": "pass", "data": {}}, 0.001)
+    server = start_metrics_server(metrics, 0, "127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            body = response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert 'netcheck_rule_passed{assertion="a",rule="0",type="internal"} 1' in body
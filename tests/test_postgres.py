@@ -3,7 +3,6 @@ from unittest.mock import Mock
 
 import pytest
 
-import netcheck.runner as netcheck_runner
 from netcheck.checks import postgres as postgres_checks
 from netcheck.checks.postgres import postgres_grants_check, postgres_query_check
 from netcheck.runner import check_individual_assertion
@@ -51,15 +50,131 @@ def test_postgres_query_check_default_output_with_mocked_connection(monkeypatch)
     assert connection.read_only is True
     connection.rollback.assert_called_once()
     connect.assert_called_once_with("postgres://example", connect_timeout=5, row_factory=postgres_checks.dict_row)
+    connection.close.assert_called_once()
+    assert result["data"]["connection-reused"] is False
+    assert set(result["data"]["timings"]) == {"connect", "query", "fetch"}
+    assert all(isinstance(seconds, float) for seconds in result["data"]["timings"].values())
+
+
+def test_postgres_query_check_failing_query_reports_timings_reached(monkeypatch):
+    cursor = _fake_cursor({})
+    cursor.execute.side_effect = [None, postgres_checks.psycopg.errors.UndefinedTable("no such table")]
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", Mock(return_value=_fake_connection(cursor)))
+
+    result = postgres_query_check("postgres://example", "select * from missing")
+
+    assert result["data"]["success"] is False
+    assert set(result["data"]["timings"]) == {"connect", "query"}
+
+
+def test_postgres_query_check_failing_connection_reports_connect_timing(monkeypatch):
+    connect = Mock(side_effect=postgres_checks.psycopg.OperationalError("connection refused"))
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", connect)
+
+    result = postgres_query_check("postgres://example", "select 1")
+    grants = postgres_grants_check("postgres://example", [])
+
+    assert result["data"]["success"] is False
+    assert set(result["data"]["timings"]) == {"connect"}
+    assert grants["data"]["success"] is False
+    assert set(grants["data"]["timings"]) == {"connect"}
+
+
+def test_postgres_rule_only_fetches_rows_the_validation_reads(monkeypatch):
+    cursor = _fake_cursor({})
+    cursor.description = [Mock()]
+    cursor.description[0].name = "answer"
+    cursor.fetchmany.return_value = [{"answer": 42}]
+    cursor.rowcount = 1
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", Mock(return_value=_fake_connection(cursor)))
+    rule = {"type": "postgres", "dsn": "postgres://example", "query": "select 42 as answer"}
+
+    counted = check_individual_assertion("postgres", rule, Mock(), "data['row-count'] == 1")
+    cursor.fetchmany.assert_not_called()
+    read = check_individual_assertion("postgres", rule, Mock(), "data.rows[0].answer == 42")
+
+    assert counted["status"] == "pass"
+    assert counted["data"]["rows"] == []
+    assert read["status"] == "pass"
+    assert read["data"]["rows"] == [{"answer": 42}]
+
+
+def test_postgres_checks_share_pooled_connection(monkeypatch):
+    cursor = _fake_cursor({"select 1": [{"answer": 1}]})
+    cursor.description = None
+    cursor.rowcount = 0
+    connection = _fake_connection(cursor)
+    connection.closed = False
+    connection.info.transaction_status = postgres_checks.TransactionStatus.IDLE
+    connect = Mock(return_value=connection)
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", connect)
+    connections = postgres_checks.PostgresConnectionPool()
+
+    first = postgres_query_check("postgres://example", "select 1", connections=connections)
+    second = postgres_query_check("postgres://example", "select 1", read_only=False, connections=connections)
+    committed = postgres_query_check("postgres://example", "select 1", rollback=False, connections=connections)
+    after_commit = postgres_query_check("postgres://example", "select 1", connections=connections)
+
+    assert [r["data"]["connection-reused"] for r in (first, second, committed, after_commit)] == [
+        False,
+        True,
+        True,
+        False,
+    ]
+    assert connect.call_count == 2
+    # The connection is handed out again in the state the rule asks for
+    assert connection.read_only is True
+    connection.close.assert_called_once()
+    connections.close()
+    assert connection.close.call_count == 2
+
+
+def test_postgres_connection_released_after_close_is_closed():
+    connections = postgres_checks.PostgresConnectionPool()
+    connection = Mock(closed=False)
+    connection.info.transaction_status = postgres_checks.TransactionStatus.IDLE
+    connections.close()
+
+    # e.g. by a probe abandoned at the deadline, after the run closed its resources
+    connections.release("postgres://example", connection)
+
+    connection.close.assert_called_once()
+
+
+def test_postgres_pool_replaces_connection_closed_by_server(monkeypatch):
+    cursor = _fake_cursor({"select 1": [{"answer": 1}]})
+    cursor.description = None
+    cursor.rowcount = 0
+    stale = _fake_connection(cursor)
+    stale.closed = False
+    stale.info.transaction_status = postgres_checks.TransactionStatus.IDLE
+    fresh = _fake_connection(cursor)
+    fresh.closed = False
+    fresh.info.transaction_status = postgres_checks.TransactionStatus.IDLE
+    connect = Mock(side_effect=[stale, fresh])
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", connect)
+    connections = postgres_checks.PostgresConnectionPool()
+
+    first = postgres_query_check("postgres://example", "select 1", connections=connections)
+    # The server terminated the idle session, which psycopg only notices on next use
+    stale.execute.side_effect = postgres_checks.psycopg.OperationalError("server closed the connection unexpectedly")
+    second = postgres_query_check("postgres://example", "select 1", connections=connections)
+
+    assert first["data"]["success"] is True
+    assert second["data"]["success"] is True, second
+    assert second["data"]["connection-reused"] is False
+    assert connect.call_count == 2
+    stale.close.assert_called_once()
 
 
 def test_postgres_grants_deny_rule_reports_effective_privilege_violation(monkeypatch):
     responses = {
-        "select r.rolname": [{"rolname": "payments_app"}],
+        "select r.rolname": [_role("payments_app")],
+        "select member.rolname": [],
         "select n.nspname as schema_name, c.relname": [
-            {"schema_name": "billing", "relname": "invoices", "identity": "billing.invoices"}
+            {"schema_name": "billing", "relname": "invoices", "relkind": "r", "identity": "billing.invoices"}
         ],
-        "select has_table_privilege": [{"allowed": True}],
+        "select r.role_index": [{"role_index": 1, "object_index": 1, "privilege_index": 1}],
     }
     cursor = _fake_cursor(responses)
     connection = _fake_connection(cursor)
@@ -95,11 +210,12 @@ def test_postgres_grants_deny_rule_reports_effective_privilege_violation(monkeyp
 
 def test_postgres_grants_deny_rule_without_effective_privilege_has_no_violations(monkeypatch):
     responses = {
-        "select r.rolname": [{"rolname": "payments_app"}],
+        "select r.rolname": [_role("payments_app")],
+        "select member.rolname": [],
         "select n.nspname as schema_name, c.relname": [
-            {"schema_name": "billing", "relname": "invoices", "identity": "billing.invoices"}
+            {"schema_name": "billing", "relname": "invoices", "relkind": "r", "identity": "billing.invoices"}
         ],
-        "select has_table_privilege": [{"allowed": False}],
+        "select r.role_index": [],
     }
     cursor = _fake_cursor(responses)
     connection = _fake_connection(cursor)
@@ -125,9 +241,10 @@ def test_postgres_grants_deny_rule_without_effective_privilege_has_no_violations
 
 def test_postgres_grants_require_rule_reports_missing_privilege(monkeypatch):
     responses = {
-        "select r.rolname": [{"rolname": "billing_reader"}],
+        "select r.rolname": [_role("billing_reader")],
+        "select member.rolname": [],
         "select nspname from pg_namespace": [{"nspname": "billing"}],
-        "select has_schema_privilege": [{"allowed": False}],
+        "select r.role_index": [{"role_index": 1, "object_index": 1, "privilege_index": 1}],
     }
     cursor = _fake_cursor(responses)
     connection = _fake_connection(cursor)
@@ -151,6 +268,142 @@ def test_postgres_grants_require_rule_reports_missing_privilege(monkeypatch):
     assert result["data"]["violations"][0]["expected"] == "present"
 
 
+def test_postgres_grants_rule_checks_all_combinations_in_one_query(monkeypatch):
+    responses = {
+        "select r.rolname": [_role("alice"), _role("bob")],
+        "select member.rolname": [],
+        "select n.nspname as schema_name, c.relname": [
+            {"schema_name": "billing", "relname": "invoices", "relkind": "r", "identity": "billing.invoices"},
+            {"schema_name": "billing", "relname": "payments", "relkind": "r", "identity": "billing.payments"},
+        ],
+        "select r.role_index": [
+            {"role_index": 1, "object_index": 2, "privilege_index": 1},
+            {"role_index": 2, "object_index": 1, "privilege_index": 2},
+        ],
+    }
+    cursor = _fake_cursor(responses)
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", Mock(return_value=_fake_connection(cursor)))
+
+    result = postgres_grants_check(
+        "postgres://example",
+        [
+            {
+                "name": "no-writes",
+                "mode": "deny",
+                "roles": {"names": ["alice", "bob"]},
+                "objects": {"type": "table", "schemas": ["billing"]},
+                "privileges": ["insert", "delete"],
+            }
+        ],
+    )
+
+    privilege_queries = [call for call in cursor.execute.call_args_list if "with ordinality" in call.args[0]]
+    assert len(privilege_queries) == 1
+    assert "has_table_privilege(r.role_name, o.identity, p.privilege)" in privilege_queries[0].args[0]
+    assert privilege_queries[0].args[1] == (
+        ["alice", "bob"],
+        ["billing.invoices", "billing.payments"],
+        ["INSERT", "DELETE"],
+    )
+    assert [(v["role"], v["object"], v["privilege"]) for v in result["data"]["violations"]] == [
+        ("alice", "payments", "INSERT"),
+        ("bob", "invoices", "DELETE"),
+    ]
+
+
+def test_postgres_grants_rules_share_one_catalog_snapshot(monkeypatch):
+    responses = {
+        "select r.rolname": [_role("alice"), _role("bob")],
+        "select member.rolname": [],
+        "select n.nspname as schema_name, c.relname": [
+            {"schema_name": "billing", "relname": "invoices", "relkind": "r", "identity": "billing.invoices"},
+            {"schema_name": "billing", "relname": "invoice_ids", "relkind": "S", "identity": "billing.invoice_ids"},
+            {"schema_name": "public", "relname": "notes", "relkind": "v", "identity": "notes"},
+        ],
+        "select r.role_index": [],
+    }
+    cursor = _fake_cursor(responses)
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", Mock(return_value=_fake_connection(cursor)))
+    rules = [
+        {
+            "name": f"rule-{object_type}-{schema}",
+            "roles": {"names": ["alice"]},
+            "objects": {"type": object_type, "schemas": [schema]},
+            "privileges": ["SELECT"],
+        }
+        for object_type in ("table", "sequence")
+        for schema in ("billing", "public")
+    ]
+    catalogs = postgres_checks.PostgresCatalogRegistry()
+
+    for _ in range(2):
+        result = postgres_grants_check("postgres://example", rules, catalogs=catalogs)
+        assert result["data"]["success"] is True, result
+
+    executed = [" ".join(call.args[0].split()) for call in cursor.execute.call_args_list]
+    assert sum(sql.startswith("select r.rolname") for sql in executed) == 1
+    assert sum(sql.startswith("select n.nspname as schema_name, c.relname") for sql in executed) == 1
+    privilege_params = [call.args[1] for call in cursor.execute.call_args_list if "with ordinality" in call.args[0]]
+    # The sequence rule for `public` selects no objects, so needs no privilege query
+    assert [identities for _, identities, _ in privilege_params] == [
+        ["billing.invoices"],
+        ["notes"],
+        ["billing.invoice_ids"],
+    ] * 2
+
+
+def test_postgres_grants_role_selector_resolved_from_snapshot():
+    cursor = _fake_cursor(
+        {
+            "select r.rolname": [
+                _role("admin", superuser=True),
+                _role("app"),
+                _role("app_owner", login=False),
+                _role("pg_monitor", login=False),
+                _role("readers", login=False),
+                _role("reporting"),
+                _role("support"),
+            ],
+            "select member.rolname": [
+                {"member": "reporting", "parent": "readers"},
+                {"member": "support", "parent": "reporting"},
+                {"member": "app", "parent": "app_owner"},
+            ],
+        }
+    )
+    roles = postgres_checks.PostgresCatalogSnapshot().roles(cursor)
+
+    def selected(**selector):
+        return postgres_checks._selected_roles(roles, selector)
+
+    assert selected() == ["admin", "app", "app_owner", "readers", "reporting", "support"]
+    assert "pg_monitor" in selected(**{"include-system-roles": True})
+    assert selected(login=False) == ["app_owner", "readers"]
+    assert selected(names=["app", "support"], exclude=["app"]) == ["support"]
+    assert selected(**{"member-of": ["readers"]}) == ["admin", "readers", "reporting", "support"]
+    assert selected(**{"member-of": ["readers"], "exclude-member-of": ["reporting"]}) == ["readers"]
+    with pytest.raises(postgres_checks.psycopg.errors.UndefinedObject, match='role "missing" does not exist'):
+        selected(**{"member-of": ["missing"]})
+
+
+def test_postgres_grants_unknown_member_of_role_reports_sqlstate(monkeypatch):
+    cursor = _fake_cursor({"select r.rolname": [_role("app")], "select member.rolname": []})
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", Mock(return_value=_fake_connection(cursor)))
+    rule = {
+        "name": "readers-cannot-write",
+        "mode": "deny",
+        "roles": {"member-of": ["readers"]},
+        "objects": {"type": "table", "schemas": ["public"], "names": ["*"]},
+        "privileges": ["INSERT"],
+    }
+
+    result = postgres_grants_check("postgres://example", [rule])
+
+    assert result["data"]["success"] is False
+    assert result["data"]["exception-type"] == "UndefinedObject"
+    assert result["data"]["sqlstate"] == "42704"
+
+
 def test_postgres_grants_invalid_rule_returns_failed_check(monkeypatch):
     cursor = _fake_cursor({})
     connection = _fake_connection(cursor)
@@ -176,7 +429,7 @@ def test_postgres_grants_invalid_rule_returns_failed_check(monkeypatch):
 
 def test_runner_redacts_postgres_dsn_and_params(monkeypatch):
     monkeypatch.setattr(
-        netcheck_runner,
+        postgres_checks,
         "postgres_query_check",
         lambda **kwargs: {
             "spec": {"type": "postgres", "dsn": kwargs["dsn"], "params": kwargs["params"]},
@@ -289,6 +542,10 @@ def test_postgres_grants_check_with_real_postgres():
                 cursor.execute("drop role if exists netcheck_grants_probe_role")
 
 
+def _role(name, login=True, superuser=False):
+    return {"rolname": name, "rolcanlogin": login, "rolsuper": superuser}
+
+
 def _fake_cursor(responses):
     cursor = Mock()
     cursor.__enter__ = Mock(return_value=cursor)
@@ -0,0 +1,537 @@
+import asyncio
+import json
+from collections import Counter
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+import netcheck.checks.http as http_checks
+import netcheck.checks.postgres as postgres_checks
+import netcheck.checks.tcp as tcp_checks
+from netcheck.runner import RULE_TIMEOUT_GRACE, NetcheckEngine, probe_fingerprint, rule_time_limit, run_from_config
+
+
+def _slow_tcp_check(delays):
+    """Return a fake tcp_check that sleeps for the configured delay of each port."""
+
+    def fake_tcp_check(host, port, timeout=5, source_ip=None):
+        time.sleep(delays[port])
+        return {
+            "spec": {"type": "tcp", "host": host, "port": port, "timeout": timeout},
+            "data": {"connected": True, "error": None},
+        }
+
+    return fake_tcp_check
+
+
+def _slow_tcp_check_async(delays):
+    fake_tcp_check = _slow_tcp_check({port: 0 for port in delays})
+
+    async def fake_tcp_check_async(host, port, timeout=5, source_ip=None):
+        await asyncio.sleep(delays[port])
+        return fake_tcp_check(host, port, timeout, source_ip)
+
+    return fake_tcp_check_async
+
+
+def _tcp_config(ports, rules_per_assertion=2):
+    rules = [{"type": "tcp", "host": "localhost", "port": port} for port in ports]
+    return {
+        "assertions": [
+            {"name": f"assertion-{i}", "rules": rules[i : i + rules_per_assertion]}
+            for i in range(0, len(rules), rules_per_assertion)
+        ]
+    }
+
+
+@pytest.mark.parametrize("concurrency", [1, 2, 8])
+def test_run_from_config_preserves_rule_order(monkeypatch, concurrency):
+    # Earlier rules take longer, so they finish last when run in parallel
+    delays = {port: (8 - i) * 0.01 for i, port in enumerate(range(1000, 1008))}
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check(delays))
+
+    results = run_from_config(_tcp_config(list(delays)), Mock(), concurrency=concurrency)
+
+    assert [a["name"] for a in results["assertions"]] == [f"assertion-{i}" for i in range(0, 8, 2)]
+    ports = [r["spec"]["port"] for a in results["assertions"] for r in a["results"]]
+    assert ports == list(delays)
+    assert all(r["status"] == "pass" for a in results["assertions"] for r in a["results"])
+
+
+def test_run_from_config_runs_rules_concurrently(monkeypatch):
+    delays = {port: 0.2 for port in range(1000, 1008)}
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check(delays))
+
+    start = time.perf_counter()
+    run_from_config(_tcp_config(list(delays)), Mock(), concurrency=8)
+    elapsed = time.perf_counter() - start
+
+    # Sequential execution would take 1.6s
+    assert elapsed < 0.8
+
+
+def test_run_from_config_bounds_concurrency(monkeypatch):
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def fake_tcp_check(host, port, timeout=5, source_ip=None):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        return {"spec": {"type": "tcp"}, "data": {"connected": True}}
+
+    monkeypatch.setattr(tcp_checks, "tcp_check", fake_tcp_check)
+
+    run_from_config(_tcp_config(range(1000, 1012)), Mock(), concurrency=3)
+
+    assert max_in_flight == 3
+
+
+def test_run_from_config_rejects_invalid_concurrency():
+    with pytest.raises(ValueError):
+        run_from_config({"assertions": []}, Mock(), concurrency=0)
+
+
+def test_run_from_config_concurrent_unknown_check_raises():
+    config = {"assertions": [{"name": "bad", "rules": [{"type": "internal"}, {"type": "unknown"}]}]}
+    with pytest.raises(NotImplementedError):
+        run_from_config(config, Mock(), concurrency=4)
+
+
+def test_invalid_validation_rule_fails_before_probes_run(monkeypatch):
+    probe = Mock()
+    monkeypatch.setattr(tcp_checks, "tcp_check", probe)
+    config = _tcp_config([1000, 1001])
+    config["assertions"][0]["rules"][1]["validation"] = "data.connected =="
+
+    with pytest.raises(ValueError, match="Invalid CEL expression"):
+        run_from_config(config, Mock())
+
+    probe.assert_not_called()
+
+
+def _local_config(base_url, tcp_port):
+    return {
+        "assertions": [
+            {
+                "name": "http",
+                "rules": [
+                    {"type": "http", "url": f"{base_url}/status/200"},
+                    {"type": "http", "url": f"{base_url}/status/404"},
+                    {"type": "http", "url": f"{base_url}/", "headers": {"X-Test": "value"},
+                     "validation": "data.body.contains('X-Test')"},
+                ],
+            },
+            {
+                "name": "tcp",
+                "rules": [
+                    {"type": "tcp", "host": "127.0.0.1", "port": tcp_port},
+                    {"type": "tcp", "host": "127.0.0.1", "port": 1, "expected": "fail"},
+                ],
+            },
+            {"name": "internal", "rules": [{"type": "internal"}]},
+        ]
+    }
+
+
+def _strip_volatile(results):
+    for assertion in results["assertions"]:
+        for result in assertion["results"]:
+            for key in ("startTimestamp", "endTimestamp", "headers", "connection-reused", "timings"):
+                result["data"].pop(key, None)
+    results.pop("metadata")
+    return results
+
+
+def test_asyncio_engine_matches_threads_engine(local_http_server, local_tcp_port):
+    config = _local_config(local_http_server, local_tcp_port)
+
+    threaded = run_from_config(config, Mock(), concurrency=4, engine=NetcheckEngine.threads)
+    asynchronous = run_from_config(config, Mock(), concurrency=4, engine=NetcheckEngine.asyncio)
+
+    statuses = [r["status"] for a in asynchronous["assertions"] for r in a["results"]]
+    assert statuses == ["pass", "fail", "pass", "pass", "pass", "pass"]
+    not_found = asynchronous["assertions"][0]["results"][1]["data"]
+    assert not_found["exception-type"] == "HTTPError"
+    assert _strip_volatile(asynchronous) == _strip_volatile(threaded)
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_results_are_plain_json_with_durations_in_cel(local_http_server, engine):
+    config = {
+        "assertions": [
+            {
+                "name": "durations",
+                "rules": [
+                    {
+                        "type": "http",
+                        "url": f"{local_http_server}/status/200",
+                        "samples": 2,
+                        "validation": "data.timings.ttfb < duration('5s') && data.latency.max > duration('0s')",
+                    }
+                ],
+            }
+        ]
+    }
+
+    results = run_from_config(config, Mock(), engine=engine)
+
+    [result] = results["assertions"][0]["results"]
+    assert result["status"] == "pass", result
+    assert all(isinstance(seconds, float) for seconds in result["data"]["timings"].values())
+    assert json.loads(json.dumps(results)) == results
+
+
+def test_asyncio_engine_keeps_many_probes_in_flight(local_tcp_port):
+    config = {
+        "assertions": [
+            {"name": "many", "rules": [{"type": "tcp", "host": "127.0.0.1", "port": local_tcp_port}] * 200}
+        ]
+    }
+
+    results = run_from_config(config, Mock(), concurrency=200, engine="asyncio", deduplicate=False)
+
+    assert len(results["assertions"][0]["results"]) == 200
+    assert all(r["status"] == "pass" for r in results["assertions"][0]["results"])
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_run_from_config_streams_records_as_rules_finish(monkeypatch, engine):
+    delays = {1000: 0.3, 1001: 0.0, 1002: 0.0}
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check(delays))
+    monkeypatch.setattr(tcp_checks, "tcp_check_async", _slow_tcp_check_async(delays))
+    records = []
+
+    def stream(record):
+        records.append((time.perf_counter(), record))
+
+    start = time.perf_counter()
+    summary = run_from_config(_tcp_config(list(delays)), Mock(), concurrency=3, engine=engine, stream=stream)
+
+    kinds = [record["type"] for _, record in records]
+    assert kinds == ["netcheck-output-header"] + ["netcheck-result"] * 3 + ["netcheck-output-summary"]
+    assert records[0][1]["assertions"] == [
+        {"name": "assertion-0", "rule-count": 2},
+        {"name": "assertion-2", "rule-count": 1},
+    ]
+    results = [record for _, record in records[1:-1]]
+    # The slow rule finishes last, and the fast ones are not held back by it
+    assert (results[-1]["assertion"], results[-1]["rule-index"]) == ("assertion-0", 0)
+    assert records[1][0] - start < 0.2
+    assert summary is records[-1][1]
+    assert summary["rule-count"] == 3
+    assert summary["status-counts"] == {"pass": 3}
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_run_from_config_deadline_reports_outstanding_rules(monkeypatch, engine):
+    delays = {1000: 0.0, 1001: 2.0, 1002: 0.0, 1003: 0.0}
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check(delays))
+    monkeypatch.setattr(tcp_checks, "tcp_check_async", _slow_tcp_check_async(delays))
+    config = _tcp_config(list(delays))
+    config["assertions"][0]["rules"][1]["name"] = "slow"
+
+    start = time.perf_counter()
+    results = run_from_config(config, Mock(), concurrency=1, engine=engine, deadline=0.3)
+
+    assert time.perf_counter() - start < 1.5
+    first, slow, never_started, _ = [r for a in results["assertions"] for r in a["results"]]
+    assert first["status"] == "pass"
+    assert slow["name"] == "slow"
+    assert slow["status"] == "error"
+    assert slow["data"]["deadline-exceeded"] is True
+    assert slow["spec"]["port"] == 1001
+    assert never_started["status"] == "skip"
+    assert never_started["message"] == "Not started before the run deadline"
+    json.dumps(results)
+
+
+def test_run_from_config_deadline_streams_every_rule(monkeypatch):
+    delays = {1000: 2.0, 1001: 0.0, 1002: 0.0}
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check(delays))
+    records = []
+
+    summary = run_from_config(_tcp_config(list(delays)), Mock(), concurrency=1, stream=records.append, deadline=0.2)
+
+    assert [r["type"] for r in records].count("netcheck-result") == 3
+    assert summary["status-counts"] == {"error": 1, "skip": 2}
+    # The abandoned probe finishing later doesn't add another record
+    time.sleep(2)
+    assert len(records) == 5
+
+
+def test_run_from_config_deadline_waits_for_result_being_written(monkeypatch):
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check({1000: 0.0}))
+    records = []
+
+    def slow_stream(record):
+        if record["type"] == "netcheck-result":
+            # Still writing the result when the deadline passes
+            time.sleep(0.4)
+        records.append(record)
+
+    summary = run_from_config(_tcp_config([1000]), Mock(), stream=slow_stream, deadline=0.1)
+
+    assert [r["type"] for r in records] == ["netcheck-output-header", "netcheck-result", "netcheck-output-summary"]
+    assert summary["status-counts"] == {"pass": 1}
+
+
+def test_run_from_config_rejects_invalid_deadline():
+    with pytest.raises(ValueError):
+        run_from_config({"assertions": []}, Mock(), deadline=0)
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_rule_timeout_abandons_trickling_response(local_http_server, engine):
+    # Every read completes well within the request timeout, but the response takes 3s
+    url = f"{local_http_server}/trickle/3"
+    config = {
+        "assertions": [
+            {
+                "name": "trickle",
+                "rules": [
+                    {"type": "http", "url": url, "timeout": 0.2},
+                    {"type": "http", "url": url, "timeout": 0.2, "expected": "fail"},
+                    {"type": "http", "url": f"{local_http_server}/status/200", "timeout": 0.2},
+                ],
+            }
+        ]
+    }
+
+    start = time.perf_counter()
+    results = run_from_config(config, Mock(), concurrency=3, engine=engine)
+
+    assert time.perf_counter() - start < 2.5
+    timed_out, expected_to_fail, fast = results["assertions"][0]["results"]
+    assert timed_out["status"] == "fail"
+    assert timed_out["data"]["exception-type"] == "RuleTimeout"
+    assert timed_out["data"]["time-limit"] == 0.2 + RULE_TIMEOUT_GRACE
+    assert timed_out["spec"]["url"] == url
+    assert expected_to_fail["status"] == "pass"
+    assert fast["status"] == "pass"
+
+
+def test_rule_timeout_caps_every_rule(monkeypatch):
+    delays = {1000: 2.0, 1001: 0.0}
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check(delays))
+
+    start = time.perf_counter()
+    results = run_from_config(_tcp_config(list(delays)), Mock(), rule_timeout=0.2)
+
+    # Rules run one at a time, so the slow rule didn't hold up the next one
+    assert time.perf_counter() - start < 1.0
+    slow, fast = results["assertions"][0]["results"]
+    assert slow["status"] == "fail"
+    assert slow["data"]["time-limit"] == 0.2
+    assert fast["status"] == "pass"
+
+
+@pytest.mark.parametrize(
+    "rule,rule_timeout,expected",
+    [
+        ({"type": "internal"}, None, None),
+        ({"type": "tcp", "timeout": 1}, None, 1 + RULE_TIMEOUT_GRACE),
+        ({"type": "tcp"}, None, 5 + RULE_TIMEOUT_GRACE),
+        ({"type": "postgres"}, None, 5 + RULE_TIMEOUT_GRACE),
+        ({"type": "dns"}, None, 5 + RULE_TIMEOUT_GRACE),
+        ({"type": "http"}, None, 30 + RULE_TIMEOUT_GRACE),
+        ({"type": "http", "timeout": 5}, 2, 2),
+        ({"type": "internal"}, 2, 2),
+    ],
+)
+def test_rule_time_limit(rule, rule_timeout, expected):
+    assert rule_time_limit(rule, rule_timeout) == expected
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_identical_probes_run_once(monkeypatch, engine):
+    probes = Counter()
+    check = _slow_tcp_check({1000: 0.0, 1001: 0.0})
+
+    def counting_tcp_check(host, port, timeout=5, source_ip=None):
+        probes[port] += 1
+        return check(host, port, timeout, source_ip)
+
+    async def counting_tcp_check_async(host, port, timeout=5, source_ip=None):
+        return counting_tcp_check(host, port, timeout, source_ip)
+
+    monkeypatch.setattr(tcp_checks, "tcp_check", counting_tcp_check)
+    monkeypatch.setattr(tcp_checks, "tcp_check_async", counting_tcp_check_async)
+    rule = {"type": "tcp", "host": "localhost", "port": 1000}
+    config = {
+        "assertions": [
+            {"name": "a", "rules": [{**rule, "name": "connects"}, {**rule, "port": 1001}]},
+            {"name": "b", "rules": [{**rule, "validation": "data.connected == false", "expected": "fail"}]},
+            {"name": "c", "rules": [{**rule, "timeout": 1}]},
+        ]
+    }
+
+    results = run_from_config(config, Mock(), concurrency=4, engine=engine)
+
+    assert probes == {1000: 2, 1001: 1}
+    assert results["metadata"]["deduplicatedProbes"] == 1
+    connects, other_port = results["assertions"][0]["results"]
+    assert connects["name"] == "connects"
+    assert other_port["spec"]["port"] == 1001
+    shared = results["assertions"][1]["results"][0]
+    assert shared["spec"]["pattern"] == "data.connected == false"
+    assert "name" not in shared
+    assert [r["status"] for a in results["assertions"] for r in a["results"]] == ["pass"] * 4
+
+
+def test_probes_with_side_effects_are_not_shared(monkeypatch):
+    requests = Counter()
+
+    def counting_http_request_check(url, method, **kwargs):
+        requests[method] += 1
+        return {"spec": {"type": "http", "url": url, "method": method}, "data": {"status-code": 200}}
+
+    monkeypatch.setattr(http_checks, "http_request_check", counting_http_request_check)
+    monkeypatch.setattr(postgres_checks, "postgres_query_check", Mock(return_value={"spec": {}, "data": {}}))
+    get = {"type": "http", "url": "http://example.test/", "validation": "true"}
+    post = {**get, "method": "post"}
+    commit = {"type": "postgres", "dsn": "postgres://example", "query": "select 1", "rollback": False}
+    write = {**commit, "rollback": True, "read-only": False}
+    config = {"assertions": [{"name": "side-effects", "rules": [get, get, post, post, commit, commit, write, write]}]}
+
+    results = run_from_config(config, Mock())
+
+    assert requests == {"get": 1, "post": 2}
+    assert postgres_checks.postgres_query_check.call_count == 4
+    assert results["metadata"]["deduplicatedProbes"] == 1
+    assert probe_fingerprint({**commit, "rollback": True}) is not None
+
+
+def test_shared_probe_captures_fields_every_rule_reads(local_http_server):
+    url = f"{local_http_server}/status/200"
+    config = {
+        "assertions": [
+            {"name": "status", "rules": [{"type": "http", "url": url}]},
+            {"name": "body", "rules": [{"type": "http", "url": url, "validation": "data.json['User-Agent'] != ''"}]},
+        ]
+    }
+    records = []
+
+    summary = run_from_config(config, Mock(), stream=records.append)
+
+    assert summary["deduplicated-probes"] == 1
+    assert summary["status-counts"] == {"pass": 2}
+    status, body = [record["result"] for record in records[1:-1]]
+    assert status["data"]["body"] == body["data"]["body"]
+    assert status["data"] is not body["data"]
+
+
+def test_rule_with_several_validations(monkeypatch):
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check({1000: 0.0}))
+    rule = {"type": "tcp", "host": "localhost", "port": 1000}
+    validations = {"connected": "data.connected", "no-error": "data.error == null", "port": "spec.port == 1001"}
+    config = {
+        "assertions": [
+            {
+                "name": "contract",
+                "rules": [
+                    {**rule, "validation": ["data.connected", "spec.host == 'localhost'"]},
+                    {**rule, "validation": validations},
+                    {**rule, "validation": validations, "expected": "fail"},
+                ],
+            }
+        ]
+    }
+
+    all_pass, one_fails, expected_to_fail = run_from_config(config, Mock())["assertions"][0]["results"]
+
+    assert all_pass["status"] == "pass"
+    assert all_pass["validations"] == [
+        {"pattern": "data.connected", "passed": True},
+        {"pattern": "spec.host == 'localhost'", "passed": True},
+    ]
+    assert one_fails["status"] == "fail"
+    assert one_fails["spec"]["pattern"] == validations
+    assert [(v["name"], v["passed"]) for v in one_fails["validations"]] == [
+        ("connected", True),
+        ("no-error", True),
+        ("port", False),
+    ]
+    assert expected_to_fail["status"] == "pass"
+
+
+@pytest.mark.parametrize("validation", [["data.connected", 1], {"x": ["data.connected"]}, [], {}])
+def test_invalid_validation_list_fails_before_probes_run(monkeypatch, validation):
+    probe = Mock()
+    monkeypatch.setattr(tcp_checks, "tcp_check", probe)
+    config = _tcp_config([1000])
+    config["assertions"][0]["rules"][0]["validation"] = validation
+
+    with pytest.raises(ValueError, match="Validation must be"):
+        run_from_config(config, Mock())
+
+    probe.assert_not_called()
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_sampled_rule_reports_latency(local_http_server, engine):
+    config = {
+        "assertions": [
+            {
+                "name": "latency",
+                "rules": [
+                    {
+                        "type": "http",
+                        "url": f"{local_http_server}/status/200",
+                        "samples": 40,
+                        "sample-concurrency": 4,
+                        "validation": "data.latency.p99 < duration('1s') && data.latency['error-rate'] == 0.0",
+                    },
+                    {"type": "tcp", "host": "127.0.0.1", "port": 1, "samples": 3, "expected": "fail"},
+                ],
+            }
+        ]
+    }
+
+    sampled, refused = run_from_config(config, Mock(), engine=engine)["assertions"][0]["results"]
+
+    assert sampled["status"] == "pass"
+    latency = sampled["data"]["latency"]
+    assert latency["samples"] == 40
+    assert latency["min"] <= latency["p50"] <= latency["p90"] <= latency["p99"] <= latency["max"]
+    assert sum(latency["histogram"].values()) == 40
+    assert sampled["spec"]["samples"] == 40
+    # The first sample's result is kept, with the fields the validation doesn't read skipped
+    assert sampled["data"]["status-code"] == 200
+    assert "body" not in sampled["data"]
+    assert refused["status"] == "pass"
+    assert refused["data"]["latency"] == {"samples": 3, "errors": 3, "error-rate": 1.0}
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_samples_are_spaced_by_interval(monkeypatch, engine):
+    delays = {1000: 0.0}
+    monkeypatch.setattr(tcp_checks, "tcp_check", _slow_tcp_check(delays))
+    monkeypatch.setattr(tcp_checks, "tcp_check_async", _slow_tcp_check_async(delays))
+    config = _tcp_config([1000])
+    config["assertions"][0]["rules"][0].update({"samples": 5, "sample-interval": 0.1})
+
+    start = time.perf_counter()
+    result = run_from_config(config, Mock(), engine=engine)["assertions"][0]["results"][0]
+
+    assert time.perf_counter() - start >= 0.4
+    assert result["data"]["latency"]["samples"] == 5
+
+
+def test_invalid_sampling_options_fail_before_probes_run(monkeypatch):
+    probe = Mock()
+    monkeypatch.setattr(tcp_checks, "tcp_check", probe)
+    config = _tcp_config([1000])
+    config["assertions"][0]["rules"][0]["samples"] = 0
+
+    with pytest.raises(ValueError, match="samples"):
+        run_from_config(config, Mock())
+
+    probe.assert_not_called()
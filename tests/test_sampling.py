@@ -0,0 +1,74 @@
+import pytest
+
+from netcheck.sampling import SamplingOptions, latency_summary, sample_failed, sampling_options
+
+
+def ms(value):
+    return value / 1000
+
+
+def test_latency_summary():
+    durations = [i * 1_000_000 for i in range(1, 101)]
+
+    summary = latency_summary(durations, errors=25)
+
+    assert summary["samples"] == 125
+    assert summary["errors"] == 25
+    assert summary["error-rate"] == 0.2
+    assert summary["min"] == ms(1)
+    assert summary["mean"] == ms(50.5)
+    assert (summary["p50"], summary["p90"], summary["p99"]) == (ms(50), ms(90), ms(99))
+    assert summary["max"] == ms(100)
+    assert summary["histogram"] == {"0.005": 5, "0.01": 5, "0.025": 15, "0.05": 25, "0.1": 50}
+
+
+def test_latency_summary_of_one_sample():
+    summary = latency_summary([3_000_000_000], errors=0)
+
+    assert summary["p50"] == summary["p99"] == summary["max"] == 3
+    assert summary["histogram"] == {"5.0": 1}
+
+
+def test_latency_summary_puts_slow_samples_in_the_last_bucket():
+    assert latency_summary([90_000_000_000, 1_000_000], errors=0)["histogram"] == {"0.005": 1, "+Inf": 1}
+
+
+def test_latency_summary_without_successful_samples():
+    assert latency_summary([], errors=3) == {"samples": 3, "errors": 3, "error-rate": 1.0}
+
+
+def test_latency_summary_of_many_samples_is_fast():
+    import random
+    import time
+
+    durations = [random.randrange(1_000_000, 500_000_000) for _ in range(100_000)]
+    start = time.perf_counter()
+    latency_summary(durations, errors=0)
+    assert time.perf_counter() - start < 1
+
+
+@pytest.mark.parametrize(
+    "rule,expected",
+    [
+        ({"type": "tcp"}, None),
+        ({"samples": 10}, SamplingOptions(10)),
+        ({"samples": 5, "sample-interval": 0.1, "sample-concurrency": 2}, SamplingOptions(5, 0.1, 2)),
+    ],
+)
+def test_sampling_options(rule, expected):
+    assert sampling_options(rule) == expected
+
+
+@pytest.mark.parametrize(
+    "rule", [{"samples": 0}, {"samples": 2, "sample-interval": -1}, {"samples": 2, "sample-concurrency": 0}]
+)
+def test_invalid_sampling_options(rule):
+    with pytest.raises(ValueError):
+        sampling_options(rule)
+
+
+def test_sample_failed():
+    assert not sample_failed({"connected": True, "error": None})
+    assert sample_failed({"connected": False, "error": "Connection refused"})
+    assert sample_failed({"exception-type": "ConnectTimeout", "exception": "..."})
+    assert not sample_failed({"status-code": 500})
@@ -0,0 +1,130 @@
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+import netcheck.checks.postgres as postgres_checks
+import netcheck.checks.tcp as tcp_checks
+from netcheck.serve import parse_interval, serve
+
+
+@pytest.mark.parametrize(
+    "interval, seconds",
+    [(30, 30.0), (0.5, 0.5), ("45", 45.0), ("30s", 30.0), ("250ms", 0.25), ("5m", 300.0), ("1h", 3600.0)],
+)
+def test_parse_interval(interval, seconds):
+    assert parse_interval(interval) == seconds
+
+
+@pytest.mark.parametrize("interval", ["soon", "-5s", 0])
+def test_parse_interval_rejects_invalid(interval):
+    with pytest.raises(ValueError):
+        parse_interval(interval)
+
+
+def _serve_until(config, runs, **kwargs):
+    """Serve `config` until `runs` documents were emitted, and return them."""
+    outputs = []
+    stop = threading.Event()
+
+    def emit(output):
+        outputs.append((time.monotonic(), output))
+        if len(outputs) >= runs:
+            stop.set()
+
+    thread = threading.Thread(target=serve, args=([config], Mock(), emit), kwargs=dict(stop=stop, **kwargs))
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    return outputs
+
+
+def test_serve_runs_each_assertion_on_its_interval(local_tcp_port):
+    config = {
+        "assertions": [
+            {
+                "name": "fast",
+                "interval": "50ms",
+                "rules": [{"type": "tcp", "host": "127.0.0.1", "port": local_tcp_port}],
+            },
+            {"name": "slow", "interval": "1h", "rules": [{"type": "internal"}]},
+        ]
+    }
+
+    outputs = _serve_until(config, runs=6, interval=60, jitter=0, concurrency=2)
+
+    names = [output["assertions"][0]["name"] for _, output in outputs]
+    assert names.count("fast") >= 5
+    assert names.count("slow") == 1
+    for _, output in outputs:
+        assert output["type"] == "netcheck-output"
+        assert len(output["assertions"]) == 1
+        assert output["assertions"][0]["results"][0]["status"] == "pass"
+
+
+def test_serve_keeps_connections_warm_between_runs(local_http_server):
+    config = {"assertions": [{"name": "http", "rules": [{"type": "http", "url": f"{local_http_server}/status/200"}]}]}
+
+    outputs = _serve_until(config, runs=3, interval=0.02, jitter=0)
+
+    reused = [output["assertions"][0]["results"][0]["data"]["connection-reused"] for _, output in outputs]
+    assert reused == [False, True, True]
+
+
+def test_serve_skips_assertion_while_previous_run_in_progress(monkeypatch):
+    calls = []
+
+    def slow_tcp_check(host, port, timeout=5, source_ip=None):
+        calls.append(time.monotonic())
+        time.sleep(0.2)
+        return {"spec": {"type": "tcp"}, "data": {"connected": True}}
+
+    monkeypatch.setattr(tcp_checks, "tcp_check", slow_tcp_check)
+    config = {"assertions": [{"name": "slow", "rules": [{"type": "tcp", "host": "localhost", "port": 1}]}]}
+
+    outputs = _serve_until(config, runs=2, interval=0.05, jitter=0, concurrency=4)
+
+    assert len(outputs) == 2
+    assert calls[1] - calls[0] >= 0.2
+
+
+def test_serve_reads_postgres_catalog_again_every_run(monkeypatch):
+    tables = []
+    responses = {
+        "select r.rolname": [{"rolname": "alice", "rolcanlogin": True, "rolsuper": False}],
+        "select member.rolname": [],
+        "select n.nspname as schema_name, c.relname": tables,
+        "select r.role_index": [{"role_index": 1, "object_index": 1, "privilege_index": 1}],
+    }
+    cursor = Mock()
+    cursor.__enter__ = Mock(return_value=cursor)
+    cursor.__exit__ = Mock(return_value=False)
+
+    def execute(sql, params=None):
+        cursor.sql = " ".join(sql.split())
+
+    def fetchall():
+        rows = list(next((rows for prefix, rows in responses.items() if cursor.sql.startswith(prefix)), []))
+        if cursor.sql.startswith("select n.nspname as schema_name, c.relname") and not tables:
+            # The table is created after the first run read the catalog
+            tables.append({"schema_name": "billing", "relname": "invoices", "relkind": "r", "identity": "invoices"})
+        return rows
+
+    cursor.execute.side_effect = execute
+    cursor.fetchall.side_effect = fetchall
+    connection = Mock()
+    connection.cursor.return_value = cursor
+    monkeypatch.setattr(postgres_checks.psycopg, "connect", Mock(return_value=connection))
+    rule = {
+        "type": "postgres-grants",
+        "dsn": "postgres://example",
+        "rules": [{"roles": {"names": ["alice"]}, "objects": {"type": "table"}, "privileges": ["SELECT"]}],
+        "validation": "true",
+    }
+    config = {"assertions": [{"name": "grants", "rules": [rule]}]}
+
+    outputs = _serve_until(config, runs=2, interval=0.02, jitter=0)
+
+    violations = [output["assertions"][0]["results"][0]["data"]["violation-count"] for _, output in outputs]
+    assert violations == [0, 1]
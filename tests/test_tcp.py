@@ -0,0 +1,27 @@
+import asyncio
+
+from netcheck.checks.tcp import tcp_check, tcp_check_async
+
+
+def test_tcp_check_times_connect(local_tcp_port):
+    result = tcp_check("127.0.0.1", local_tcp_port)
+
+    assert result["data"]["connected"] is True
+    assert isinstance(result["data"]["timings"]["connect"], float)
+    assert result["data"]["timings"]["connect"] > 0
+
+
+def test_tcp_check_times_failed_connect():
+    result = tcp_check("127.0.0.1", 1)
+
+    assert result["data"]["connected"] is False
+    assert result["data"]["timings"]["connect"] < 5
+
+
+def test_async_tcp_check_times_connect(local_tcp_port):
+    connected = asyncio.run(tcp_check_async("127.0.0.1", local_tcp_port))
+    refused = asyncio.run(tcp_check_async("127.0.0.1", 1))
+
+    assert connected["data"]["timings"]["connect"] > 0
+    assert refused["data"]["connected"] is False
+    assert "connect" in refused["data"]["timings"]
@@ -2,7 +2,15 @@
 
 import pytest
 
-from netcheck.validation import evaluate_cel_with_context
+from netcheck.validation import (
+    ParseCache,
+    ValidationContext,
+    compile_cel,
+    data_fields,
+    evaluate_cel_with_context,
+    precompile_cel,
+    referenced_fields,
+)
 
 
 class TestCELValidation:
@@ -103,3 +111,179 @@ class TestCELValidation:
 
         result2 = evaluate_cel_with_context(context, "size(parse_yaml(yaml_str).list) == 2")
         assert result2 is True
+
+
+class TestCELProgramCache:
+    """Tests for the compiled CEL program cache."""
+
+    def test_identical_rules_compile_once(self):
+        compile_cel.cache_clear()
+        rule = "data['status-code'] in [200, 201]"
+
+        for status in (200, 201, 404):
+            evaluate_cel_with_context({"data": {"status-code": status}}, rule)
+
+        info = compile_cel.cache_info()
+        assert info.misses == 1
+        assert info.hits == 2
+
+    def test_compiled_program_is_reused(self):
+        assert compile_cel("1 + 1 == 2") is compile_cel("1 + 1 == 2")
+
+    def test_precompile_counts_distinct_rules(self):
+        assert precompile_cel(["true", "true", "1 == 1"]) == 2
+
+    def test_precompile_rejects_invalid_rule(self):
+        with pytest.raises(ValueError, match="Invalid CEL expression"):
+            precompile_cel(["true", "status =="])
+
+
+class CountingDict(dict):
+    """Dict that counts how often CEL reads its values while converting it."""
+
+    reads = 0
+
+    def __getitem__(self, key):
+        CountingDict.reads += 1
+        return super().__getitem__(key)
+
+
+class TestValidationContext:
+    """Tests for the layered validation context."""
+
+    def test_shared_and_probe_variables(self):
+        context = ValidationContext({"expected": {"status": 200}})
+
+        assert context.evaluate("data.status == expected.status", {}, {"status": 200}) is True
+        assert context.evaluate("data.status == expected.status", {}, {"status": 500}) is False
+        assert context.evaluate("spec.url == 'x'", {"url": "x"}, {}) is True
+
+    def test_rejects_reserved_names(self):
+        with pytest.raises(ValueError):
+            ValidationContext({"data": {}})
+
+    def test_unreferenced_context_is_never_converted(self):
+        CountingDict.reads = 0
+        context = ValidationContext({"big": CountingDict({str(i): i for i in range(1000)})})
+
+        for status in range(10):
+            context.evaluate("data.status == 200", {}, {"status": status})
+
+        assert CountingDict.reads == 0
+
+    def test_only_referenced_keys_are_read(self):
+        CountingDict.reads = 0
+        context = ValidationContext({"big": CountingDict({str(i): i for i in range(1000)})})
+
+        results = [context.evaluate("big['7'] == data.value", {}, {"value": value}) for value in range(10)]
+
+        assert results == [value == 7 for value in range(10)]
+        assert CountingDict.reads == 1
+
+    def test_whole_context_used_when_access_is_dynamic(self):
+        context = ValidationContext({"cm": {"a": 1, "b": 2}})
+
+        assert context.evaluate("size(cm) == 2", {}, {}) is True
+        assert context.evaluate("cm[data.key] == 2", {}, {"key": "b"}) is True
+        assert context.evaluate("cm.missing == 2", {}, {}) is False
+
+    def test_runtime_error_returns_false(self):
+        context = ValidationContext({})
+        assert context.evaluate("data.missing == 1", {}, {}) is False
+
+    def test_json_body_exposed_as_data_json(self):
+        context = ValidationContext({})
+        data = {"body": '{"status": "ok"}'}
+
+        assert context.evaluate("data.json.status == 'ok'", {}, data) is True
+        assert context.evaluate("parse_json(data.body).status == data.json.status", {}, data) is True
+        assert "json" not in data
+        assert context.parse_cache.misses == 1
+
+    def test_non_json_body_leaves_data_json_unset(self):
+        context = ValidationContext({})
+
+        assert context.evaluate("has(data.json)", {}, {"body": "<html></html>"}) is False
+        assert context.evaluate("data.body.startsWith('<html>')", {}, {"body": "<html></html>"}) is True
+
+
+class TestParseCache:
+    """Tests for the content-addressed cache behind parse_json and parse_yaml."""
+
+    def test_identical_documents_parsed_once(self):
+        cache = ParseCache()
+        context = {"doc": '{"a": [1, 2, 3]}', "copy": '{"a": [1, 2, 3]}'}
+
+        assert evaluate_cel_with_context(context, "parse_json(doc).a == parse_json(copy).a", cache) is True
+        assert evaluate_cel_with_context(context, "size(parse_json(doc).a) == 3", cache) is True
+        assert (cache.misses, cache.hits) == (1, 2)
+
+    def test_json_and_yaml_cached_separately(self):
+        cache = ParseCache()
+
+        assert cache.parse_json("[1]") == cache.parse_yaml("[1]") == [1]
+        assert (cache.misses, cache.hits) == (2, 0)
+
+    def test_parse_errors_not_cached(self):
+        cache = ParseCache()
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                cache.parse_json("not json")
+        assert cache.misses == 2
+
+    def test_evicts_least_recently_used_beyond_max_bytes(self):
+        cache = ParseCache(max_bytes=24)
+        first, second, third = '{"n": 1111111}', '{"n": 2}', '{"n": 3}'
+
+        cache.parse_json(first)
+        cache.parse_json(second)
+        cache.parse_json(first)
+        cache.parse_json(third)
+        cache.parse_json(first)
+        cache.parse_json(second)
+
+        # Adding the third document evicted the second, the least recently used
+        assert (cache.misses, cache.hits) == (4, 2)
+
+    def test_documents_larger_than_the_cache_are_not_kept(self):
+        cache = ParseCache(max_bytes=4)
+
+        cache.parse_json("[1, 2, 3]")
+        cache.parse_json("[1, 2, 3]")
+        assert cache.hits == 0
+
+
+@pytest.mark.parametrize(
+    "expression,variable,expected",
+    [
+        ("data['status-code'] in [200, 201]", "data", {"status-code"}),
+        ("data.A.exists(a, a == '1') && size(data.A) > 0", "data", {"A"}),
+        ("parse_json(data.body).headers['X'] == token.value", "token", {"value"}),
+        ("x.data.y == data.z", "data", {"z"}),
+        ("'data.x' == data.y", "data", {"y"}),
+        ("1 == 1", "data", set()),
+        ("size(data) > 0", "data", None),
+        ("data.keys()", "data", None),
+        ("data[key] == 1", "data", None),
+    ],
+)
+def test_referenced_fields(expression, variable, expected):
+    fields = referenced_fields(expression, variable)
+    assert (fields if fields is None else set(fields)) == expected
+
+
+@pytest.mark.parametrize(
+    "expression,expected",
+    [
+        ("data['status-code'] in [200, 201]", {"status-code"}),
+        ("parse_json(data.body).ok && data.timings.ttfb < duration('1s')", {"body", "timings"}),
+        ("spec.host == 'example.com'", set()),
+        ("true", set()),
+        ("[1, 2].all(data, data > 0)", None),
+        ("size(data) > 0", None),
+    ],
+)
+def test_data_fields(expression, expected):
+    fields = data_fields(expression)
+    assert (fields if fields is None else set(fields)) == expected